@@ -4,13 +4,14 @@ Chạy: streamlit run app.py
 """
 import streamlit as st
 from modules.word_manager import (
-    load_words, add_word, update_word, delete_word, 
-    search_words, import_csv
+    load_words, add_word, update_word, delete_word, get_word,
+    search_words, suggest_words, find_word, import_csv, DERIVED_COLUMNS
 )
-from modules.flashcard import clear_flashcard_session, init_flashcard_session, display_flashcard
+from modules.flashcard import clear_flashcard_session, init_flashcard_session, display_flashcard, recover_review_buffers
 from modules.quiz import init_quiz_session, display_quiz
 from modules.dashboard import display_dashboard
-from modules.spaced_repetition import get_due_words, reset_word_progress
+from modules.spaced_repetition import get_due_words, count_due_today, reset_word_progress, reschedule_all
+from modules import scheduler, review_queue
 from modules.quiz_history_display import show_quiz_history_page
 
 # Cấu hình trang
@@ -74,6 +75,11 @@ st.markdown("""
 def main():
     """Hàm chính"""
     
+    # Áp các câu trả lời flashcard còn đệm trên đĩa (vd: trình duyệt bị refresh giữa phiên)
+    if 'review_buffers_recovered' not in st.session_state:
+        recover_review_buffers()
+        st.session_state.review_buffers_recovered = True
+    
     # Header với logo
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -129,8 +135,8 @@ def main():
         st.markdown("---")
         
         # Thống kê nhanh
-        df = load_words()
-        due_count = len(get_due_words())
+        df = load_words(copy=False)
+        due_count = count_due_today()
         
         st.metric("📚 Tổng số từ", len(df))
         st.metric("⏰ Cần ôn hôm nay", due_count)
@@ -187,8 +193,8 @@ def show_home():
         ### 🚀 Bắt đầu ngay:
         """)
         
-        df = load_words()
-        due_today = len(get_due_words())
+        df = load_words(copy=False)
+        due_today = count_due_today()
         
         if df.empty:
             st.info("📝 Bạn chưa có từ vựng nào. Hãy vào **Quản lý từ** để thêm từ mới!")
@@ -261,15 +267,23 @@ def show_flashcard_page():
     with tab1:
         st.markdown("### Ôn tập các từ cần học hôm nay")
         
-        due_words = get_due_words()
+        due_count = count_due_today()
         
-        if due_words.empty:
+        if due_count == 0:
             st.success("🎉 Bạn đã hoàn thành việc ôn tập hôm nay!")
             st.info("💡 Hãy quay lại vào ngày mai hoặc chọn tab 'Xem tất cả từ' để ôn tổng.")
         else:
-            st.info(f"📚 Có **{len(due_words)} từ** cần ôn hôm nay")
+            st.info(f"📚 Có **{due_count} từ** cần ôn hôm nay")
+            
+            quota = review_queue.plan_session()
+            if quota['new'] + quota['review'] < due_count:
+                st.caption(f"Phiên hôm nay: {quota['review']} từ ôn + {quota['new']} từ mới "
+                           f"(giới hạn {review_queue.REVIEWS_PER_DAY} từ ôn, {review_queue.NEW_PER_DAY} từ mới mỗi ngày), "
+                           f"ưu tiên từ quá hạn lâu, hay quên và hay sai trong quiz")
             
-            if st.button("🚀 Bắt đầu ôn tập", type="primary", use_container_width=True, key="btn_start_review"):
+            if quota['new'] + quota['review'] == 0:
+                st.success("🎉 Bạn đã đạt giới hạn ôn tập hôm nay!")
+            elif st.button("🚀 Bắt đầu ôn tập", type="primary", use_container_width=True, key="btn_start_review"):
                 init_flashcard_session(mode="review")
                 st.rerun()
     
@@ -286,6 +300,10 @@ def show_flashcard_page():
             if st.button("🚀 Xem tất cả Flashcard", type="primary", use_container_width=True, key="btn_start_all"):
                 init_flashcard_session(mode="all")
                 st.rerun()
+            
+            if st.button("🎯 Ôn từ hay sai & quá hạn", use_container_width=True, key="btn_start_weighted"):
+                init_flashcard_session(mode="weighted")
+                st.rerun()
 
 def show_quiz_page():
     """Trang Quiz"""
@@ -293,9 +311,9 @@ def show_quiz_page():
     
     if 'quiz_questions' not in st.session_state:
         # Hiển thị số từ cần ôn hôm nay
-        due_words = get_due_words()
-        if not due_words.empty:
-            st.info(f"⏰ Có **{len(due_words)} từ** cần ôn hôm nay. Bạn có thể làm quiz với những từ này!")
+        due_count = count_due_today()
+        if due_count > 0:
+            st.info(f"⏰ Có **{due_count} từ** cần ôn hôm nay. Bạn có thể làm quiz với những từ này!")
         
         col1, col2, col3 = st.columns(3)
         
@@ -319,7 +337,7 @@ def show_quiz_page():
             # Tùy chọn nguồn từ vựng
             quiz_source = st.selectbox(
                 "Nguồn từ vựng:",
-                ["Tất cả từ", "Từ cần ôn hôm nay"]
+                ["Tất cả từ", "Từ cần ôn hôm nay", "Ưu tiên từ hay sai & quá hạn"]
             )
         
         st.markdown("---")
@@ -329,10 +347,12 @@ def show_quiz_page():
         if st.button("🚀 Bắt đầu Quiz", type="primary", use_container_width=True):
             # Xác định nguồn từ
             if quiz_source == "Từ cần ôn hôm nay":
-                if due_words.empty:
+                if due_count == 0:
                     st.warning("⚠️ Không có từ nào cần ôn hôm nay!")
                     return
                 success = init_quiz_session(num_questions, quiz_type_code, filter_due=True)
+            elif quiz_source == "Ưu tiên từ hay sai & quá hạn":
+                success = init_quiz_session(num_questions, quiz_type_code, weighted=True)
             else:
                 success = init_quiz_session(num_questions, quiz_type_code, filter_due=False)
             
@@ -353,8 +373,11 @@ def show_vocabulary_page():
     df = load_words()
     
     if search_term:
-        df = search_words(search_term)
-        st.caption(f"Tìm thấy {len(df)} kết quả")
+        df, total = search_words(search_term)
+        if total > len(df):
+            st.caption(f"Tìm thấy {total} kết quả, hiển thị {len(df)} kết quả phù hợp nhất")
+        else:
+            st.caption(f"Tìm thấy {total} kết quả")
     
     # Bộ lọc
     col1, col2, col3 = st.columns(3)
@@ -366,10 +389,10 @@ def show_vocabulary_page():
         )
     
     with col2:
-        sort_by = st.selectbox(
-            "Sắp xếp theo:",
-            ["Mới nhất", "Cũ nhất", "A-Z", "Z-A"]
-        )
+        sort_options = ["Mới nhất", "Cũ nhất", "A-Z", "Z-A"]
+        if search_term:
+            sort_options.insert(0, "Phù hợp nhất")
+        sort_by = st.selectbox("Sắp xếp theo:", sort_options)
     
     # Áp dụng bộ lọc
     if filter_option == "Cần ôn hôm nay":
@@ -382,9 +405,9 @@ def show_vocabulary_page():
     # Sắp xếp
     if not df.empty:
         if sort_by == "Mới nhất":
-            df = df.sort_values('start_date', ascending=False)
+            df = df.sort_values('start_day', ascending=False)
         elif sort_by == "Cũ nhất":
-            df = df.sort_values('start_date', ascending=True)
+            df = df.sort_values('start_day', ascending=True)
         elif sort_by == "A-Z":
             df = df.sort_values('word', ascending=True)
         elif sort_by == "Z-A":
@@ -434,8 +457,8 @@ def show_vocabulary_page():
                              f"📆 Ôn tiếp: {row['next_review']}")
                 
                 with col2:
-                    if st.button("🔄 Reset", key=f"reset_{idx}", use_container_width=True):
-                        success, msg = reset_word_progress(idx)
+                    if st.button("🔄 Reset", key=f"reset_{row['id']}", use_container_width=True):
+                        success, msg = reset_word_progress(row['id'])
                         if success:
                             st.success(msg)
                             st.rerun()
@@ -451,8 +474,19 @@ def show_word_management():
     with tab1:
         st.markdown("### Thêm từ mới")
         
+        # Ô nhập từ nằm ngoài form để kiểm tra trùng/gợi ý ngay khi nhập
+        word = st.text_input("Từ tiếng Anh *", placeholder="Ví dụ: beautiful", key="new_word")
+        
+        if word.strip():
+            existing = find_word(word)
+            if existing is not None:
+                st.warning(f"⚠️ Từ '{existing['word']}' đã có trong kho: {existing['meaning']}")
+            else:
+                similar = suggest_words(word, limit=5)
+                if not similar.empty:
+                    st.caption("💡 Từ đã có gần giống: " + ", ".join(similar['word'].astype(str)))
+        
         with st.form("add_word_form", clear_on_submit=True):
-            word = st.text_input("Từ tiếng Anh *", placeholder="Ví dụ: beautiful")
             pos = st.text_input("Từ loại (POS)", placeholder="Ví dụ: adj, n, v")
             phonetic = st.text_input("Phiên âm (IPA)", placeholder="Ví dụ: /ˈbjuːtɪfl/")
             meaning = st.text_input("Nghĩa tiếng Việt *", placeholder="Ví dụ: đẹp, xinh đẹp")
@@ -470,6 +504,7 @@ def show_word_management():
                     if success:
                         st.success(msg)
                         st.balloons()
+                        del st.session_state["new_word"]
                         st.rerun()
                     else:
                         st.error(msg)
@@ -477,18 +512,26 @@ def show_word_management():
     with tab2:
         st.markdown("### Chỉnh sửa hoặc xóa từ")
         
-        df = load_words()
-        
-        if df.empty:
+        if load_words(copy=False).empty:
             st.info("📭 Chưa có từ nào trong kho")
         else:
-            word_options = [f"{row['word']} — {row['meaning']}" for idx, row in df.iterrows()]
+            # Chỉ đưa vào ô chọn các từ gợi ý theo tiền tố, không phải cả kho
+            prefix = st.text_input("🔍 Gõ từ cần sửa/xóa:", placeholder="Nhập vài chữ cái đầu...")
+            matches = suggest_words(prefix)
+            word_options = dict(zip(matches['id'], matches['word'].astype(str) + " — " + matches['meaning'].astype(str)))
             
-            selected = st.selectbox("Chọn từ cần sửa/xóa:", word_options)
+            if not word_options:
+                st.info(f"📭 Không có từ nào bắt đầu bằng '{prefix}'")
             
-            if selected:
-                selected_idx = word_options.index(selected)
-                selected_word = df.iloc[selected_idx]
+            selected_id = st.selectbox(
+                "Chọn từ cần sửa/xóa:",
+                list(word_options),
+                format_func=lambda word_id: word_options[word_id]
+            )
+            
+            selected_word = get_word(selected_id) if selected_id is not None else None
+            
+            if selected_word is not None:
                 
                 st.markdown("---")
                 
@@ -497,7 +540,7 @@ def show_word_management():
                 with col1:
                     st.markdown("#### ✏️ Chỉnh sửa")
                     
-                    with st.form(f"edit_form_{selected_idx}"):
+                    with st.form(f"edit_form_{selected_id}"):
                         new_word = st.text_input("Từ:", value=selected_word['word'])
                         new_pos = st.text_input("Từ loại:", value=selected_word.get('pos', ''))
                         new_phonetic = st.text_input("Phiên âm:", value=selected_word.get('phonetic', ''))
@@ -505,7 +548,7 @@ def show_word_management():
                         new_example = st.text_area("Ví dụ:", value=selected_word['example'])
                         
                         if st.form_submit_button("💾 Lưu", type="primary", use_container_width=True):
-                            success, msg = update_word(selected_idx, new_word, new_pos, new_phonetic, new_meaning, new_example)
+                            success, msg = update_word(selected_id, new_word, new_pos, new_phonetic, new_meaning, new_example)
                             
                             if success:
                                 st.success(msg)
@@ -518,7 +561,7 @@ def show_word_management():
                     st.warning("⚠️ Hành động này không thể hoàn tác!")
                     
                     if st.button("🗑️ Xóa từ này", type="secondary", use_container_width=True):
-                        success, msg = delete_word(selected_idx)
+                        success, msg = delete_word(selected_id)
                         
                         if success:
                             st.success(msg)
@@ -538,11 +581,16 @@ def show_word_management():
             
             if uploaded_file is not None:
                 if st.button("📥 Import", type="primary", use_container_width=True):
-                    # Lưu file tạm
-                    with open("temp_import.csv", "wb") as f:
-                        f.write(uploaded_file.getvalue())
+                    progress_bar = st.progress(0.0, text="⏳ Đang import...")
                     
-                    success, msg = import_csv("temp_import.csv")
+                    def show_progress(fraction, counts):
+                        progress_bar.progress(
+                            fraction,
+                            text=f"⏳ Đang import... {counts['inserted']} từ mới, {counts['updated']} từ cập nhật"
+                        )
+                    
+                    # Đọc thẳng từ buffer upload theo từng chunk (không ghi file tạm)
+                    success, msg = import_csv(uploaded_file, progress=show_progress)
                     
                     if success:
                         st.success(msg)
@@ -558,7 +606,7 @@ def show_word_management():
             if df.empty:
                 st.info("Chưa có dữ liệu để export")
             else:
-                csv = df.to_csv(index=False, encoding='utf-8-sig')
+                csv = df.drop(columns=DERIVED_COLUMNS).to_csv(index=False, encoding='utf-8-sig')
                 
                 st.download_button(
                     label="📤 Download CSV",
@@ -568,6 +616,18 @@ def show_word_management():
                     use_container_width=True,
                     type="primary"
                 )
+        
+        st.markdown("---")
+        st.markdown("#### 📅 Lịch ôn tập")
+        st.caption(f"Thuật toán xếp lịch: **{scheduler.get_name()}** (đổi bằng biến môi trường VOCATGO_SCHEDULER: fixed, sm2, fsrs)")
+        
+        if st.button("🔄 Tính lại lịch ôn cả kho", use_container_width=True):
+            success, msg = reschedule_all()
+            
+            if success:
+                st.success(msg)
+            else:
+                st.error(msg)
 
 if __name__ == "__main__":
     main()
@@ -3,16 +3,19 @@ dashboard.py - Thống kê và biểu đồ học tập
 """
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from modules.word_manager import load_words
+from datetime import datetime
+from modules.word_manager import load_words, get_invalid_dates, get_due_forecast, get_memory_report
 from modules.spaced_repetition import get_review_stats, get_due_words
-from modules.utils import str_to_date, get_today
+from modules.utils import get_today, today_day, NO_DAY
+
+# Các khoảng dự báo lịch ôn (ngày)
+FORECAST_RANGES = [7, 30, 90, 365]
 
 def display_dashboard():
     """Hiển thị dashboard thống kê"""
     st.markdown("## 📊 Thống kê học tập")
     
-    df = load_words()
+    df = load_words(copy=False)
     
     if df.empty:
         st.info("📭 Chưa có dữ liệu. Hãy thêm từ vựng để bắt đầu!")
@@ -21,6 +24,13 @@ def display_dashboard():
     # Tổng quan
     show_overview_stats()
     
+    # Cảnh báo ngày sai định dạng
+    invalid_dates = get_invalid_dates()
+    if not invalid_dates.empty:
+        st.warning(f"⚠️ Có {len(invalid_dates)} ngày không đúng định dạng dd-mm-yyyy. Các từ này sẽ không được lên lịch ôn.")
+        with st.expander("📋 Xem các ngày không hợp lệ"):
+            st.dataframe(invalid_dates, use_container_width=True, hide_index=True)
+    
     st.markdown("---")
     
     # Charts
@@ -36,6 +46,9 @@ def display_dashboard():
     
     # Lịch sử học tập
     show_learning_history()
+    
+    # Bộ nhớ kho từ vựng
+    show_memory_report()
 
 def show_overview_stats():
     """Hiển thị thống kê tổng quan"""
@@ -97,36 +110,32 @@ def show_progress_chart():
             st.write(f"**{level}:** {count} từ")
 
 def show_review_distribution():
-    """Hiển thị phân bố lịch ôn tập"""
-    st.markdown("### 📅 Lịch ôn tập 7 ngày tới")
-    
-    df = load_words()
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Tạo danh sách 7 ngày tới
-    dates = []
-    counts = []
+    """Hiển thị phân bố lịch ôn tập (dự báo tối đa 1 năm)"""
+    st.markdown("### 📅 Lịch ôn tập sắp tới")
+    
+    num_days = st.radio(
+        "Khoảng thời gian",
+        FORECAST_RANGES,
+        format_func=lambda days: f"{days} ngày",
+        horizontal=True,
+        key="forecast_days"
+    )
     
-    for i in range(7):
-        date = today + timedelta(days=i)
-        date_str = date.strftime("%d-%m-%Y")
-        
-        # Đếm số từ cần ôn vào ngày đó
-        count = len(df[df['next_review'] == date_str])
-        
-        dates.append(date.strftime("%d/%m"))
-        counts.append(count)
+    # Đếm số từ cần ôn theo từng ngày bằng tìm nhị phân trên hàng đợi ôn tập
+    # (ngày đầu gồm cả các từ quá hạn)
+    day_counts = get_due_forecast(today_day(), num_days, include_overdue=True)
     
-    # Tạo chart
+    today = pd.Timestamp(datetime.now().date())
     chart_data = pd.DataFrame({
-        'Ngày': dates,
-        'Số từ': counts
+        'Ngày': pd.date_range(today, periods=num_days, freq='D'),
+        'Số từ': day_counts
     })
     
-    st.line_chart(chart_data.set_index('Ngày'))
+    st.bar_chart(chart_data.set_index('Ngày'))
+    st.caption(f"Trung bình {day_counts.mean():.1f} từ/ngày, nhiều nhất {int(day_counts.max())} từ/ngày")
     
     # Highlight ngày hôm nay
-    today_count = counts[0]
+    today_count = int(day_counts[0])
     if today_count > 0:
         st.info(f"📌 Hôm nay cần ôn **{today_count} từ**")
     else:
@@ -136,13 +145,15 @@ def show_learning_history():
     """Hiển thị lịch sử học tập"""
     st.markdown("### 📖 Lịch sử học tập")
     
-    df = load_words()
+    df = load_words(copy=False)
     
-    # Sắp xếp theo start_date
-    df_sorted = df.sort_values('start_date', ascending=False)
+    # Sắp xếp theo ngày bắt đầu (dạng số, đã parse sẵn khi load)
+    df_sorted = df.sort_values('start_day', ascending=False)
     
     # Nhóm theo tháng
-    df_sorted['month'] = df_sorted['start_date'].apply(lambda x: str_to_date(x).strftime("%m/%Y"))
+    start_days = df_sorted['start_day'].where(df_sorted['start_day'] != NO_DAY)
+    months = pd.to_datetime(start_days, unit='D').dt.strftime("%m/%Y")
+    df_sorted = df_sorted.assign(month=months.fillna("Không rõ"))
     
     monthly_stats = df_sorted.groupby('month').agg({
         'word': 'count',
@@ -182,6 +193,25 @@ def show_learning_history():
         hide_index=True
     )
 
+def show_memory_report():
+    """Hiển thị bộ nhớ dùng cho kho từ vựng (trước/sau khi ép kiểu gọn)"""
+    with st.expander("💾 Bộ nhớ kho từ vựng"):
+        report = get_memory_report()
+        total = report.iloc[-1]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Trước (object)", f"{total['before_per_word']:.0f} bytes/từ")
+        with col2:
+            st.metric(
+                "Sau (schema gọn)",
+                f"{total['after_per_word']:.0f} bytes/từ",
+                delta=f"{total['after_per_word'] - total['before_per_word']:.0f} bytes/từ",
+                delta_color="inverse"
+            )
+        
+        st.dataframe(report, use_container_width=True, hide_index=True)
+
 def show_streak_info():
     """Hiển thị thông tin chuỗi ngày học liên tục (streak)"""
     # TODO: Cần thêm logic tracking streak trong tương lai
@@ -0,0 +1,172 @@
+"""
+distractor_index.py - Index chọn đáp án sai (distractor) cho quiz trắc nghiệm
+
+Đáp án sai lấy ngẫu nhiên cả kho thường sai lộ liễu (1 danh từ giữa 3 động
+từ). Index này chia các từ vào bucket theo nhiều mức, từ giống nhất đến chung
+nhất:
+- mức 0: cùng từ loại + cùng nhóm độ dài nghĩa + chữ ký n-gram của từ (min-hash
+  trên các trigram ký tự: 2 từ viết gần giống nhau dễ có cùng chữ ký)
+- mức 1: cùng từ loại + cùng nhóm độ dài nghĩa
+- mức 2: cùng từ loại
+- mức 3: cả kho
+
+Mỗi bucket là list id + vị trí của từng id trong list, nên thêm/xóa 1 từ là
+O(1) (xóa bằng cách đổi chỗ với phần tử cuối). vocab_store giữ index và cập
+nhật tăng dần khi thêm/sửa/xóa từ; chọn đáp án sai cho 1 câu hỏi là O(1):
+lấy bucket giống nhất còn đủ từ rồi rút ngẫu nhiên.
+"""
+import bisect
+import re
+import numpy as np
+from modules.utils import fold_text, fold_texts
+
+# Nhóm độ dài nghĩa (số ký tự): <= 8, <= 14, <= 20, <= 28, <= 40, dài hơn
+LENGTH_BINS = [8, 14, 20, 28, 40]
+
+NGRAM = 3
+
+# Chỉ lấy chữ ký trên MAX_WORD_CHARS ký tự đầu của từ (giới hạn bộ nhớ)
+MAX_WORD_CHARS = 32
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# Số lần rút thử tối đa cho mỗi đáp án sai ở 1 mức trước khi xuống mức chung hơn
+MAX_TRIES = 8
+
+_POS_SEPARATOR = re.compile(r'[;,/\s]+')
+_SPACES = re.compile(r'\s+')
+
+def _as_text(value):
+    """Giá trị 1 ô thành chuỗi (ô trống -> '')"""
+    return value if isinstance(value, str) else ''
+
+def _texts(col):
+    """Cột văn bản dạng chuỗi (ô trống -> '')"""
+    return col.astype(object).fillna('').astype(str)
+
+def _main_pos(pos):
+    """Từ loại chính: 'n;v' -> 'n'"""
+    parts = _POS_SEPARATOR.split(_as_text(pos).strip().lower())
+    return parts[0] if parts else ''
+
+def _signatures(words):
+    """
+    Chữ ký min-hash trên các trigram ký tự của từng từ (đã fold), vectorized:
+    mã ký tự dạng ma trận uint32, băm mỗi trigram rồi lấy min theo dòng
+    """
+    padded = np.array([f" {word[:MAX_WORD_CHARS]} " for word in words], dtype=f'U{MAX_WORD_CHARS + 2}')
+    codes = padded.view(np.uint32).reshape(len(padded), -1).astype(np.uint64)
+    lengths = np.char.str_len(padded)
+    hashes = codes[:, :-2] * _MIX
+    hashes = (hashes + codes[:, 1:-1]) * _MIX
+    hashes = (hashes + codes[:, 2:]) * _MIX
+    hashes ^= hashes >> np.uint64(29)
+    # Trigram vượt quá cuối từ: bỏ qua
+    hashes[np.arange(hashes.shape[1]) > lengths[:, None] - NGRAM] = np.iinfo(np.uint64).max
+    return hashes.min(axis=1).tolist()
+
+def _document(signature, main_pos, length, meaning_key):
+    """Ghép dữ liệu 1 từ (các phần đã chuẩn hóa) thành document"""
+    return ((0, main_pos, length, signature), (1, main_pos, length), (2, main_pos), (3,)), meaning_key
+
+def document(word, pos, meaning):
+    """
+    Dữ liệu của 1 từ trong index: (khóa bucket các mức, nghĩa đã chuẩn hóa)
+    Nghĩa chuẩn hóa dùng để bỏ đáp án sai trùng nghĩa với đáp án đúng.
+    """
+    meaning = _as_text(meaning)
+    meaning_key = _SPACES.sub(' ', fold_text(meaning)).strip()
+    length = bisect.bisect_left(LENGTH_BINS, len(meaning))
+    return _document(_signatures([fold_text(_as_text(word))])[0], _main_pos(pos), length, meaning_key)
+
+def _documents(df):
+    """document() của cả kho: {id: ...} (chuẩn hóa vectorized theo cột)"""
+    words = fold_texts(_texts(df['word'])).tolist()
+    pos = _texts(df['pos'])
+    # Từ loại chỉ có ít giá trị khác nhau: tách 1 lần cho mỗi giá trị
+    main_pos = pos.map({value: _main_pos(value) for value in pos.unique()})
+    meanings = _texts(df['meaning'])
+    lengths = np.searchsorted(LENGTH_BINS, meanings.str.len().to_numpy(), side='left')
+    meaning_keys = fold_texts(meanings).str.replace(_SPACES, ' ', regex=True).str.strip()
+    return {word_id: _document(*values) for word_id, *values in zip(
+        df['id'].tolist(), _signatures(words) if words else [], main_pos.tolist(),
+        lengths.tolist(), meaning_keys.tolist())}
+
+def build(df):
+    """Tạo index từ DataFrame"""
+    index = {'buckets': {}, 'slots': {}, 'docs': {}}
+    add(index, _documents(df))
+    return index
+
+def add(index, docs):
+    """Thêm các từ {id: document(...)} vào index"""
+    buckets = index['buckets']
+    for word_id, doc in docs.items():
+        slots = []
+        for key in doc[0]:
+            members = buckets.setdefault(key, [])
+            slots.append(len(members))
+            members.append(word_id)
+        index['slots'][word_id] = slots
+        index['docs'][word_id] = doc
+
+def remove(index, word_ids):
+    """Bỏ các từ khỏi index (đổi chỗ với phần tử cuối bucket, O(1) mỗi mức)"""
+    buckets = index['buckets']
+    for word_id in word_ids:
+        doc = index['docs'].pop(word_id, None)
+        if doc is None:
+            continue
+        for level, (key, slot) in enumerate(zip(doc[0], index['slots'].pop(word_id))):
+            members = buckets[key]
+            last = members.pop()
+            if last != word_id:
+                members[slot] = last
+                index['slots'][last][level] = slot
+            if not members:
+                del buckets[key]
+
+def sample(index, word_id, k, rng):
+    """
+    Chọn k đáp án sai cho từ word_id: ưu tiên bucket giống nhất, khác id và
+    khác nghĩa với đáp án đúng (và với nhau); thiếu thì lấy thêm ở mức chung
+    hơn. Kho chỉ còn các nghĩa trùng nhau thì chấp nhận nghĩa trùng.
+
+    Returns: list id (ít hơn k nếu kho không đủ k + 1 từ)
+    """
+    keys, meaning = index['docs'][word_id]
+    docs = index['docs']
+    chosen = []
+    meanings = {meaning}
+    for key in keys:
+        members = index['buckets'][key]
+        # Bucket không còn từ khác để chọn: xuống mức chung hơn
+        if len(members) <= len(chosen) + 1:
+            continue
+        tries = MAX_TRIES * (k - len(chosen))
+        while len(chosen) < k and tries > 0:
+            tries -= 1
+            candidate = members[int(rng.integers(len(members)))]
+            if candidate == word_id or candidate in chosen or docs[candidate][1] in meanings:
+                continue
+            chosen.append(candidate)
+            meanings.add(docs[candidate][1])
+        if len(chosen) == k:
+            return chosen
+
+    # Các mức đều thiếu (nghĩa trùng nhau): rút ngẫu nhiên cả kho, chỉ bỏ id đã
+    # chọn (không quét cả kho)
+    members = index['buckets'][keys[-1]]
+    k = min(k, len(members) - 1)
+    excluded = set(chosen) | {word_id}
+    if len(members) <= 2 * (k + 1):
+        # Kho nhỏ: xáo cả kho
+        others = [members[pos] for pos in rng.permutation(len(members)) if members[pos] not in excluded]
+        return chosen + others[:k - len(chosen)]
+    # Id bị bỏ chưa tới 1/2 kho: mỗi lần rút trúng với xác suất > 1/2
+    while len(chosen) < k:
+        candidate = members[int(rng.integers(len(members)))]
+        if candidate not in excluded:
+            chosen.append(candidate)
+            excluded.add(candidate)
+    return chosen
@@ -2,29 +2,84 @@
 flashcard.py - Logic hiển thị và xử lý flashcard
 """
 import streamlit as st
-from modules.word_manager import load_words
-from modules.spaced_repetition import get_due_words, update_word_review
-from modules.utils import shuffle_list, format_progress
+from modules import review_buffer, review_queue, weighted_sampler
+from modules.word_manager import load_words, get_word, get_words_by_ids
+from modules.spaced_repetition import apply_reviews
+from modules.utils import shuffle_list, format_progress, file_lock
+
+# Áp các câu trả lời đang đệm vào kho sau mỗi N thẻ
+FLUSH_EVERY = 10
+
+# Số thẻ của phiên ưu tiên từ hay sai & quá hạn
+WEIGHTED_CARDS = 20
+
+def flush_review_buffer(session_id):
+    """
+    Áp các câu trả lời trong buffer của phiên vào kho (1 lần ghi) rồi xóa buffer
+    Returns: (success: bool, message: str)
+    """
+    with file_lock(review_buffer.BUFFER_DIR):
+        reviews = review_buffer.read(session_id)
+        if not reviews:
+            return True, ""
+        
+        success, msg = apply_reviews(reviews)
+        if success:
+            review_buffer.clear(session_id)
+        return success, msg
+
+def recover_review_buffers():
+    """
+    Áp các buffer còn sót trên đĩa (phiên bị refresh/đóng trước khi lưu)
+    Gọi 1 lần khi mở app; an toàn cả khi phiên đó vẫn đang mở ở tab khác
+    """
+    for session_id in review_buffer.list_sessions():
+        success, msg = flush_review_buffer(session_id)
+        if not success:
+            print(f"Warning: không áp được buffer ôn tập {session_id}: {msg}")
+
+def _flush_session():
+    """Áp buffer của phiên flashcard hiện tại, báo lỗi nếu không lưu được"""
+    session_id = st.session_state.get('flashcard_session_id')
+    if session_id is None:
+        return True
+    
+    success, msg = flush_review_buffer(session_id)
+    if not success:
+        st.error(msg)
+    return success
 
 def init_flashcard_session(mode="review", filter_words=None):
     """
     Khởi tạo session state cho flashcard
     
     Args:
-        mode: "review" (ôn từ cần học hôm nay), "all" (xem tất cả từ), "filtered" (từ được lọc)
+        mode: "review" (ôn từ cần học hôm nay), "all" (xem tất cả từ), "filtered" (từ được lọc),
+              "weighted" (WEIGHTED_CARDS từ chọn ưu tiên từ hay sai & quá hạn)
         filter_words: list các từ cần lọc (chỉ dùng khi mode="filtered")
+    
+    Mode review lấy thẻ theo độ ưu tiên từng batch (review_queue), các mode
+    khác xáo trộn cả danh sách.
     """
+    # Lưu câu trả lời của phiên trước (nếu còn) trước khi bắt đầu phiên mới
+    _flush_session()
+    
     if mode == "review":
-        words_df = get_due_words()
-    elif mode == "filtered" and filter_words:
+        _init_review_queue()
+        return
+    
+    if mode == "filtered" and filter_words:
         # Lọc theo danh sách từ
-        all_words = load_words()
+        all_words = load_words(copy=False)
         words_df = all_words[all_words['word'].isin(filter_words)]
+    elif mode == "weighted":
+        words_df = get_words_by_ids(weighted_sampler.sample_word_ids(WEIGHTED_CARDS))
     else:
-        words_df = load_words()
+        words_df = load_words(copy=False)
     
     # Set mode trước khi check empty
     st.session_state.flashcard_mode = mode
+    st.session_state.flashcard_session_id = review_buffer.new_session_id()
     
     # QUAN TRỌNG: Lưu filter_words ngay cả khi empty
     if mode == "filtered" and filter_words:
@@ -34,15 +89,46 @@ def init_flashcard_session(mode="review", filter_words=None):
         st.session_state.flashcard_list = []
         return
     
-    # Shuffle và chuyển thành list indices
-    indices = list(words_df.index)
-    shuffled_indices = shuffle_list(indices)
+    # Shuffle và chuyển thành list id (không đổi khi từ khác bị xóa)
+    word_ids = [int(word_id) for word_id in words_df['id']]
+    shuffled_ids = shuffle_list(word_ids)
+    
+    st.session_state.flashcard_list = shuffled_ids
+    st.session_state.flashcard_total = len(shuffled_ids)
+    st.session_state.flashcard_current = 0
+    st.session_state.flashcard_show_answer = False
+    st.session_state.flashcard_completed = 0
+
+def _init_review_queue():
+    """
+    Khởi tạo phiên ôn tập hôm nay: tính quota theo giới hạn/ngày và chỉ lấy
+    batch đầu tiên (các batch sau lấy khi ôn hết batch trước)
+    """
+    quota = review_queue.plan_session()
+    total = quota['new'] + quota['review']
     
-    st.session_state.flashcard_list = shuffled_indices
+    st.session_state.flashcard_mode = "review"
+    st.session_state.flashcard_session_id = review_buffer.new_session_id()
+    st.session_state.flashcard_quota = quota
+    st.session_state.flashcard_list = review_queue.next_batch(quota)
+    st.session_state.flashcard_total = total
     st.session_state.flashcard_current = 0
     st.session_state.flashcard_show_answer = False
     st.session_state.flashcard_completed = 0
 
+def _load_next_batch():
+    """Ôn hết batch hiện tại: lấy thêm batch tiếp theo (nếu còn quota)"""
+    quota = st.session_state.get('flashcard_quota')
+    if not quota:
+        return
+    
+    served = st.session_state.flashcard_list
+    batch = review_queue.next_batch(quota, served_ids=served)
+    st.session_state.flashcard_list = served + batch
+    # Thẻ đến hạn ít hơn dự kiến (đã ôn ở phiên khác): tổng = số thẻ thực tế
+    if not batch or (quota['new'] + quota['review'] == 0):
+        st.session_state.flashcard_total = len(st.session_state.flashcard_list)
+
 def display_flashcard():
     """Hiển thị flashcard và xử lý tương tác"""
     
@@ -66,27 +152,27 @@ def display_flashcard():
     
     # Lấy từ hiện tại
     current_idx = st.session_state.flashcard_current
-    total = len(st.session_state.flashcard_list)
+    if current_idx >= len(st.session_state.flashcard_list):
+        _load_next_batch()
+    total = st.session_state.get('flashcard_total', len(st.session_state.flashcard_list))
     
     # Kiểm tra đã hoàn thành chưa
-    if current_idx >= total:
+    if current_idx >= len(st.session_state.flashcard_list):
         show_flashcard_complete()
         return
     
-    # Load dữ liệu
-    df = load_words()
-    word_index = st.session_state.flashcard_list[current_idx]
+    # Lấy từ theo id (tra index, không load lại cả kho)
+    word_id = st.session_state.flashcard_list[current_idx]
+    word_data = get_word(word_id)
     
-    # Kiểm tra index có hợp lệ không
-    if word_index not in df.index:
-        st.error(f"❌ Lỗi: Không tìm thấy từ với index {word_index}")
+    # Kiểm tra id có hợp lệ không (từ có thể đã bị xóa ở tab khác)
+    if word_data is None:
+        st.error(f"❌ Lỗi: Không tìm thấy từ với id {word_id}")
         if st.button("🏠 Về trang chủ"):
             clear_flashcard_session()
             st.rerun()
         return
     
-    word_data = df.loc[word_index]
-    
     # Header với progress
     col1, col2, col3 = st.columns([2, 3, 1])
     
@@ -94,9 +180,9 @@ def display_flashcard():
         st.markdown(f"### Thẻ {current_idx + 1}/{total}")
     
     with col2:
-        progress = (current_idx + st.session_state.flashcard_completed) / total
-        st.progress(progress)
-        st.caption(format_progress(current_idx + st.session_state.flashcard_completed, total))
+        # current_idx = số thẻ đã xem (mode review: cũng là số thẻ đã trả lời)
+        st.progress(min(current_idx / total, 1.0))
+        st.caption(format_progress(current_idx, total))
     
     with col3:
         # Chỉ hiển thị nút thoát nếu KHÔNG phải mode filtered
@@ -163,11 +249,11 @@ def display_flashcard():
                 
                 with col1:
                     if st.button("❌ Quên rồi", type="secondary", use_container_width=True, key=f"forgot_{current_idx}"):
-                        handle_flashcard_response(word_index, False)
+                        handle_flashcard_response(word_id, False)
                 
                 with col2:
                     if st.button("✅ Đã nhớ", type="primary", use_container_width=True, key=f"remember_{current_idx}"):
-                        handle_flashcard_response(word_index, True)
+                        handle_flashcard_response(word_id, True)
             else:
                 # Mode xem tất cả hoặc filtered - chỉ có nút Next
                 col1, col2, col3 = st.columns([1, 1, 1])
@@ -178,15 +264,22 @@ def display_flashcard():
                         st.session_state.flashcard_show_answer = False
                         st.rerun()
 
-def handle_flashcard_response(word_index, remembered):
-    """Xử lý khi người dùng chọn Nhớ/Quên (CHỈ Ở MODE REVIEW)"""
-    success, msg = update_word_review(word_index, remembered)
+def handle_flashcard_response(word_id, remembered):
+    """
+    Xử lý khi người dùng chọn Nhớ/Quên (CHỈ Ở MODE REVIEW)
+    Câu trả lời được ghi vào buffer của phiên, áp vào kho sau mỗi FLUSH_EVERY thẻ
+    """
+    try:
+        with file_lock(review_buffer.BUFFER_DIR):
+            review_buffer.append(st.session_state.flashcard_session_id, word_id, remembered)
+    except Exception as e:
+        st.error(f"❌ Lỗi khi lưu câu trả lời: {e}")
+        return
     
-    if success:
-        st.session_state.flashcard_completed += 1
-        next_flashcard()
-    else:
-        st.error(msg)
+    st.session_state.flashcard_completed += 1
+    if st.session_state.flashcard_completed % FLUSH_EVERY == 0 and not _flush_session():
+        return
+    next_flashcard()
 
 def next_flashcard():
     """Chuyển sang flashcard tiếp theo"""
@@ -196,6 +289,9 @@ def next_flashcard():
 
 def show_flashcard_complete():
     """Hiển thị khi hoàn thành tất cả flashcard"""
+    if not _flush_session():
+        return
+    
     st.success("🎉 Chúc mừng! Bạn đã hoàn thành tất cả flashcard!")
     
     completed = st.session_state.flashcard_completed
@@ -234,14 +330,19 @@ def show_flashcard_complete():
             st.rerun()
 
 def clear_flashcard_session():
-    """Xóa session state của flashcard"""
+    """Lưu các câu trả lời còn đệm và xóa session state của flashcard"""
+    _flush_session()
+    
     keys_to_remove = [
         'flashcard_list',
         'flashcard_current',
         'flashcard_show_answer',
         'flashcard_mode',
         'flashcard_completed',
-        'flashcard_filter_words'
+        'flashcard_filter_words',
+        'flashcard_session_id',
+        'flashcard_quota',
+        'flashcard_total'
     ]
     
     for key in keys_to_remove:
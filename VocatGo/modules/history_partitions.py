@@ -0,0 +1,286 @@
+"""
+history_partitions.py - Lưu lịch sử quiz (CSV) chia theo tháng
+
+    data/history_quiz/
+        2026-10/quiz_log.csv              tháng đang ghi: CSV, chỉ ghi thêm dòng
+        2026-10/quiz_wrong_words.csv
+        2026-09/quiz_log.parquet          tháng đã qua: nén dạng cột (parquet +
+        2026-09/quiz_wrong_words.parquet  zstd nếu có pyarrow, không thì CSV gzip)
+
+- append(): ghi mỗi dòng vào CSV của tháng theo cột time (O(1), không đọc lại file)
+- read(): đọc theo khoảng thời gian, chỉ mở các tháng nằm trong khoảng
+- compact(): nén các tháng đã qua (không còn ghi thêm) thành file dạng cột
+- drop(): xóa các tháng (khi gộp lịch sử cũ vào số liệu tổng hợp)
+
+File cũ chưa chia tháng (data/history_quiz/quiz_log.csv, ...) vẫn được đọc,
+split_legacy() chia nó vào các tháng. Các hàm ghi/nén/xóa phải gọi trong file
+lock của lịch sử (quiz_history).
+"""
+import codecs
+import csv
+import io
+import os
+import re
+import shutil
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (pandas dùng để ghi/đọc parquet)
+    COMPACT_EXT = ".parquet"
+except ImportError:
+    # pyarrow có trong requirements.txt; thiếu thì vẫn chạy, chỉ nén kém hơn
+    print("Warning: không có pyarrow, các tháng lịch sử quiz đã qua được nén dạng CSV gzip (.csv.gz)")
+    COMPACT_EXT = ".csv.gz"
+
+HISTORY_DIR = "data/history_quiz"
+
+QUIZ_LOG = "quiz_log"
+WRONG_WORDS = "quiz_wrong_words"
+
+# Các cột chữ: luôn đọc dạng chuỗi (từ "123" không thành số, các tháng ghép
+# lại có cùng kiểu cột)
+TEXT_COLUMNS = ['time', 'quiz_type', 'word', 'meaning', 'example', 'session_id']
+
+# Dòng có time sai định dạng được xếp vào "tháng" này (trước mọi tháng thật)
+UNKNOWN_MONTH = "0000-00"
+
+_MONTH = re.compile(r'\d{4}-\d{2}')
+
+def month_of(time_str):
+    """Tháng YYYY-MM của 1 giá trị time ("YYYY-MM-DD HH:MM")"""
+    month = str(time_str)[:7]
+    return month if _MONTH.fullmatch(month) else UNKNOWN_MONTH
+
+def legacy_path(name):
+    """File cũ chưa chia tháng"""
+    return os.path.join(HISTORY_DIR, f"{name}.csv")
+
+def csv_path(month, name):
+    """File CSV đang ghi của 1 tháng"""
+    return os.path.join(HISTORY_DIR, month, f"{name}.csv")
+
+def _compacted_paths(month, name):
+    """Các file đã nén có thể có của 1 tháng (cả định dạng không dùng hiện tại)"""
+    return [os.path.join(HISTORY_DIR, month, f"{name}{ext}") for ext in (".parquet", ".csv.gz")]
+
+def months():
+    """Các tháng đang có dữ liệu, tăng dần"""
+    if not os.path.isdir(HISTORY_DIR):
+        return []
+    return sorted(entry.name for entry in os.scandir(HISTORY_DIR)
+                  if entry.is_dir() and _MONTH.fullmatch(entry.name))
+
+def _csv_lines(rows):
+    """Các dòng CSV (list giá trị) dạng bytes, kết thúc bằng xuống dòng"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+def _upgrade_header(path, header, fields):
+    """
+    Thêm các cột mới (vd: session_id) vào file lịch sử tạo bởi phiên bản cũ
+    Chỉ chạy 1 lần cho mỗi file: ghi ra file tạm rồi os.replace (nguyên tử).
+    Returns: header mới
+    """
+    new_header = header + [col for col in fields if col not in header]
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(codecs.BOM_UTF8 + _csv_lines([new_header]))
+        f.write(_csv_lines([row + [''] * (len(new_header) - len(row)) for row in rows if row]))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return new_header
+
+def _read_header(path):
+    """Header của file CSV (list cột, rỗng nếu file chưa có/chưa có header)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header_line = f.readline().strip()
+    return next(csv.reader([header_line])) if header_line else []
+
+def _append_rows(path, fields, rows):
+    """
+    Ghi thêm các dòng vào cuối file CSV (O(1), không đọc lại cả file)
+    File chưa có header (chưa tồn tại/rỗng) thì ghi header trước; file đã có
+    header thì ghi theo thứ tự cột của header đó (thiếu cột mới thì nâng header
+    1 lần).
+    """
+    header = _read_header(path)
+    if header and set(fields) - set(header):
+        header = _upgrade_header(path, header, fields)
+
+    with open(path, 'ab+') as f:
+        if not header:
+            # File rỗng hoặc chỉ có dòng trống: ghi lại từ đầu kèm header
+            f.seek(0)
+            f.truncate()
+            f.write(codecs.BOM_UTF8 + _csv_lines([fields]))
+            header = fields
+        else:
+            # Nếu dòng cuối bị ghi dở (crash), xuống dòng để không dính vào dòng mới
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(_csv_lines([[row.get(col, '') for col in header] for row in rows]))
+        f.flush()
+        os.fsync(f.fileno())
+
+def append(name, fields, rows):
+    """Ghi thêm các dòng (list dict có 'time') vào CSV của tháng tương ứng"""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(month_of(row['time']), []).append(row)
+    for month, month_rows in by_month.items():
+        os.makedirs(os.path.join(HISTORY_DIR, month), exist_ok=True)
+        _append_rows(csv_path(month, name), fields, month_rows)
+
+def _read_file(path):
+    """Đọc 1 file lịch sử (CSV/CSV gzip/parquet), None nếu không có hoặc rỗng"""
+    if not os.path.exists(path):
+        return None
+    try:
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_csv(path, encoding='utf-8-sig', dtype={col: str for col in TEXT_COLUMNS})
+    except pd.errors.EmptyDataError:
+        return None
+
+def _month_files(month, name):
+    """Các file của 1 tháng theo thứ tự thời gian (phần đã nén trước)"""
+    return _compacted_paths(month, name) + [csv_path(month, name)]
+
+def time_bound(value):
+    """Mốc thời gian dạng chuỗi so sánh được với cột time (nhận cả date/datetime)"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime("%Y-%m-%d %H:%M")
+
+def read(name, fields, start=None, end=None, only_months=None):
+    """
+    Đọc lịch sử trong khoảng [start, end) (chuỗi "YYYY-MM-DD HH:MM" hoặc tiền
+    tố của nó như "2026-10", hoặc date/datetime; None = không giới hạn)
+    Chỉ mở file của các tháng nằm trong khoảng (và trong only_months nếu có).
+    Dòng cũ chưa có session_id dùng time làm id.
+
+    Returns: DataFrame (rỗng với các cột fields nếu không có dữ liệu)
+    """
+    start, end = time_bound(start), time_bound(end)
+    paths = [legacy_path(name)]
+    for month in months():
+        if start is not None and month < start[:7]:
+            continue
+        # end = "YYYY-MM" (đầu tháng): tháng đó không có dòng nào < end
+        if end is not None and (month > end[:7] or month == end):
+            continue
+        if only_months is not None and month not in only_months:
+            continue
+        paths.extend(_month_files(month, name))
+
+    frames = [df for df in map(_read_file, paths) if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=fields)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    if 'session_id' not in df.columns:
+        df['session_id'] = df['time']
+    else:
+        df['session_id'] = df['session_id'].astype(object).fillna(df['time'].astype(object))
+
+    # time dạng "YYYY-MM-DD HH:MM": so sánh chuỗi đúng thứ tự thời gian; time
+    # sai định dạng coi như "" (trước mọi mốc, như tháng UNKNOWN_MONTH)
+    if start is not None or end is not None:
+        times = df['time'].astype(object).fillna('').astype(str)
+        times = times.where(times.str.match(_MONTH), '')
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+        df = df[mask].reset_index(drop=True)
+    return df
+
+def _write_compacted(df, path):
+    """Ghi 1 tháng dạng nén (file tạm + os.replace)"""
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp_path, compression='zstd', index=False)
+    else:
+        df.to_csv(tmp_path, index=False, compression='gzip')
+    os.replace(tmp_path, path)
+
+def compact(before_month, names=(QUIZ_LOG, WRONG_WORDS)):
+    """
+    Nén CSV của các tháng trước before_month (YYYY-MM) thành file dạng cột
+    Tháng đã nén mà có thêm dòng CSV (vd: đồng hồ máy bị chỉnh lùi) thì ghép
+    lại vào file nén.
+
+    Returns: list các tháng đã nén
+    """
+    compacted = []
+    for month in months():
+        if month >= before_month:
+            break
+        for name in names:
+            path = csv_path(month, name)
+            if not os.path.exists(path):
+                continue
+            target = os.path.join(HISTORY_DIR, month, f"{name}{COMPACT_EXT}")
+            existing = _compacted_paths(month, name)
+            frames = [df for df in map(_read_file, existing + [path]) if df is not None]
+            if frames:
+                _write_compacted(pd.concat(frames, ignore_index=True), target)
+            for old_path in existing + [path]:
+                if old_path != target and os.path.exists(old_path):
+                    os.remove(old_path)
+            compacted.append(month)
+    return sorted(set(compacted))
+
+def drop(months_to_drop):
+    """Xóa dữ liệu của các tháng"""
+    for month in months_to_drop:
+        shutil.rmtree(os.path.join(HISTORY_DIR, month), ignore_errors=True)
+
+def split_legacy(fields_by_name):
+    """
+    Chia file cũ chưa chia tháng vào các tháng rồi xóa file cũ
+    File cũ không có dòng nào (file mẫu rỗng đi kèm repo) được giữ nguyên.
+
+    Args:
+        fields_by_name: {tên file: list cột} (vd: {QUIZ_LOG: QUIZ_LOG_FIELDS})
+    """
+    for name, fields in fields_by_name.items():
+        path = legacy_path(name)
+        df = _read_file(path)
+        if df is None or df.empty:
+            continue
+        if 'session_id' not in df.columns:
+            df['session_id'] = df['time']
+        rows = df.astype(object).where(df.notna(), '').to_dict('records')
+        append(name, fields, rows)
+        os.remove(path)
+
+def clear():
+    """Xóa toàn bộ lịch sử (mọi tháng và file cũ)"""
+    drop(months())
+    for name in (QUIZ_LOG, WRONG_WORDS):
+        if os.path.exists(legacy_path(name)):
+            os.remove(legacy_path(name))
+
+def signature():
+    """Chữ ký (đường dẫn, mtime_ns, size) của mọi file lịch sử"""
+    paths = [legacy_path(QUIZ_LOG), legacy_path(WRONG_WORDS)]
+    for month in months():
+        for name in (QUIZ_LOG, WRONG_WORDS):
+            paths.extend(_month_files(month, name))
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        result.append((path, stat.st_mtime_ns, stat.st_size))
+    return result
@@ -2,49 +2,57 @@
 quiz.py - Tạo và xử lý bài kiểm tra (Quiz)
 """
 import streamlit as st
-import random
-from modules.word_manager import load_words
-from modules.utils import shuffle_list
-from modules.quiz_history import save_quiz_result
+import numpy as np
+from modules.word_manager import load_words, get_due_word_ids, get_distractor_ids, get_words_by_ids
+from modules.utils import today_day
+from modules.quiz_history import save_quiz_result, new_session_id
+from modules import weighted_sampler
 
-def init_quiz_session(num_questions, quiz_type, filter_due=False):
+# Số đáp án sai của mỗi câu trắc nghiệm
+NUM_DISTRACTORS = 3
+
+_rng = np.random.default_rng()
+
+def init_quiz_session(num_questions, quiz_type, filter_due=False, weighted=False, word_ids=None):
     """
     Khởi tạo session cho quiz
+    Load kho 1 lần, chọn câu hỏi và đáp án sai của mọi câu trong 1 bước (vectorized)
     
     Args:
         num_questions: số câu hỏi
         quiz_type: "multiple_choice" hoặc "typing"
         filter_due: True nếu chỉ lấy từ cần ôn hôm nay
+        weighted: True nếu ưu tiên từ hay sai gần đây và quá hạn lâu
+                  (weighted_sampler, rút O(1) mỗi câu qua bảng alias)
+        word_ids: chỉ hỏi các từ này (vd: từ sai nhiều nhất trong lịch sử),
+                  đáp án sai vẫn lấy từ cả kho
     """
-    # Import thêm get_due_words
-    from modules.spaced_repetition import get_due_words
+    # Đáp án sai lấy từ cả kho (load 1 lần, dùng bản cache không copy)
+    df = load_words(copy=False)
+    if len(df) < NUM_DISTRACTORS + 1:  # Cần ít nhất 4 từ cho multiple choice
+        return False
     
-    # Lấy danh sách từ
-    if filter_due:
-        df = get_due_words()
-        if df.empty:
+    # Chọn ngẫu nhiên câu hỏi (vị trí dòng, không lặp)
+    if word_ids is not None:
+        positions = _rng.permutation(np.flatnonzero(df['id'].isin(list(word_ids)).to_numpy()))[:num_questions]
+        if len(positions) == 0:
             return False
+    elif filter_due:
+        due_ids = get_due_word_ids(today_day())
+        if len(due_ids) == 0:
+            return False
+        selected = _rng.choice(due_ids, min(num_questions, len(due_ids)), replace=False)
+        positions = _rng.permutation(np.flatnonzero(df['id'].isin(selected).to_numpy()))
+    elif weighted:
+        selected = weighted_sampler.sample_word_ids(num_questions, _rng)
+        positions = _rng.permutation(np.flatnonzero(df['id'].isin(selected).to_numpy()))
     else:
-        df = load_words()
-    
-    if len(df) < 4:  # Cần ít nhất 4 từ cho multiple choice
-        return False
+        positions = _rng.choice(len(df), min(num_questions, len(df)), replace=False)
     
-    # Chọn ngẫu nhiên câu hỏi
-    num_questions = min(num_questions, len(df))
-    selected_indices = random.sample(list(df.index), num_questions)
-    
-    # Tạo câu hỏi
-    questions = []
-    for idx in selected_indices:
-        word_data = df.loc[idx]  # Dùng .loc thay vì .iloc
-        
-        if quiz_type == "multiple_choice":
-            question = create_multiple_choice_question(idx, df)
-        else:  # typing
-            question = create_typing_question(idx, word_data)
-        
-        questions.append(question)
+    if quiz_type == "multiple_choice":
+        questions = create_multiple_choice_questions(df, positions)
+    else:  # typing
+        questions = create_typing_questions(df, positions)
     
     # Lưu vào session state
     st.session_state.quiz_questions = questions
@@ -56,55 +64,64 @@ def init_quiz_session(num_questions, quiz_type, filter_due=False):
     st.session_state.quiz_answered = False
     st.session_state.quiz_show_hint = False  # Mới: flag để hiển thị gợi ý
     st.session_state.quiz_filter_due = filter_due  # Lưu thông tin nguồn từ
+    st.session_state.quiz_weighted = weighted
+    st.session_state.quiz_word_ids = None if word_ids is None else list(word_ids)
+    st.session_state.quiz_session_id = new_session_id()
     
     return True
 
-def create_multiple_choice_question(correct_idx, df):
-    """Tạo câu hỏi trắc nghiệm"""
-    correct_word = df.loc[correct_idx]
-    
-    # Lấy 3 đáp án sai ngẫu nhiên
-    other_indices = [i for i in df.index if i != correct_idx]
-    
-    # Nếu không đủ từ khác, lấy từ toàn bộ kho
-    if len(other_indices) < 3:
-        all_words = load_words()
-        other_indices = [i for i in all_words.index if i != correct_idx]
-    
-    wrong_indices = random.sample(other_indices, min(3, len(other_indices)))
-    
-    # Tạo danh sách đáp án
-    choices = [correct_word['meaning']]
-    
-    # Load lại toàn bộ từ để lấy đáp án sai (nếu cần)
-    all_words = load_words()
-    for idx in wrong_indices:
-        if idx in df.index:
-            choices.append(df.loc[idx]['meaning'])
-        else:
-            choices.append(all_words.loc[idx]['meaning'])
-    
-    # Shuffle
-    random.shuffle(choices)
-    correct_answer = choices.index(correct_word['meaning'])
-    
-    return {
+def _text_values(df, col, positions):
+    """Giá trị cột chữ tại các vị trí dòng (ô trống -> ''), không đổi kiểu cả cột"""
+    return df[col].take(positions).astype(object).fillna('').to_numpy()
+
+def create_multiple_choice_questions(df, positions):
+    """
+    Tạo các câu hỏi trắc nghiệm cho các dòng `positions` của df
+    Đáp án sai lấy từ index đáp án sai: từ cùng từ loại, nghĩa dài tương đương,
+    chính tả gần giống (nên khó đoán hơn 3 nghĩa ngẫu nhiên)
+    """
+    word_ids = df['id'].to_numpy(np.int64)[positions]
+    wrong = np.array(get_distractor_ids(word_ids, NUM_DISTRACTORS, _rng), dtype=np.int64)
+    
+    # Thứ tự đáp án ngẫu nhiên: cột 0 là đáp án đúng trước khi xáo
+    order = np.argsort(_rng.random((len(positions), NUM_DISTRACTORS + 1)), axis=1)
+    options = np.column_stack([word_ids, wrong])
+    meanings = get_words_by_ids(np.unique(options)).set_index('id')['meaning']
+    meanings = meanings.astype(object).fillna('').reindex(np.take_along_axis(options, order, axis=1).ravel())
+    choices = meanings.to_numpy().reshape(options.shape)
+    correct_index = np.argmax(order == 0, axis=1)
+    
+    return [{
         'type': 'multiple_choice',
-        'word': correct_word['word'],
-        'correct_meaning': correct_word['meaning'],
-        'choices': choices,
-        'correct_index': correct_answer,
-        'example': correct_word['example']
-    }
+        'word_id': word_id,
+        'word': word,
+        'correct_meaning': meaning,
+        'choices': row,
+        'correct_index': index,
+        'example': example
+    } for word_id, word, meaning, row, index, example in zip(
+        word_ids.tolist(),
+        _text_values(df, 'word', positions),
+        _text_values(df, 'meaning', positions),
+        choices.tolist(),
+        correct_index.tolist(),
+        _text_values(df, 'example', positions)
+    )]
 
-def create_typing_question(idx, word_data):
-    """Tạo câu hỏi điền từ"""
-    return {
+def create_typing_questions(df, positions):
+    """Tạo các câu hỏi điền từ cho các dòng `positions` của df"""
+    return [{
         'type': 'typing',
-        'word': word_data['word'],
-        'meaning': word_data['meaning'],
-        'example': word_data['example']
-    }
+        'word_id': word_id,
+        'word': word,
+        'meaning': meaning,
+        'example': example
+    } for word_id, word, meaning, example in zip(
+        df['id'].to_numpy()[positions].tolist(),
+        _text_values(df, 'word', positions),
+        _text_values(df, 'meaning', positions),
+        _text_values(df, 'example', positions)
+    )]
 
 def display_quiz():
     """Hiển thị quiz"""
@@ -302,6 +319,10 @@ def show_quiz_results():
     # Hiển thị thông tin nguồn từ
     if st.session_state.get('quiz_filter_due', False):
         st.info("📚 Bài quiz từ: **Từ cần ôn hôm nay**")
+    elif st.session_state.get('quiz_weighted', False):
+        st.info("🎯 Bài quiz từ: **Ưu tiên từ hay sai & quá hạn**")
+    elif st.session_state.get('quiz_word_ids') is not None:
+        st.info("❌ Bài quiz từ: **Từ sai nhiều nhất trong lịch sử**")
     
     # Lưu kết quả vào lịch sử (chỉ lưu 1 lần)
     if 'quiz_result_saved' not in st.session_state:
@@ -309,8 +330,11 @@ def show_quiz_results():
             quiz_type=st.session_state.quiz_type,
             score=score,
             total=total,
-            wrong_words=st.session_state.quiz_wrong_words
+            wrong_words=st.session_state.quiz_wrong_words,
+            session_id=st.session_state.get('quiz_session_id')
         )
+        # Cộng dồn vào điểm lỗi của chế độ ưu tiên từ hay sai (không đọc lại lịch sử)
+        weighted_sampler.record_errors(st.session_state.quiz_wrong_words)
         st.session_state.quiz_result_saved = True
     
     # Hiển thị điểm
@@ -358,8 +382,10 @@ def show_quiz_results():
             num_questions = len(st.session_state.quiz_questions)
             quiz_type = st.session_state.quiz_type
             filter_due = st.session_state.get('quiz_filter_due', False)
+            weighted = st.session_state.get('quiz_weighted', False)
+            word_ids = st.session_state.get('quiz_word_ids')
             clear_quiz_session()
-            init_quiz_session(num_questions, quiz_type, filter_due)
+            init_quiz_session(num_questions, quiz_type, filter_due, weighted, word_ids)
             st.rerun()
     
     with col2:
@@ -386,7 +412,10 @@ def clear_quiz_session():
         'quiz_answered',
         'quiz_result_saved',
         'quiz_show_hint',
-        'quiz_num_questions'
+        'quiz_num_questions',
+        'quiz_weighted',
+        'quiz_word_ids',
+        'quiz_session_id'
     ]
     
     for key in keys_to_remove:
@@ -0,0 +1,263 @@
+"""
+quiz_aggregates.py - Số liệu tổng hợp của lịch sử quiz (cập nhật tăng dần)
+
+Trang lịch sử cần tổng số bài, điểm trung bình/cao nhất, hiệu suất theo loại
+quiz và các từ sai nhiều nhất. Thay vì đọc và nhóm lại toàn bộ lịch sử mỗi lần
+mở trang, các số liệu này được giữ trong 1 file JSON nhỏ và cộng thêm mỗi khi
+lưu 1 bài quiz (quiz_history.save_quiz_result):
+- đếm/tổng/max: số bài, tổng số câu, tổng % điểm, điểm cao nhất
+- theo loại quiz: số bài và tổng % điểm
+- số lần sai của từng từ (word, meaning) + min-heap TOP_K từ sai nhiều nhất
+
+Số lần sai chỉ tăng nên heap luôn đúng: từ ngoài heap chỉ vào heap khi vượt
+phần tử nhỏ nhất. Bảng đếm số lần sai lớn dần theo số từ nên nằm ở file riêng
+(<tên>.wrong.jsonl, mỗi dòng [word, meaning, số lần cộng thêm]): mỗi lần lưu
+quiz chỉ ghi thêm vài dòng vào cuối và ghi lại file JSON nhỏ (số liệu + heap).
+File JSON giữ kích thước của file bảng đếm lúc ghi; lệch nhau (bị gián đoạn
+giữa 2 lần ghi) thì coi như chưa có số liệu.
+
+File lưu kèm dấu (marker) của nguồn lịch sử lúc cập nhật;
+lịch sử bị sửa từ nơi khác thì tạo lại từ lịch sử gốc (build()). Lịch sử cũ đã
+xóa khi hết hạn lưu giữ được giữ lại dưới dạng số liệu và cộng vào (merge()).
+"""
+import heapq
+import json
+import os
+from modules.vocab_store import file_signature
+
+# Đổi khi đổi cấu trúc file: file cũ sẽ được tạo lại từ lịch sử gốc
+FORMAT_VERSION = 2
+
+# Số từ sai nhiều nhất giữ sẵn trong heap
+TOP_K = 50
+
+# File bảng đếm có nhiều dòng hơn max(số dòng này, 2 × số từ) thì được ghi gọn lại
+COMPACT_MIN_LINES = 1000
+
+# Ngăn cách word/meaning trong khóa của wrong_counts (JSON chỉ có khóa chuỗi)
+_KEY_SEPARATOR = "\x1f"
+
+# Các file đã đọc: {đường dẫn: (chữ ký 2 file, dữ liệu)}, chỉ parse lại khi file đổi
+_cache = {}
+
+def empty(marker=None):
+    """Số liệu của lịch sử rỗng"""
+    return {
+        'format': FORMAT_VERSION,
+        'marker': marker,
+        'total_quizzes': 0,
+        'total_questions': 0,
+        'sum_accuracy': 0.0,
+        'best_score': 0.0,
+        'by_type': {},
+        'wrong_counts': {},
+        'top_wrong': [],
+        # Kích thước/số dòng của file bảng đếm lúc ghi (save() điền vào)
+        'wrong_size': 0,
+        'wrong_lines': 0
+    }
+
+def _word_key(word, meaning):
+    """Khóa của 1 từ trong wrong_counts"""
+    return f"{word}{_KEY_SEPARATOR}{meaning}"
+
+def _count_wrong(data, word, meaning):
+    """Tăng số lần sai của 1 từ và cập nhật heap top-K"""
+    key = _word_key(word, meaning)
+    count = data['wrong_counts'].get(key, 0) + 1
+    data['wrong_counts'][key] = count
+
+    heap = data['top_wrong']
+    for entry in heap:
+        if entry[1] == word and entry[2] == meaning:
+            entry[0] = count
+            heapq.heapify(heap)
+            return
+    entry = [count, word, meaning]
+    if len(heap) < TOP_K:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def add_result(data, log_data, wrong_rows):
+    """
+    Cộng 1 bài quiz vào số liệu (O(số từ sai), không đọc lịch sử)
+
+    Args:
+        log_data: dòng quiz_log của bài quiz (time, quiz_type, score, total, accuracy, ...)
+        wrong_rows: các dòng quiz_wrong_words của bài quiz
+    """
+    accuracy = float(log_data['accuracy'])
+    data['total_quizzes'] += 1
+    data['total_questions'] += int(log_data['total'])
+    data['sum_accuracy'] += accuracy
+    data['best_score'] = accuracy if data['total_quizzes'] == 1 else max(data['best_score'], accuracy)
+
+    by_type = data['by_type'].setdefault(str(log_data['quiz_type']), {'count': 0, 'sum_accuracy': 0.0})
+    by_type['count'] += 1
+    by_type['sum_accuracy'] += accuracy
+
+    for row in wrong_rows:
+        _count_wrong(data, str(row['word']), str(row['meaning']))
+
+def build(df_log, df_wrong, marker=None):
+    """Tạo số liệu từ lịch sử gốc (quiz_log, quiz_wrong_words)"""
+    data = empty(marker)
+    if not df_log.empty:
+        accuracy = df_log['accuracy'].astype(float)
+        data.update(
+            total_quizzes=len(df_log),
+            total_questions=int(df_log['total'].sum()),
+            sum_accuracy=float(accuracy.sum()),
+            best_score=float(accuracy.max())
+        )
+        per_type = accuracy.groupby(df_log['quiz_type'].astype(str)).agg(['count', 'sum'])
+        data['by_type'] = {quiz_type: {'count': int(row['count']), 'sum_accuracy': float(row['sum'])}
+                           for quiz_type, row in per_type.iterrows()}
+
+    if not df_wrong.empty:
+        words = df_wrong['word'].astype(object).fillna('').astype(str)
+        meanings = df_wrong['meaning'].astype(object).fillna('').astype(str)
+        counts = df_wrong.groupby([words, meanings]).size()
+        data['wrong_counts'] = {_word_key(word, meaning): int(count) for (word, meaning), count in counts.items()}
+        heap = heapq.nlargest(TOP_K, ([int(count), word, meaning] for (word, meaning), count in counts.items()))
+        heapq.heapify(heap)
+        data['top_wrong'] = heap
+    return data
+
+def merge(data, other):
+    """Cộng số liệu other vào data (vd: lịch sử cũ đã gộp + lịch sử gốc còn lại)"""
+    if other['total_quizzes']:
+        best = other['best_score'] if not data['total_quizzes'] else max(data['best_score'], other['best_score'])
+        data['best_score'] = best
+    data['total_quizzes'] += other['total_quizzes']
+    data['total_questions'] += other['total_questions']
+    data['sum_accuracy'] += other['sum_accuracy']
+
+    for quiz_type, totals in other['by_type'].items():
+        by_type = data['by_type'].setdefault(quiz_type, {'count': 0, 'sum_accuracy': 0.0})
+        by_type['count'] += totals['count']
+        by_type['sum_accuracy'] += totals['sum_accuracy']
+
+    counts = data['wrong_counts']
+    for key, count in other['wrong_counts'].items():
+        counts[key] = counts.get(key, 0) + count
+    heap = heapq.nlargest(TOP_K, ([count, *key.split(_KEY_SEPARATOR, 1)] for key, count in counts.items()))
+    heapq.heapify(heap)
+    data['top_wrong'] = heap
+    return data
+
+def top_wrong(data, top_n):
+    """Top N từ sai nhiều nhất: [(word, meaning, wrong_count), ...] giảm dần"""
+    if top_n > TOP_K and len(data['wrong_counts']) > TOP_K:
+        # Cần nhiều hơn heap đang giữ: chọn từ bảng đếm (không đọc lịch sử)
+        entries = heapq.nlargest(top_n, ([count, *key.split(_KEY_SEPARATOR, 1)]
+                                         for key, count in data['wrong_counts'].items()))
+    else:
+        entries = sorted(data['top_wrong'], reverse=True)[:top_n]
+    return [(word, meaning, count) for count, word, meaning in entries]
+
+def wrong_counts_path(path):
+    """File bảng đếm số lần sai đi kèm file số liệu"""
+    return os.path.splitext(path)[0] + ".wrong.jsonl"
+
+def normalize_marker(marker):
+    """Marker dạng như khi đọc lại từ JSON (tuple -> list) để so sánh"""
+    return json.loads(json.dumps(marker))
+
+def load(path):
+    """
+    Đọc file số liệu (chỉ parse lại khi file đổi)
+    Returns: dict số liệu, None nếu file chưa có/hỏng/khác phiên bản
+    """
+    signature = file_signature(path, wrong_counts_path(path))
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    data = None
+    if signature[0] is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (isinstance(data, dict) and data.get('format') == FORMAT_VERSION
+                    and data['wrong_size'] == _size(signature[1])):
+                data['wrong_counts'] = _read_wrong_counts(wrong_counts_path(path))
+            else:
+                data = None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Lỗi đọc số liệu lịch sử quiz: {e}")
+            data = None
+    _cache[path] = (signature, data)
+    return data
+
+def _size(signature):
+    """Kích thước file theo chữ ký (mtime_ns, size), file chưa có = 0"""
+    return signature[1] if signature is not None else 0
+
+def _read_wrong_counts(path):
+    """Cộng dồn các dòng của file bảng đếm: {khóa từ: số lần sai}"""
+    counts = {}
+    if not os.path.exists(path):
+        return counts
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            word, meaning, count = json.loads(line)
+            key = _word_key(word, meaning)
+            counts[key] = counts.get(key, 0) + count
+    return counts
+
+def _wrong_lines(counts):
+    """Các dòng JSONL của bảng đếm: [[word, meaning, số lần], ...]"""
+    return ''.join(json.dumps([*key.split(_KEY_SEPARATOR, 1), count], ensure_ascii=False) + '\n'
+                   for key, count in counts.items())
+
+def _write_atomic(path, text):
+    """Ghi file tạm + os.replace (không bao giờ đọc phải file ghi dở)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save(path, data, wrong_rows=None):
+    """
+    Ghi file số liệu
+
+    Args:
+        wrong_rows: None - ghi lại cả bảng đếm số lần sai;
+                    list - các dòng từ sai vừa cộng bằng add_result(): chỉ ghi
+                    thêm chúng vào cuối bảng đếm ([] = chỉ ghi số liệu tổng)
+    """
+    counts_path = wrong_counts_path(path)
+    appendable = (wrong_rows is not None and _size(file_signature(counts_path)[0]) == data['wrong_size']
+                  and data['wrong_lines'] + len(wrong_rows) <= max(COMPACT_MIN_LINES, 2 * len(data['wrong_counts'])))
+
+    if appendable:
+        if wrong_rows:
+            added = {}
+            for row in wrong_rows:
+                key = _word_key(str(row['word']), str(row['meaning']))
+                added[key] = added.get(key, 0) + 1
+            with open(counts_path, 'a', encoding='utf-8', newline='') as f:
+                f.write(_wrong_lines(added))
+                f.flush()
+                os.fsync(f.fileno())
+            data['wrong_lines'] += len(added)
+    else:
+        # Bảng đếm lệch/quá dài: ghi gọn lại, mỗi từ 1 dòng
+        _write_atomic(counts_path, _wrong_lines(data['wrong_counts']))
+        data['wrong_lines'] = len(data['wrong_counts'])
+    data['wrong_size'] = os.path.getsize(counts_path)
+
+    totals = {key: value for key, value in data.items() if key != 'wrong_counts'}
+    _write_atomic(path, json.dumps(totals, ensure_ascii=False))
+    _cache[path] = (file_signature(path, counts_path), data)
+
+def remove(path):
+    """Xóa file số liệu (lần đọc sau sẽ tạo lại từ lịch sử gốc)"""
+    for file_path in (path, wrong_counts_path(path)):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    _cache.pop(path, None)
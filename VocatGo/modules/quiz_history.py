@@ -1,27 +1,58 @@
 """
 quiz_history.py - Quản lý lịch sử làm quiz
+
+Mỗi bài quiz có session_id riêng; quiz_log và quiz_wrong_words nối với nhau
+qua session_id (dòng cũ chưa có session_id dùng time làm id).
+
+Số liệu tổng quan (get_quiz_stats, get_type_stats, get_most_wrong_words) đọc
+từ file tổng hợp (quiz_aggregates) được cộng thêm mỗi lần lưu quiz, không đọc
+lại toàn bộ lịch sử.
+
+Lịch sử CSV chia theo tháng (history_partitions), tháng đã qua được nén. Đặt
+VOCATGO_HISTORY_RETENTION_MONTHS=N để chỉ giữ chi tiết N tháng gần nhất: các
+tháng cũ hơn được gộp vào số liệu tổng hợp (quiz_retired.json) rồi xóa.
 """
+import copy
+import uuid
 import pandas as pd
 import os
 from datetime import datetime
+from modules import storage_sqlite, quiz_aggregates, history_partitions
+from modules.storage_sqlite import QUIZ_LOG_FIELDS, WRONG_WORD_FIELDS
+from modules.utils import file_lock
+from modules.vocab_store import file_signature
 
-# Đường dẫn file
-QUIZ_LOG_PATH = "data/history_quiz/quiz_log.csv"
-QUIZ_WRONG_WORDS_PATH = "data/history_quiz/quiz_wrong_words.csv"
+# Đường dẫn file (QUIZ_LOG_PATH, QUIZ_WRONG_WORDS_PATH: file cũ chưa chia tháng;
+# file lock của lịch sử dùng QUIZ_LOG_PATH)
+QUIZ_LOG_PATH = history_partitions.legacy_path(history_partitions.QUIZ_LOG)
+QUIZ_WRONG_WORDS_PATH = history_partitions.legacy_path(history_partitions.WRONG_WORDS)
+QUIZ_AGGREGATES_PATH = "data/history_quiz/quiz_aggregates.json"
+# Số liệu của lịch sử đã xóa khi hết hạn lưu giữ (không tạo lại được từ lịch sử)
+QUIZ_RETIRED_PATH = "data/history_quiz/quiz_retired.json"
+
+# Số tháng giữ chi tiết lịch sử (tính cả tháng hiện tại), 0 = giữ tất cả
+RETENTION_MONTHS = int(os.environ.get("VOCATGO_HISTORY_RETENTION_MONTHS", "0"))
 
 def ensure_history_folder():
     """Đảm bảo thư mục lưu lịch sử tồn tại"""
     os.makedirs("data/history_quiz", exist_ok=True)
 
-def save_quiz_result(quiz_type, score, total, wrong_words):
+def new_session_id():
+    """Tạo id cho 1 bài quiz"""
+    return uuid.uuid4().hex
+
+def save_quiz_result(quiz_type, score, total, wrong_words, session_id=None):
     """
-    Lưu kết quả quiz vào file
+    Lưu kết quả quiz vào file (ghi thêm dòng, không ghi lại cả file)
     
     Args:
         quiz_type: "multiple_choice" hoặc "typing"
         score: số câu đúng
         total: tổng số câu
         wrong_words: list các từ sai [{word, meaning, example}, ...]
+        session_id: id của bài quiz (mặc định: tạo id mới)
+    
+    Returns: session_id đã lưu
     """
     ensure_history_folder()
     
@@ -29,6 +60,7 @@ def save_quiz_result(quiz_type, score, total, wrong_words):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
     accuracy = (score / total * 100) if total > 0 else 0
     wrong_count = len(wrong_words)
+    session_id = session_id or new_session_id()
     
     log_data = {
         'time': timestamp,
@@ -36,53 +68,176 @@ def save_quiz_result(quiz_type, score, total, wrong_words):
         'score': score,
         'total': total,
         'accuracy': round(accuracy, 1),
-        'wrong_count': wrong_count
+        'wrong_count': wrong_count,
+        'session_id': session_id
     }
     
-    # Đọc file cũ hoặc tạo mới
-    if os.path.exists(QUIZ_LOG_PATH):
-        df_log = pd.read_csv(QUIZ_LOG_PATH)
-        df_log = pd.concat([df_log, pd.DataFrame([log_data])], ignore_index=True)
-    else:
-        df_log = pd.DataFrame([log_data])
-    
-    df_log.to_csv(QUIZ_LOG_PATH, index=False, encoding='utf-8-sig')
-    
-    # Lưu các từ sai vào quiz_wrong_words.csv
-    if wrong_words:
-        wrong_data = []
-        for word_info in wrong_words:
-            wrong_data.append({
-                'time': timestamp,
-                'word': word_info['word'],
-                'meaning': word_info['meaning'],
-                'example': word_info.get('example', ''),
-                'quiz_type': quiz_type
-            })
+    wrong_data = [{
+        'time': timestamp,
+        'word': word_info['word'],
+        'meaning': word_info['meaning'],
+        'example': word_info.get('example', ''),
+        'quiz_type': quiz_type,
+        'session_id': session_id
+    } for word_info in wrong_words]
+    
+    # Ghi trong file lock: 2 phiên lưu cùng lúc không mất dòng/mất số liệu
+    with file_lock(QUIZ_LOG_PATH):
+        aggregates = _load_aggregates()
         
-        if os.path.exists(QUIZ_WRONG_WORDS_PATH):
-            df_wrong = pd.read_csv(QUIZ_WRONG_WORDS_PATH)
-            df_wrong = pd.concat([df_wrong, pd.DataFrame(wrong_data)], ignore_index=True)
+        if storage_sqlite.is_enabled():
+            # SQLite: chỉ INSERT thêm dòng mới
+            storage_sqlite.append_quiz_result(log_data, wrong_data)
         else:
-            df_wrong = pd.DataFrame(wrong_data)
+            # CSV: ghi thêm dòng vào cuối file của tháng hiện tại
+            history_partitions.append(history_partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, [log_data])
+            if wrong_data:
+                history_partitions.append(history_partitions.WRONG_WORDS, WRONG_WORD_FIELDS, wrong_data)
         
-        df_wrong.to_csv(QUIZ_WRONG_WORDS_PATH, index=False, encoding='utf-8-sig')
+        quiz_aggregates.add_result(aggregates, log_data, wrong_data)
+        aggregates['marker'] = history_marker()
+        quiz_aggregates.save(QUIZ_AGGREGATES_PATH, aggregates, wrong_data)
+        
+        _maintain_history()
+    return session_id
+
+def load_quiz_log(start=None, end=None):
+    """
+    Đọc lịch sử quiz, lọc theo khoảng thời gian [start, end) nếu có
+    (chuỗi "YYYY-MM-DD HH:MM"/"YYYY-MM" hoặc date/datetime); CSV chỉ đọc các
+    tháng nằm trong khoảng
+    """
+    start, end = history_partitions.time_bound(start), history_partitions.time_bound(end)
+    if storage_sqlite.is_enabled():
+        return storage_sqlite.read_quiz_log(start, end)
+    return history_partitions.read(history_partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, start, end)
+
+def load_wrong_words(start=None, end=None):
+    """Đọc danh sách từ sai, lọc theo khoảng thời gian [start, end) như load_quiz_log()"""
+    start, end = history_partitions.time_bound(start), history_partitions.time_bound(end)
+    if storage_sqlite.is_enabled():
+        return storage_sqlite.read_wrong_words(start=start, end=end)
+    return history_partitions.read(history_partitions.WRONG_WORDS, WRONG_WORD_FIELDS, start, end)
 
-def load_quiz_log():
-    """Đọc lịch sử quiz"""
-    if os.path.exists(QUIZ_LOG_PATH):
-        return pd.read_csv(QUIZ_LOG_PATH)
-    return pd.DataFrame(columns=['time', 'quiz_type', 'score', 'total', 'accuracy', 'wrong_count'])
+def _shift_month(month, delta):
+    """Cộng delta tháng vào tháng YYYY-MM"""
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
 
-def load_wrong_words():
-    """Đọc danh sách từ sai"""
-    if os.path.exists(QUIZ_WRONG_WORDS_PATH):
-        return pd.read_csv(QUIZ_WRONG_WORDS_PATH)
-    return pd.DataFrame(columns=['time', 'word', 'meaning', 'example', 'quiz_type'])
+def _load_retired():
+    """Số liệu của lịch sử đã gộp (None nếu chưa gộp lần nào)"""
+    return quiz_aggregates.load(QUIZ_RETIRED_PATH)
+
+def history_marker():
+    """Dấu của nguồn lịch sử hiện tại (đổi khi lịch sử có dòng mới/bị sửa/được gộp)"""
+    if storage_sqlite.is_enabled():
+        marker = ['sqlite', storage_sqlite.history_marker()]
+    else:
+        marker = ['csv', history_partitions.signature()]
+    return quiz_aggregates.normalize_marker(marker + [file_signature(QUIZ_RETIRED_PATH)])
+
+def _build_aggregates(marker):
+    """Số liệu từ lịch sử gốc còn lại + số liệu của lịch sử đã gộp"""
+    retired = _load_retired()
+    # Dòng trước mốc đã gộp (nếu còn sót do lần gộp bị gián đoạn) không tính lại
+    start = retired['cutoff'] if retired else None
+    aggregates = quiz_aggregates.build(load_quiz_log(start), load_wrong_words(start), marker)
+    if retired:
+        quiz_aggregates.merge(aggregates, retired)
+    return aggregates
+
+def _load_aggregates():
+    """
+    Số liệu tổng hợp đã khớp với lịch sử hiện tại
+    File chưa có/hỏng hoặc lịch sử bị sửa từ nơi khác thì tạo lại từ lịch sử gốc.
+    """
+    ensure_history_folder()
+    with file_lock(QUIZ_LOG_PATH):
+        marker = history_marker()
+        aggregates = quiz_aggregates.load(QUIZ_AGGREGATES_PATH)
+        if aggregates is None or aggregates['marker'] != marker:
+            aggregates = _build_aggregates(marker)
+            quiz_aggregates.save(QUIZ_AGGREGATES_PATH, aggregates)
+        return aggregates
+
+def rebuild_aggregates():
+    """Tạo lại file số liệu tổng hợp từ lịch sử gốc (+ số liệu lịch sử đã gộp)"""
+    ensure_history_folder()
+    with file_lock(QUIZ_LOG_PATH):
+        aggregates = _build_aggregates(history_marker())
+        quiz_aggregates.save(QUIZ_AGGREGATES_PATH, aggregates)
+    return aggregates
+
+def _split_legacy():
+    """Chia file lịch sử CSV cũ (chưa chia tháng) vào các tháng"""
+    history_partitions.split_legacy({history_partitions.QUIZ_LOG: QUIZ_LOG_FIELDS,
+                                     history_partitions.WRONG_WORDS: WRONG_WORD_FIELDS})
+
+def apply_retention(months=None):
+    """
+    Gộp lịch sử cũ hơn N tháng gần nhất (tính cả tháng hiện tại) vào số liệu
+    tổng hợp rồi xóa chi tiết của chúng. Số liệu tổng quan không đổi; danh sách
+    chi tiết và từ sai của các bài cũ không còn.
+
+    Args:
+        months: số tháng giữ lại (mặc định: RETENTION_MONTHS)
+
+    Returns: (success: bool, message: str)
+    """
+    months = RETENTION_MONTHS if months is None else months
+    if months <= 0:
+        return False, "⚠️ Chưa đặt thời hạn lưu giữ lịch sử"
+
+    cutoff = _shift_month(datetime.now().strftime("%Y-%m"), -(months - 1))
+    ensure_history_folder()
+    with file_lock(QUIZ_LOG_PATH):
+        retired = copy.deepcopy(_load_retired()) or dict(quiz_aggregates.empty(), cutoff=None)
+        if retired['cutoff'] is not None and retired['cutoff'] >= cutoff:
+            return True, "✅ Không có lịch sử cũ cần gộp"
+
+        aggregates = _load_aggregates()
+        if not storage_sqlite.is_enabled():
+            _split_legacy()
+        rolled = quiz_aggregates.build(load_quiz_log(retired['cutoff'], cutoff),
+                                       load_wrong_words(retired['cutoff'], cutoff))
+        quiz_aggregates.merge(retired, rolled)
+        retired['cutoff'] = cutoff
+        # Ghi số liệu trước rồi mới xóa: bị gián đoạn giữa chừng thì phần chưa
+        # xóa nằm trước mốc cutoff, không bị tính 2 lần
+        quiz_aggregates.save(QUIZ_RETIRED_PATH, retired)
+
+        if storage_sqlite.is_enabled():
+            storage_sqlite.delete_quiz_history_before(cutoff)
+        else:
+            history_partitions.drop([month for month in history_partitions.months() if month < cutoff])
+
+        aggregates['marker'] = history_marker()
+        quiz_aggregates.save(QUIZ_AGGREGATES_PATH, aggregates, [])
+
+    return True, f"✅ Đã gộp {rolled['total_quizzes']} bài quiz trước tháng {cutoff} vào thống kê!"
+
+def _maintain_history():
+    """
+    Sau mỗi lần lưu (trong file lock): chia file cũ theo tháng, nén các tháng
+    đã qua và gộp lịch sử hết hạn lưu giữ. Chỉ tốn công khi sang tháng mới.
+    """
+    if not storage_sqlite.is_enabled():
+        _split_legacy()
+        if history_partitions.compact(datetime.now().strftime("%Y-%m")):
+            # Nén không đổi nội dung: chỉ cập nhật dấu của số liệu tổng hợp
+            aggregates = quiz_aggregates.load(QUIZ_AGGREGATES_PATH)
+            if aggregates is None:
+                # File số liệu mất/hỏng: tạo lại từ lịch sử gốc
+                rebuild_aggregates()
+            else:
+                aggregates['marker'] = history_marker()
+                quiz_aggregates.save(QUIZ_AGGREGATES_PATH, aggregates, [])
+    if RETENTION_MONTHS > 0:
+        apply_retention()
 
 def get_most_wrong_words(top_n=10):
     """
-    Lấy top N từ sai nhiều nhất
+    Lấy top N từ sai nhiều nhất (từ heap top-K của số liệu tổng hợp)
     
     Args:
         top_n: số lượng từ muốn lấy
@@ -90,27 +245,19 @@ def get_most_wrong_words(top_n=10):
     Returns:
         DataFrame với columns: word, meaning, wrong_count
     """
-    df_wrong = load_wrong_words()
-    
-    if df_wrong.empty:
-        return pd.DataFrame(columns=['word', 'meaning', 'wrong_count'])
-    
-    # Đếm số lần sai của mỗi từ
-    word_counts = df_wrong.groupby(['word', 'meaning']).size().reset_index(name='wrong_count')
-    word_counts = word_counts.sort_values('wrong_count', ascending=False)
-    
-    return word_counts.head(top_n)
+    rows = quiz_aggregates.top_wrong(_load_aggregates(), top_n)
+    return pd.DataFrame(rows, columns=['word', 'meaning', 'wrong_count'])
 
 def get_quiz_stats():
     """
-    Thống kê tổng quan về quiz
+    Thống kê tổng quan về quiz (O(1), đọc từ số liệu tổng hợp)
     
     Returns:
         dict với các thông tin: total_quizzes, avg_accuracy, best_score, total_questions
     """
-    df_log = load_quiz_log()
+    aggregates = _load_aggregates()
     
-    if df_log.empty:
+    if aggregates['total_quizzes'] == 0:
         return {
             'total_quizzes': 0,
             'avg_accuracy': 0,
@@ -119,10 +266,26 @@ def get_quiz_stats():
         }
     
     return {
-        'total_quizzes': len(df_log),
-        'avg_accuracy': round(df_log['accuracy'].mean(), 1),
-        'best_score': round(df_log['accuracy'].max(), 1),
-        'total_questions': df_log['total'].sum()
+        'total_quizzes': aggregates['total_quizzes'],
+        'avg_accuracy': round(aggregates['sum_accuracy'] / aggregates['total_quizzes'], 1),
+        'best_score': round(aggregates['best_score'], 1),
+        'total_questions': aggregates['total_questions']
+    }
+
+def get_type_stats():
+    """
+    Hiệu suất theo loại quiz (O(1), đọc từ số liệu tổng hợp)
+    
+    Returns:
+        dict {quiz_type: {'count': số lần làm, 'avg_accuracy': % điểm trung bình}}
+    """
+    return {
+        quiz_type: {
+            'count': totals['count'],
+            'avg_accuracy': totals['sum_accuracy'] / totals['count']
+        }
+        for quiz_type, totals in _load_aggregates()['by_type'].items()
+        if totals['count'] > 0
     }
 
 def get_wrong_words_by_time(time_str):
@@ -135,7 +298,11 @@ def get_wrong_words_by_time(time_str):
     Returns:
         DataFrame chứa các từ sai trong quiz đó
     """
-    df_wrong = load_wrong_words()
+    if storage_sqlite.is_enabled():
+        return storage_sqlite.read_wrong_words(time_str)
+    
+    # CSV: chỉ đọc từ tháng của bài quiz trở đi
+    df_wrong = load_wrong_words(start=time_str)
     
     if df_wrong.empty:
         return pd.DataFrame(columns=['word', 'meaning', 'example', 'quiz_type'])
@@ -143,12 +310,61 @@ def get_wrong_words_by_time(time_str):
     # Lọc theo thời gian
     return df_wrong[df_wrong['time'] == time_str]
 
+def get_wrong_words_by_session(session_id):
+    """
+    Lấy danh sách từ sai của 1 bài quiz theo session_id
+    Returns: DataFrame chứa các từ sai trong quiz đó
+    """
+    if storage_sqlite.is_enabled():
+        return storage_sqlite.read_wrong_words(session_id=session_id)
+    
+    df_wrong = load_wrong_words()
+    return df_wrong[df_wrong['session_id'] == session_id]
+
+def get_wrong_words_by_sessions(session_ids, times=None):
+    """
+    Từ sai của 1 nhóm bài quiz (vd: các bài trên 1 trang lịch sử)
+    
+    Args:
+        session_ids: session_id của các bài quiz
+        times: time của các bài đó (CSV: chỉ đọc các tháng chứa chúng)
+    
+    Returns: dict {session_id: DataFrame các từ sai}
+    """
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+    
+    if storage_sqlite.is_enabled():
+        df_wrong = storage_sqlite.read_wrong_words(session_ids=session_ids)
+    else:
+        only_months = None if times is None else {history_partitions.month_of(t) for t in times}
+        df_wrong = history_partitions.read(history_partitions.WRONG_WORDS, WRONG_WORD_FIELDS,
+                                           only_months=only_months)
+        df_wrong = df_wrong[df_wrong['session_id'].isin(session_ids)]
+    return {session_id: rows for session_id, rows in df_wrong.groupby('session_id', sort=False)}
+
+def get_wrong_words_index(start=None, end=None):
+    """
+    Index {session_id: DataFrame các từ sai} của lịch sử (trong khoảng [start, end) nếu có)
+    Đọc lịch sử từ sai 1 lần và nhóm 1 lần (dùng cho trang chi tiết thay vì
+    đọc lại file cho từng bài quiz)
+    """
+    df_wrong = load_wrong_words(start, end)
+    if df_wrong.empty:
+        return {}
+    return {session_id: rows for session_id, rows in df_wrong.groupby('session_id', sort=False)}
+
 def clear_history():
     """Xóa toàn bộ lịch sử quiz"""
-    if os.path.exists(QUIZ_LOG_PATH):
-        os.remove(QUIZ_LOG_PATH)
-    
-    if os.path.exists(QUIZ_WRONG_WORDS_PATH):
-        os.remove(QUIZ_WRONG_WORDS_PATH)
+    ensure_history_folder()
+    with file_lock(QUIZ_LOG_PATH):
+        if storage_sqlite.is_enabled():
+            storage_sqlite.clear_quiz_history()
+        else:
+            history_partitions.clear()
+        
+        quiz_aggregates.remove(QUIZ_AGGREGATES_PATH)
+        quiz_aggregates.remove(QUIZ_RETIRED_PATH)
     
     return True, "✅ Đã xóa toàn bộ lịch sử quiz!"
\ No newline at end of file
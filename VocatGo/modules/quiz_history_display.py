@@ -3,24 +3,41 @@ quiz_history_display.py - Hiển thị lịch sử làm quiz
 """
 import streamlit as st
 import pandas as pd
+from datetime import datetime, timedelta
 from modules.quiz_history import (
+    RETENTION_MONTHS,
     load_quiz_log, 
     get_most_wrong_words,
     get_quiz_stats,
-    get_wrong_words_by_time,
+    get_type_stats,
+    get_wrong_words_by_sessions,
     clear_history
 )
+from modules.quiz import init_quiz_session
+from modules.word_manager import get_word_ids
+
+# Số bài quiz mỗi trang ở tab chi tiết
+HISTORY_PAGE_SIZE = 20
+
+# Khoảng thời gian xem lịch sử: {nhãn: số ngày gần đây (None = tất cả)}
+TIME_RANGES = {"Tất cả": None, "30 ngày qua": 30, "3 tháng qua": 90, "12 tháng qua": 365}
 
 def show_quiz_history_page():
     """Hiển thị trang lịch sử quiz"""
     st.markdown("## 📜 Lịch sử Quiz")
     
-    df_log = load_quiz_log()
-    
-    if df_log.empty:
+    # Kiểm tra bằng số liệu tổng hợp, không đọc lịch sử
+    if get_quiz_stats()['total_quizzes'] == 0:
         st.info("📭 Bạn chưa làm quiz nào. Hãy bắt đầu làm quiz để theo dõi tiến độ!")
         return
     
+    # Chỉ đọc lịch sử trong khoảng đã chọn (CSV: chỉ mở các tháng liên quan)
+    time_range = st.selectbox("Khoảng thời gian:", list(TIME_RANGES), key="history_time_range",
+                              on_change=_reset_history_page)
+    days = TIME_RANGES[time_range]
+    start = datetime.now() - timedelta(days=days) if days else None
+    df_log = load_quiz_log(start=start)
+    
     # Tab chính
     tab1, tab2, tab3 = st.tabs(["📊 Tổng quan", "📈 Chi tiết", "❌ Từ sai nhiều"])
     
@@ -54,6 +71,9 @@ def show_overview(df_log):
     with col4:
         st.metric("Điểm cao nhất", f"{stats['best_score']}%")
     
+    if RETENTION_MONTHS > 0:
+        st.caption(f"💡 Chi tiết lịch sử chỉ giữ {RETENTION_MONTHS} tháng gần nhất; số liệu tổng quan tính cả các bài cũ hơn.")
+    
     st.markdown("---")
     
     # Biểu đồ tiến bộ theo thời gian
@@ -78,32 +98,41 @@ def show_overview(df_log):
     # So sánh hiệu suất giữa các loại quiz
     st.markdown("### 🎯 Hiệu suất theo loại quiz")
     
+    type_stats = get_type_stats()
     col1, col2 = st.columns(2)
     
     with col1:
-        mc_data = df_log[df_log['quiz_type'] == 'multiple_choice']
-        if not mc_data.empty:
+        mc_stats = type_stats.get('multiple_choice')
+        if mc_stats:
             st.metric(
                 "📝 Trắc nghiệm",
-                f"{mc_data['accuracy'].mean():.1f}%",
-                delta=f"{len(mc_data)} lần làm"
+                f"{mc_stats['avg_accuracy']:.1f}%",
+                delta=f"{mc_stats['count']} lần làm"
             )
         else:
             st.info("Chưa có dữ liệu trắc nghiệm")
     
     with col2:
-        typing_data = df_log[df_log['quiz_type'] == 'typing']
-        if not typing_data.empty:
+        typing_stats = type_stats.get('typing')
+        if typing_stats:
             st.metric(
                 "✏️ Điền từ",
-                f"{typing_data['accuracy'].mean():.1f}%",
-                delta=f"{len(typing_data)} lần làm"
+                f"{typing_stats['avg_accuracy']:.1f}%",
+                delta=f"{typing_stats['count']} lần làm"
             )
         else:
             st.info("Chưa có dữ liệu điền từ")
 
+def _reset_history_page():
+    """Đổi bộ lọc/sắp xếp: quay về trang đầu"""
+    st.session_state.history_page = 1
+
 def show_detailed_history(df_log):
-    """Hiển thị chi tiết lịch sử"""
+    """
+    Hiển thị chi tiết lịch sử theo trang (HISTORY_PAGE_SIZE bài mỗi trang)
+    Lọc và sắp xếp trên cả lịch sử rồi mới cắt trang; từ sai chỉ đọc cho các
+    bài trên trang đang xem.
+    """
     st.markdown("### 📋 Danh sách chi tiết các lần làm quiz")
     
     # Bộ lọc
@@ -112,42 +141,62 @@ def show_detailed_history(df_log):
     with col1:
         filter_type = st.selectbox(
             "Lọc theo loại:",
-            ["Tất cả", "Trắc nghiệm", "Điền từ"]
+            ["Tất cả", "Trắc nghiệm", "Điền từ"],
+            key="history_filter_type",
+            on_change=_reset_history_page
         )
     
     with col2:
         sort_order = st.selectbox(
             "Sắp xếp:",
-            ["Mới nhất", "Cũ nhất", "Điểm cao nhất", "Điểm thấp nhất"]
+            ["Mới nhất", "Cũ nhất", "Điểm cao nhất", "Điểm thấp nhất"],
+            key="history_sort_order",
+            on_change=_reset_history_page
         )
     
     # Áp dụng bộ lọc
-    df_filtered = df_log.copy()
+    df_filtered = df_log
     
     if filter_type == "Trắc nghiệm":
         df_filtered = df_filtered[df_filtered['quiz_type'] == 'multiple_choice']
     elif filter_type == "Điền từ":
         df_filtered = df_filtered[df_filtered['quiz_type'] == 'typing']
     
-    # Sắp xếp
+    # Sắp xếp (stable: thứ tự các trang giữ nguyên giữa các lần rerun)
     if sort_order == "Mới nhất":
-        df_filtered = df_filtered.sort_values('time', ascending=False)
+        # Đảo trước khi sắp xếp: các bài cùng phút, bài lưu sau đứng trước
+        df_filtered = df_filtered.iloc[::-1].sort_values('time', ascending=False, kind='stable')
     elif sort_order == "Cũ nhất":
-        df_filtered = df_filtered.sort_values('time', ascending=True)
+        df_filtered = df_filtered.sort_values('time', ascending=True, kind='stable')
     elif sort_order == "Điểm cao nhất":
-        df_filtered = df_filtered.sort_values('accuracy', ascending=False)
+        df_filtered = df_filtered.sort_values('accuracy', ascending=False, kind='stable')
     elif sort_order == "Điểm thấp nhất":
-        df_filtered = df_filtered.sort_values('accuracy', ascending=True)
+        df_filtered = df_filtered.sort_values('accuracy', ascending=True, kind='stable')
     
     st.markdown("---")
     
     if df_filtered.empty:
         st.info("Không có dữ liệu phù hợp với bộ lọc")
     else:
-        st.caption(f"Hiển thị {len(df_filtered)} kết quả")
+        total = len(df_filtered)
+        num_pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        # Lịch sử ít đi (đổi khoảng thời gian, xóa bớt): không vượt quá trang cuối
+        if st.session_state.get('history_page', 1) > num_pages:
+            st.session_state.history_page = num_pages
+        
+        page = st.number_input("Trang:", min_value=1, max_value=num_pages, step=1, key="history_page")
+        first = (page - 1) * HISTORY_PAGE_SIZE
+        df_page = df_filtered.iloc[first:first + HISTORY_PAGE_SIZE]
+        
+        st.caption(f"Hiển thị {first + 1}-{first + len(df_page)} / {total} kết quả (trang {page}/{num_pages})")
+        
+        # Từ sai: chỉ đọc cho các bài có từ sai trên trang này
+        has_wrong = df_page['wrong_count'] > 0
+        wrong_index = get_wrong_words_by_sessions(df_page.loc[has_wrong, 'session_id'],
+                                                  df_page.loc[has_wrong, 'time'])
         
         # Hiển thị bảng đẹp hơn với expander để xem chi tiết
-        for idx, row in df_filtered.iterrows():
+        for idx, row in df_page.iterrows():
             quiz_type_icon = "📝" if row['quiz_type'] == 'multiple_choice' else "✏️"
             quiz_type_name = "Trắc nghiệm" if row['quiz_type'] == 'multiple_choice' else "Điền từ"
             
@@ -181,9 +230,9 @@ def show_detailed_history(df_log):
                     st.markdown("#### ❌ Danh sách từ sai trong bài này:")
                     
                     # Lấy danh sách từ sai của quiz này
-                    wrong_words = get_wrong_words_by_time(row['time'])
+                    wrong_words = wrong_index.get(row['session_id'])
                     
-                    if not wrong_words.empty:
+                    if wrong_words is not None and not wrong_words.empty:
                         # Hiển thị từng từ sai
                         for w_idx, w_row in wrong_words.iterrows():
                             with st.container():
@@ -196,7 +245,7 @@ def show_detailed_history(df_log):
                                     st.markdown(f"{w_row['meaning']}")
                                 
                                 # Hiển thị ví dụ nếu có
-                                if w_row['example'] and str(w_row['example']).strip():
+                                if pd.notna(w_row['example']) and str(w_row['example']).strip():
                                     st.caption(f"💡 Ví dụ: {w_row['example']}")
                                 
                                 st.markdown("")
@@ -263,4 +312,11 @@ def show_most_wrong_words():
     
     with col2:
         if st.button("🧩 Làm Quiz với từ này", use_container_width=True, key="btn_quiz_wrong"):
-            st.info("Chức năng đang phát triển...")
+            # Chỉ hỏi các từ trong danh sách (từ đã bị xóa khỏi kho thì bỏ qua)
+            word_ids = [word_id for word_id in get_word_ids(df_wrong['word']) if word_id is not None]
+            if not word_ids:
+                st.error("❌ Các từ này không còn trong kho!")
+            elif init_quiz_session(len(word_ids), "multiple_choice", word_ids=word_ids):
+                st.rerun()
+            else:
+                st.error("❌ Không đủ từ để tạo quiz! Cần ít nhất 4 từ trong kho.")
@@ -0,0 +1,91 @@
+"""
+review_buffer.py - Bộ đệm câu trả lời flashcard của từng phiên ôn tập
+
+Thay vì ghi kho từ vựng sau mỗi thẻ, flashcard ghi câu trả lời vào 1 file
+nhỏ của phiên (data/review_buffer/<phiên>.jsonl, append + fsync) và chỉ áp
+vào kho bằng spaced_repetition.apply_reviews() khi xong phiên, sau mỗi N
+thẻ hoặc khi thoát.
+
+Buffer nằm trên đĩa nên không mất khi refresh trình duyệt (session_state bị
+xóa): lần mở app sau, các buffer còn sót được áp vào kho. Đọc + áp + xóa
+buffer luôn nằm trong file_lock(BUFFER_DIR) nên mỗi câu trả lời chỉ được áp
+đúng 1 lần, kể cả khi nhiều phiên cùng flush.
+"""
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+
+BUFFER_DIR = "data/review_buffer"
+
+_SESSION_ID = re.compile(r'[0-9a-f]{32}')
+
+def new_session_id():
+    """Tạo id phiên ôn tập mới (dùng làm tên file buffer)"""
+    return uuid.uuid4().hex
+
+def buffer_path(session_id):
+    """Đường dẫn file buffer của phiên"""
+    if not _SESSION_ID.fullmatch(str(session_id)):
+        raise ValueError(f"Id phiên không hợp lệ: {session_id}")
+    return os.path.join(BUFFER_DIR, f"{session_id}.jsonl")
+
+def append(session_id, word_id, remembered, reviewed_at=None):
+    """
+    Ghi thêm 1 câu trả lời vào buffer của phiên (gọi bên trong file_lock(BUFFER_DIR))
+    reviewed_at: datetime, mặc định là lúc gọi
+    """
+    os.makedirs(BUFFER_DIR, exist_ok=True)
+    reviewed_at = reviewed_at or datetime.now()
+    line = json.dumps({
+        'id': int(word_id),
+        'remembered': bool(remembered),
+        'ts': reviewed_at.isoformat(timespec='seconds')
+    })
+
+    with open(buffer_path(session_id), 'ab+') as f:
+        # Nếu dòng cuối bị ghi dở (crash), xuống dòng để không dính vào bản ghi mới
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write((line + '\n').encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def read(session_id):
+    """
+    Đọc các câu trả lời của phiên theo thứ tự
+    Returns: list (word_id, remembered, reviewed_at)
+    """
+    path = buffer_path(session_id)
+    if not os.path.exists(path):
+        return []
+
+    reviews = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                reviews.append((int(entry['id']), bool(entry['remembered']), datetime.fromisoformat(entry['ts'])))
+            except (ValueError, KeyError, TypeError):
+                # Dòng hỏng do crash khi đang ghi
+                continue
+    return reviews
+
+def clear(session_id):
+    """Xóa buffer sau khi đã áp vào kho"""
+    path = buffer_path(session_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+def list_sessions():
+    """Id các phiên đang có buffer trên đĩa"""
+    try:
+        names = os.listdir(BUFFER_DIR)
+    except OSError:
+        return []
+    return [name[:-len(".jsonl")] for name in names
+            if name.endswith(".jsonl") and _SESSION_ID.fullmatch(name[:-len(".jsonl")])]
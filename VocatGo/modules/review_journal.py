@@ -0,0 +1,120 @@
+"""
+review_journal.py - Nhật ký ôn tập dạng append-only cho backend CSV
+
+Mỗi lần bấm "Đã nhớ"/"Quên rồi" chỉ ghi thêm 1 dòng JSON nhỏ vào journal
+thay vì ghi lại toàn bộ words.csv. Khi load, journal được áp (replay) lên
+file gốc; khi journal vượt ngưỡng kích thước sẽ được gộp (compact) vào words.csv.
+
+An toàn khi crash:
+- Mỗi dòng lưu GIÁ TRỊ MỚI (không phải phép cộng/trừ) nên replay nhiều lần
+  vẫn cho cùng kết quả.
+- Dòng ghi dở (crash giữa chừng) không parse được sẽ bị bỏ qua.
+- Compact ghi words.csv ra file tạm rồi os.replace (nguyên tử), sau đó mới
+  xóa journal.
+"""
+import json
+import os
+from datetime import datetime
+
+# Các cột được phép ghi qua journal (chỉ tiến độ ôn tập và trạng thái xếp lịch)
+JOURNAL_FIELDS = {
+    'start_date', 'review_count', 'next_review',
+    'ease', 'stability', 'difficulty', 'lapses', 'interval_days'
+}
+
+# Gộp journal vào file gốc khi vượt ngưỡng này (bytes)
+COMPACT_THRESHOLD = 256 * 1024
+
+def journal_path(base_path):
+    """Đường dẫn file journal đi kèm file gốc"""
+    return os.path.splitext(base_path)[0] + ".journal"
+
+def append_entries(base_path, entries):
+    """
+    Ghi thêm các bản ghi vào journal (gọi bên trong file_lock)
+
+    Args:
+        base_path: đường dẫn file gốc (words.csv)
+        entries: list dict {'id': ..., 'fields': {...}}
+    """
+    path = journal_path(base_path)
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    lines = [
+        json.dumps({'ts': timestamp, 'id': int(e['id']), 'fields': e['fields']}, ensure_ascii=False)
+        for e in entries
+    ]
+
+    with open(path, 'ab+') as f:
+        # Nếu dòng cuối bị ghi dở (crash), xuống dòng để không dính vào bản ghi mới
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_entries(base_path):
+    """
+    Đọc journal, gộp theo từ (bản ghi sau ghi đè bản ghi trước)
+    Returns: dict {id: {cột: giá trị}}
+             (journal cũ chưa có id dùng khóa word.lower())
+    """
+    path = journal_path(base_path)
+    if not os.path.exists(path):
+        return {}
+
+    updates = {}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                key = int(entry['id']) if 'id' in entry else str(entry['word']).lower()
+                fields = {k: v for k, v in entry['fields'].items() if k in JOURNAL_FIELDS}
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # Dòng hỏng do crash khi đang ghi
+                continue
+            updates.setdefault(key, {}).update(fields)
+    return updates
+
+def replay(df, base_path, set_value=None):
+    """
+    Áp journal lên DataFrame vừa đọc từ file gốc (sửa tại chỗ)
+    Từ không còn trong kho (đã bị xóa) sẽ bị bỏ qua.
+    
+    Args:
+        set_value: hàm set_value(df, pos, col, value) để gán 1 ô
+                   (mặc định df.iat, dùng hàm riêng khi cột có kiểu category...)
+    """
+    updates = read_entries(base_path)
+    if not updates or df.empty:
+        return df
+
+    positions = {int(word_id): pos for pos, word_id in enumerate(df['id'])}
+    if any(isinstance(key, str) for key in updates):
+        positions.update({word: pos for pos, word in enumerate(df['word'].astype(str).str.lower())})
+
+    for key, fields in updates.items():
+        pos = positions.get(key)
+        if pos is None:
+            continue
+        for col, value in fields.items():
+            if set_value is not None:
+                set_value(df, pos, col, value)
+            else:
+                df.iat[pos, df.columns.get_loc(col)] = value
+    return df
+
+def needs_compaction(base_path):
+    """Kiểm tra journal đã vượt ngưỡng COMPACT_THRESHOLD chưa"""
+    try:
+        return os.path.getsize(journal_path(base_path)) > COMPACT_THRESHOLD
+    except OSError:
+        return False
+
+def clear(base_path):
+    """Xóa journal sau khi nội dung đã được ghi vào file gốc"""
+    path = journal_path(base_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,193 @@
+"""
+review_queue.py - Hàng đợi ôn tập trong ngày: xếp theo độ ưu tiên, giới hạn/ngày
+
+Thay vì lấy mọi từ đến hạn rồi xáo trộn (nghỉ 1 tuần là hàng nghìn thẻ nằm
+trong session_state), phiên ôn tập:
+- chỉ phục vụ tối đa NEW_PER_DAY từ mới và REVIEWS_PER_DAY từ ôn mỗi ngày
+  (trừ đi số từ đã ôn hôm nay)
+- lấy thẻ theo từng batch BATCH_SIZE, mỗi batch là các thẻ ưu tiên cao nhất
+  còn lại (argpartition, không sắp xếp cả hàng đợi)
+
+Độ ưu tiên = số lần khoảng ôn đã quá hạn (quá hạn 10 ngày với khoảng ôn 5 ngày
+= 2) + LAPSE_WEIGHT x số lần quên + QUIZ_ERROR_WEIGHT x số lần sai trong quiz
+RECENT_ERROR_DAYS ngày gần đây.
+
+Các thẻ đến hạn lấy từ hàng đợi ôn tập đã sắp xếp (get_due_word_ids, tìm nhị
+phân) thay vì quét cả kho; số lần sai trong quiz được đếm 1 lần và giữ lại
+đến khi lịch sử quiz hoặc ngày thay đổi. Các từ đã ôn hôm nay được đếm trên cả
+kho 1 lần mỗi ngày, sau đó chỉ xét lại các từ vừa bị sửa (vocab_store.changes_since).
+"""
+import os
+import threading
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from modules import scheduler, vocab_store
+from modules.word_manager import load_words, get_word_ids, get_words_by_ids, get_due_word_ids
+from modules.quiz_history import load_wrong_words, history_marker
+from modules.utils import today_day, NO_DAY
+
+NEW_PER_DAY = int(os.environ.get("VOCATGO_NEW_PER_DAY", "20"))
+REVIEWS_PER_DAY = int(os.environ.get("VOCATGO_REVIEWS_PER_DAY", "200"))
+
+# Số thẻ mỗi lần lấy thêm vào phiên
+BATCH_SIZE = 20
+
+# Các cột cần để tính độ ưu tiên (không copy cột chữ của hàng đợi)
+PRIORITY_COLUMNS = ['id', 'review_count', 'next_review_day', 'lapses', 'interval_days']
+
+LAPSE_WEIGHT = 0.5
+QUIZ_ERROR_WEIGHT = 1.0
+RECENT_ERROR_DAYS = 14
+
+# Các cột cần để biết từ đã ôn hôm nay chưa
+REVIEWED_COLUMNS = ['id', 'review_count', 'lapses', 'next_review_day', 'interval_days']
+
+# Số lần sai trong quiz gần đây theo từ + khóa (dấu lịch sử, ngày) lúc đếm
+_errors = {'key': None, 'counts': None}
+
+# id các từ mới/từ ôn đã ôn hôm nay + (ngày, phiên bản kho) lúc đếm
+_reviewed = {'today': None, 'data_version': None, 'new': set(), 'review': set()}
+_reviewed_lock = threading.Lock()
+
+def _is_new(words):
+    """Từ chưa ôn lần nào (chưa nhớ, chưa quên)"""
+    return (words['review_count'].to_numpy(np.int64) == 0) & (words['lapses'].to_numpy(np.int64) == 0)
+
+def _recent_error_counts(today):
+    """
+    Số lần sai trong quiz theo từ, tính từ đầu ngày cách đây RECENT_ERROR_DAYS
+    ngày; chỉ đọc lại lịch sử khi lịch sử quiz (history_marker) hoặc ngày đổi
+    """
+    key = (history_marker(), today)
+    if _errors['key'] != key:
+        # Chỉ đọc lịch sử RECENT_ERROR_DAYS ngày gần đây (CSV: chỉ mở 1-2 tháng cuối)
+        wrong = load_wrong_words(start=date.today() - timedelta(days=RECENT_ERROR_DAYS))
+        _errors.update(key=key, counts=wrong['word'].value_counts())
+    return _errors['counts']
+
+def _recent_quiz_errors(word_ids, today):
+    """Số lần sai trong quiz RECENT_ERROR_DAYS ngày gần đây của từng id"""
+    if len(word_ids) == 0:
+        return np.zeros(0)
+    counts = _recent_error_counts(today)
+    if counts.empty:
+        return np.zeros(len(word_ids))
+
+    # Chỉ tra id của các từ sai (ít), không chuẩn hóa cả hàng đợi
+    errors = pd.Series(counts.to_numpy(np.float64), index=pd.Index(get_word_ids(counts.index), dtype=object))
+    errors = errors[errors.index.notna()].groupby(level=0).sum()
+    return errors.reindex(word_ids).fillna(0).to_numpy(np.float64)
+
+def _due_cards(today):
+    """Các từ đến hạn: DataFrame id, is_new, priority"""
+    # Lấy từ hàng đợi ôn tập (tìm nhị phân), chỉ copy các cột số của các từ đến hạn
+    words = get_words_by_ids(get_due_word_ids(today), columns=PRIORITY_COLUMNS)
+    if words.empty:
+        return pd.DataFrame({'id': [], 'is_new': [], 'priority': []})
+
+    ids = words['id'].to_numpy(np.int64)
+    state = scheduler.word_state(words)
+    overdue = (today - state['next_review_day']) / scheduler.previous_interval(state)
+    priority = overdue + LAPSE_WEIGHT * state['lapses'] + QUIZ_ERROR_WEIGHT * _recent_quiz_errors(ids, today)
+    return pd.DataFrame({
+        'id': ids,
+        'is_new': _is_new(words),
+        'priority': priority
+    })
+
+def _reviewed_ids(words, today):
+    """
+    id các từ mới và từ ôn đã ôn hôm nay trong words (ngày đến hạn - khoảng ôn
+    = hôm nay). Từ mới được ước lượng là từ mới có 1 lần trả lời.
+    Returns: (mảng id từ mới, mảng id từ ôn)
+    """
+    if words.empty:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    ids = words['id'].to_numpy(np.int64)
+    due = words['next_review_day'].to_numpy(np.int64)
+    interval = words['interval_days'].to_numpy(np.int64)
+    reviewed = (interval > 0) & (due != NO_DAY) & (due - interval == today)
+    answers = words['review_count'].to_numpy(np.int64) + words['lapses'].to_numpy(np.int64)
+    is_new = answers <= 1
+    return ids[reviewed & is_new], ids[reviewed & ~is_new]
+
+def _reviewed_today(today):
+    """
+    Số từ mới và từ ôn đã ôn hôm nay
+    Đếm cả kho khi sang ngày mới hoặc DataFrame của kho bị thay, còn lại chỉ
+    xét lại các từ bị sửa từ lần đếm trước.
+    """
+    with _reviewed_lock:
+        # Lấy phiên bản trước khi đọc: lần ghi xen giữa sẽ được xét lại lần sau
+        version = vocab_store.data_version()
+        changed = vocab_store.changes_since(_reviewed['data_version']) if _reviewed['today'] == today else None
+        if changed is None:
+            new_ids, review_ids = _reviewed_ids(load_words(copy=False), today)
+            _reviewed.update(today=today, new=set(new_ids.tolist()), review=set(review_ids.tolist()))
+        elif changed:
+            _reviewed['new'].difference_update(changed)
+            _reviewed['review'].difference_update(changed)
+            new_ids, review_ids = _reviewed_ids(get_words_by_ids(list(set(changed)), columns=REVIEWED_COLUMNS), today)
+            _reviewed['new'].update(new_ids.tolist())
+            _reviewed['review'].update(review_ids.tolist())
+        _reviewed['data_version'] = version
+        return len(_reviewed['new']), len(_reviewed['review'])
+
+def plan_session(today=None, new_limit=NEW_PER_DAY, review_limit=REVIEWS_PER_DAY):
+    """
+    Số thẻ mới/thẻ ôn được phục vụ trong phiên hôm nay (sau giới hạn/ngày)
+    Returns: dict {'new': ..., 'review': ...} (dùng làm quota cho next_batch)
+    """
+    today = today_day() if today is None else today
+    cards = _due_cards(today)
+    new_done, review_done = _reviewed_today(today)
+    new_due = int(cards['is_new'].sum())
+    return {
+        'new': min(new_due, max(new_limit - new_done, 0)),
+        'review': min(len(cards) - new_due, max(review_limit - review_done, 0))
+    }
+
+def _top(cards, k):
+    """k thẻ ưu tiên cao nhất (cùng ưu tiên: id nhỏ trước), đã sắp xếp"""
+    if k <= 0 or cards.empty:
+        return np.array([], dtype=np.int64)
+    priority = cards['priority'].to_numpy()
+    ids = cards['id'].to_numpy(np.int64)
+    top = np.argpartition(-priority, k - 1)[:k] if len(cards) > k else np.arange(len(cards))
+    return ids[top[np.lexsort((ids[top], -priority[top]))]]
+
+def next_batch(quota, served_ids=(), today=None, size=BATCH_SIZE):
+    """
+    Lấy batch thẻ tiếp theo của phiên: ưu tiên cao nhất trong các thẻ chưa
+    phục vụ, thẻ ôn và thẻ mới chia theo tỉ lệ quota còn lại
+
+    Args:
+        quota: dict từ plan_session(), bị trừ đi số thẻ lấy ra (sửa tại chỗ)
+        served_ids: id các thẻ đã phục vụ trong phiên (câu trả lời có thể
+                    chưa được áp vào kho)
+
+    Returns: list id
+    """
+    remaining = quota['new'] + quota['review']
+    if remaining <= 0:
+        return []
+
+    today = today_day() if today is None else today
+    cards = _due_cards(today)
+    cards = cards[~cards['id'].isin(list(served_ids))]
+    is_new = cards['is_new'].to_numpy(bool)
+
+    size = min(size, remaining)
+    num_review = min(int(round(size * quota['review'] / remaining)), int((~is_new).sum()))
+    num_new = min(size - num_review, quota['new'], int(is_new.sum()))
+    # Hết thẻ mới đến hạn: lấy thêm thẻ ôn cho đủ batch
+    num_review = min(size - num_new, quota['review'], int((~is_new).sum()))
+
+    batch = np.concatenate([_top(cards[~is_new], num_review), _top(cards[is_new], num_new)])
+    quota['review'] -= num_review
+    quota['new'] -= num_new
+    # Không còn thẻ đến hạn (vd: đã ôn ở phiên khác): kết thúc quota
+    if len(batch) == 0:
+        quota['new'] = quota['review'] = 0
+    return [int(word_id) for word_id in batch]
@@ -0,0 +1,245 @@
+"""
+scheduler.py - Các thuật toán xếp lịch ôn tập (chọn bằng VOCATGO_SCHEDULER)
+
+- fixed (mặc định): bậc thang cố định FIXED_INTERVALS theo review_count
+- sm2: SuperMemo-2, mỗi từ có hệ số dễ (ease)
+- fsrs: FSRS-4.5, mỗi từ có độ ổn định (stability) và độ khó (difficulty),
+  khoảng ôn được chọn để xác suất còn nhớ bằng DESIRED_RETENTION
+
+Mọi thuật toán tính trên mảng NumPy (1 phần tử / từ), nên áp cả phiên ôn tập
+hay tính lại lịch cả kho sau khi đổi tham số chỉ là 1 lượt tính.
+
+Trạng thái của từ (xem STATE_COLUMNS) được lưu cùng kho từ vựng:
+- ease, stability, difficulty: NaN khi thuật toán tương ứng chưa dùng cho từ
+- lapses: số lần quên
+- interval_days: khoảng ôn của lần xếp lịch gần nhất (0 = chưa biết, khi đó
+  ước lượng theo bậc thang cố định)
+
+Cân bằng tải (VOCATGO_LOAD_BALANCE=1): khoảng ôn cố định dồn mọi từ học cùng
+ngày vào cùng các ngày ôn sau đó. balance() dời ngày đến hạn trong cửa sổ dung
+sai (±FUZZ_RATIO khoảng ôn, tối đa MAX_FUZZ_DAYS) sang ngày ít từ đến hạn nhất.
+"""
+import os
+import numpy as np
+from modules.utils import NO_DAY
+
+SCHEDULER = os.environ.get("VOCATGO_SCHEDULER", "fixed").strip().lower()
+
+STATE_COLUMNS = ['ease', 'stability', 'difficulty', 'lapses', 'interval_days']
+FLOAT_STATE_COLUMNS = ['ease', 'stability', 'difficulty']
+
+# Khoảng cách ôn tập (ngày) theo số lần ôn
+FIXED_INTERVALS = [1, 3, 7, 14, 30, 60, 120]
+
+# SM-2: chỉ có 2 mức trả lời, "Đã nhớ" = 4, "Quên rồi" = 2 (thang 0-5)
+SM2_INITIAL_EASE = 2.5
+SM2_MIN_EASE = 1.3
+SM2_QUALITY = {True: 4, False: 2}
+
+# FSRS-4.5: bộ tham số mặc định, "Đã nhớ" = Good (3), "Quên rồi" = Again (1)
+FSRS_WEIGHTS = np.array([
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755
+])
+DESIRED_RETENTION = float(os.environ.get("VOCATGO_DESIRED_RETENTION", "0.9"))
+_DECAY = -0.5
+_FACTOR = 19 / 81
+
+# Khoảng ôn tối đa (ngày)
+MAX_INTERVAL = 36500
+
+LOAD_BALANCE = os.environ.get("VOCATGO_LOAD_BALANCE", "").lower() in ("1", "true", "yes")
+FUZZ_RATIO = 0.1
+MAX_FUZZ_DAYS = 7
+# Khoảng ôn ngắn hơn thì không dời
+MIN_FUZZ_INTERVAL = 3
+# Số từ xếp cùng lúc trước khi cập nhật tải (nhỏ để các từ trong 1 lô không dồn vào cùng 1 ngày)
+BALANCE_CHUNK = 16
+
+def get_name():
+    """Tên thuật toán đang dùng (giá trị lạ -> fixed)"""
+    return SCHEDULER if SCHEDULER in SCHEDULERS else "fixed"
+
+def word_state(df):
+    """
+    Trạng thái xếp lịch của các từ dạng mảng (bản sao, sửa tự do)
+    df: DataFrame từ vựng (cần review_count, next_review_day và STATE_COLUMNS)
+    """
+    state = {
+        'review_count': df['review_count'].to_numpy(np.int64),
+        'next_review_day': df['next_review_day'].to_numpy(np.int64)
+    }
+    for col in STATE_COLUMNS:
+        if col in FLOAT_STATE_COLUMNS:
+            state[col] = df[col].to_numpy(np.float64, na_value=np.nan) if col in df.columns else np.full(len(df), np.nan)
+        else:
+            state[col] = df[col].to_numpy(np.int64) if col in df.columns else np.zeros(len(df), dtype=np.int64)
+    return state
+
+def _ladder(review_count):
+    """Khoảng ôn của bậc thang cố định theo review_count"""
+    intervals = np.array(FIXED_INTERVALS)
+    return intervals[np.clip(review_count, 0, len(intervals) - 1)]
+
+def previous_interval(state):
+    """Khoảng ôn lần trước (từ chưa lưu interval_days: ước lượng theo bậc thang)"""
+    return np.where(state['interval_days'] > 0, state['interval_days'], _ladder(state['review_count']))
+
+def _elapsed_days(state, answer_days):
+    """Số ngày từ lần ôn trước đến ngày trả lời"""
+    due = state['next_review_day']
+    elapsed = answer_days - (due - previous_interval(state))
+    return np.where(due == NO_DAY, 0, np.maximum(elapsed, 0))
+
+def _next_count(review_count, remembered):
+    """Nhớ: tăng review_count; Quên: giảm (tối thiểu 0)"""
+    return np.where(remembered, review_count + 1, np.maximum(review_count - 1, 0))
+
+# ==================== FIXED ====================
+
+def _fixed_review(state, remembered, elapsed):
+    """Nhớ: lên 1 bậc; Quên: xuống 1 bậc, ôn lại sau 1 ngày"""
+    count = _next_count(state['review_count'], remembered)
+    return {'review_count': count}, np.where(remembered, _ladder(count), 1)
+
+def _fixed_intervals(state):
+    """Khoảng ôn theo bậc hiện tại"""
+    return _ladder(state['review_count'])
+
+# ==================== SM-2 ====================
+
+def _sm2_review(state, remembered, elapsed):
+    """review_count là số lần nhớ liên tiếp (quên thì về 0, học lại từ đầu)"""
+    ease = np.where(np.isnan(state['ease']), SM2_INITIAL_EASE, state['ease'])
+    quality = np.where(remembered, SM2_QUALITY[True], SM2_QUALITY[False])
+    ease = np.maximum(ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02), SM2_MIN_EASE)
+
+    count = np.where(remembered, state['review_count'] + 1, 0)
+    interval = np.select(
+        [count <= 1, count == 2],
+        [1, 6],
+        np.rint(previous_interval(state) * ease)
+    )
+    return {'review_count': count, 'ease': ease}, interval
+
+def _sm2_intervals(state):
+    """SM-2 không có tham số toàn cục: giữ khoảng ôn đã xếp"""
+    return previous_interval(state)
+
+# ==================== FSRS ====================
+
+def _initial_difficulty(grade):
+    """Độ khó ban đầu theo mức trả lời (1-4): D0(G) = w4 - (G - 3) * w5"""
+    w = FSRS_WEIGHTS
+    return np.clip(w[4] - (grade - 3) * w[5], 1, 10)
+
+def _fsrs_interval(stability):
+    """Khoảng ôn để xác suất còn nhớ giảm về DESIRED_RETENTION"""
+    interval = stability / _FACTOR * (DESIRED_RETENTION ** (1 / _DECAY) - 1)
+    return np.clip(np.rint(interval), 1, MAX_INTERVAL)
+
+def _fsrs_review(state, remembered, elapsed):
+    """
+    Cập nhật độ ổn định và độ khó theo FSRS-4.5
+    Từ đã ôn theo lịch cũ nhưng chưa có trạng thái FSRS: lấy khoảng ôn trước
+    làm độ ổn định, độ khó trung bình.
+    """
+    w = FSRS_WEIGHTS
+    grade = np.where(remembered, 3, 1)
+    stability = state['stability']
+    difficulty = state['difficulty']
+
+    first = np.isnan(stability)
+    seeded = first & (state['review_count'] > 0)
+    first &= ~seeded
+    stability = np.where(seeded, previous_interval(state), stability)
+    difficulty = np.where(np.isnan(difficulty), _initial_difficulty(3), difficulty)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        retrievability = (1 + _FACTOR * elapsed / stability) ** _DECAY
+        recall = stability * (1 + np.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+                              * (np.exp(w[10] * (1 - retrievability)) - 1))
+        forget = np.minimum(
+            w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - retrievability)),
+            stability
+        )
+    # Kéo dần độ khó về độ khó ban đầu của mức Good (mean reversion)
+    next_difficulty = w[7] * _initial_difficulty(3) + (1 - w[7]) * (difficulty - w[6] * (grade - 3))
+
+    stability = np.where(first, w[grade - 1], np.where(remembered, recall, forget))
+    difficulty = np.where(first, _initial_difficulty(grade), np.clip(next_difficulty, 1, 10))
+    count = _next_count(state['review_count'], remembered)
+    return {'review_count': count, 'stability': stability, 'difficulty': difficulty}, _fsrs_interval(stability)
+
+def _fsrs_intervals(state):
+    """Khoảng ôn theo độ ổn định (đổi DESIRED_RETENTION sẽ đổi lịch cả kho)"""
+    return np.where(np.isnan(state['stability']), previous_interval(state), _fsrs_interval(state['stability']))
+
+SCHEDULERS = {
+    'fixed': (_fixed_review, _fixed_intervals),
+    'sm2': (_sm2_review, _sm2_intervals),
+    'fsrs': (_fsrs_review, _fsrs_intervals),
+}
+
+def review(state, remembered, answer_days, name=None):
+    """
+    Xếp lịch sau 1 lượt trả lời của các từ (mỗi từ tối đa 1 lần trong lượt)
+
+    Args:
+        state: dict mảng trạng thái (xem word_state()) của các từ
+        remembered: mảng bool
+        answer_days: ngày trả lời dạng số
+        name: tên thuật toán (mặc định get_name())
+
+    Returns: (dict {cột: mảng giá trị mới}, mảng khoảng ôn tính bằng ngày)
+             dict luôn có review_count, lapses, interval_days
+    """
+    review_fn, _ = SCHEDULERS[name or get_name()]
+    remembered = np.asarray(remembered, dtype=bool)
+    fields, interval = review_fn(state, remembered, _elapsed_days(state, np.asarray(answer_days)))
+    interval = np.clip(np.asarray(interval), 1, MAX_INTERVAL).astype(np.int64)
+    fields['lapses'] = state['lapses'] + ~remembered
+    fields['interval_days'] = interval
+    return fields, interval
+
+def intervals(state, name=None):
+    """Khoảng ôn (ngày) mà thuật toán xếp cho trạng thái hiện tại của các từ"""
+    _, intervals_fn = SCHEDULERS[name or get_name()]
+    return np.clip(np.rint(intervals_fn(state)), 1, MAX_INTERVAL).astype(np.int64)
+
+def fuzz_radius(intervals):
+    """Độ rộng cửa sổ dung sai (± ngày) theo khoảng ôn"""
+    intervals = np.asarray(intervals)
+    radius = np.minimum(np.rint(intervals * FUZZ_RATIO), MAX_FUZZ_DAYS).astype(np.int64)
+    return np.where(intervals >= MIN_FUZZ_INTERVAL, np.maximum(radius, 1), 0)
+
+def balance(due_days, intervals, load, load_start):
+    """
+    Chọn ngày ít tải nhất trong cửa sổ dung sai cho các từ vừa xếp lịch
+    (cùng tải thì chọn ngẫu nhiên, để các từ cùng ngày đến hạn tản ra)
+
+    Args:
+        due_days: ngày đến hạn đã xếp dạng số
+        intervals: khoảng ôn tương ứng (quyết định độ rộng cửa sổ)
+        load: số từ đến hạn từng ngày kể từ load_start, KHÔNG tính các từ
+              đang xếp; phải phủ [min(due_days) - MAX_FUZZ_DAYS, max(due_days) + MAX_FUZZ_DAYS]
+        load_start: ngày ứng với load[0]
+
+    Returns: mảng số ngày dời (cộng vào ngày đến hạn và khoảng ôn)
+    """
+    due_days = np.asarray(due_days, dtype=np.int64)
+    load = np.array(load, dtype=np.float64)
+    radius = fuzz_radius(intervals)
+    offsets = np.arange(-MAX_FUZZ_DAYS, MAX_FUZZ_DAYS + 1)
+    outside = np.abs(offsets) > radius[:, None]
+    shifts = np.zeros(len(due_days), dtype=np.int64)
+    rng = np.random.default_rng()
+
+    for start in range(0, len(due_days), BALANCE_CHUNK):
+        rows = slice(start, start + BALANCE_CHUNK)
+        days = due_days[rows, None] + offsets - load_start
+        score = load[days] + rng.random(days.shape)
+        score[outside[rows]] = np.inf
+        shifts[rows] = offsets[np.argmin(score, axis=1)]
+        np.add.at(load, due_days[rows] + shifts[rows] - load_start, 1)
+    return shifts
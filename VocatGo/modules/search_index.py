@@ -0,0 +1,208 @@
+"""
+search_index.py - Index tìm kiếm từ vựng (inverted index theo token)
+
+Trước đây search_words() lower() + str.contains trên cả kho ở mỗi lần rerun.
+Index này được tạo 1 lần từ DataFrame, vocab_store giữ và cập nhật tăng dần:
+- word, meaning, example được chuẩn hóa như fold_text() (chữ thường, bỏ dấu:
+  "thoa thuan" khớp "thỏa thuận") rồi tách thành token
+- danh sách token (vocab) + postings dạng CSR: token thứ t xuất hiện ở các
+  dòng postings[offsets[t]:offsets[t + 1]]
+- từ thêm/sửa sau khi tạo index nằm ở lớp delta nhỏ (dict), dòng cũ của chúng
+  bị đánh dấu bỏ; delta lớn quá thì vocab_store tạo lại index từ đầu
+
+Truy vấn: mỗi token của truy vấn phải là chuỗi con của 1 token trong từ (chỉ
+quét vocab, nhỏ hơn nhiều so với kho). Kết quả được xếp hạng:
+khớp cả từ > đầu từ > chứa trong từ > chỉ khớp nghĩa/ví dụ.
+
+Có pyarrow thì chuẩn hóa/tách token bằng pyarrow.compute (nhanh hơn nhiều
+khi tạo index cho kho lớn), không có thì dùng pandas.
+"""
+import re
+import numpy as np
+import pandas as pd
+from modules.utils import fold_text, fold_texts, COMBINING_MARKS
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+SEARCH_FIELDS = ['word', 'meaning', 'example']
+
+# Delta vượt max(MAX_DELTA, 1/10 số dòng) thì nên tạo lại index
+MAX_DELTA = 1000
+
+_TOKEN = re.compile(r'\w+')
+
+def _field_texts(df, col):
+    """Cột văn bản dạng chuỗi (ô trống -> '')"""
+    if col not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[col].astype(object).fillna('').astype(str)
+
+def _as_text(value):
+    """Giá trị 1 ô thành chuỗi (ô trống -> '')"""
+    return '' if value is None or pd.isna(value) else str(value)
+
+def _word_key(text):
+    """Khóa xếp hạng của 1 từ đã fold: gộp khoảng trắng"""
+    return ' '.join(text.split())
+
+def _fold_arrow(texts):
+    """fold_text() bằng pyarrow.compute cho cả cột"""
+    folded = pc.utf8_normalize(pc.utf8_lower(pa.array(texts.to_numpy(object), type=pa.large_string())), form='NFD')
+    return pc.replace_substring(pc.replace_substring_regex(folded, COMBINING_MARKS, ''), 'đ', 'd')
+
+def _tokenize(df):
+    """
+    Chuẩn hóa và tách token cả kho
+    Returns: (khóa từ theo dòng: Series, dòng của từng token, các token)
+    """
+    if pa is not None:
+        folded = [_fold_arrow(_field_texts(df, col)) for col in SEARCH_FIELDS]
+        words = pc.utf8_trim_whitespace(pc.replace_substring_regex(folded[0], r'\s+', ' '))
+        texts = pc.binary_join_element_wise(*folded, pa.scalar(' ', pa.large_string()))
+        lists = pc.split_pattern_regex(texts, r'[^\p{L}\p{N}_]+')
+        rows = pc.list_parent_indices(lists)
+        tokens = pc.list_flatten(lists)
+        has_text = pc.not_equal(tokens, '')
+        rows = pc.filter(rows, has_text).to_numpy()
+        tokens = pc.filter(tokens, has_text)
+        return pd.Series(words.to_numpy(zero_copy_only=False), dtype=str), rows, tokens
+
+    folded = [fold_texts(_field_texts(df, col)).reset_index(drop=True) for col in SEARCH_FIELDS]
+    texts = folded[0]
+    for col in folded[1:]:
+        texts = texts + ' ' + col
+    tokens = texts.str.replace(r'\W+', ' ', regex=True).str.split().explode().dropna()
+    return folded[0].str.split().str.join(' '), tokens.index.to_numpy(), tokens.to_numpy(object)
+
+def _factorize(tokens):
+    """Mã của từng token + danh sách token (vocab) đã sắp xếp"""
+    if pa is not None:
+        encoded = pc.dictionary_encode(tokens)
+        order = pc.array_sort_indices(encoded.dictionary).to_numpy()
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank[encoded.indices.to_numpy()], pc.take(encoded.dictionary, order).to_numpy(zero_copy_only=False)
+    return pd.factorize(tokens, sort=True)
+
+def build(df):
+    """
+    Tạo index từ DataFrame (cần cột id và các cột SEARCH_FIELDS)
+    Returns: dict index
+    """
+    words, rows, tokens = _tokenize(df)
+    codes, vocab = _factorize(tokens)
+
+    # Khóa (token, dòng) sắp xếp, bỏ trùng -> postings CSR theo token
+    num_rows = max(len(df), 1)
+    keys = codes.astype(np.int64) * num_rows + rows
+    keys.sort()
+    if len(keys):
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    token_codes, postings = np.divmod(keys, num_rows)
+
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(token_codes, minlength=len(vocab)), out=offsets[1:])
+
+    ids = df['id'].to_numpy(np.int64)
+    # id đã sắp xếp (chỉ đổi khi tạo lại index): remove() tìm dòng bằng searchsorted
+    id_order = np.argsort(ids, kind='stable')
+    return {
+        'ids': ids,
+        'id_order': id_order,
+        'sorted_ids': ids[id_order],
+        'alive': np.ones(len(ids), dtype=bool),
+        'words': words,
+        'lengths': words.str.len().to_numpy(np.int64),
+        'vocab': pd.Series(vocab, dtype=str),
+        'offsets': offsets,
+        'postings': postings.astype(np.int32),
+        'delta': {}
+    }
+
+def needs_rebuild(index):
+    """Delta đã quá lớn, tạo lại index sẽ nhanh hơn khi tìm"""
+    return len(index['delta']) > max(MAX_DELTA, len(index['ids']) // 10)
+
+def document(record):
+    """
+    Dữ liệu tìm kiếm của 1 từ (dict có SEARCH_FIELDS)
+    Returns: (khóa từ đã fold, tập token của word/meaning/example)
+    """
+    texts = [fold_text(_as_text(record.get(col))) for col in SEARCH_FIELDS]
+    return _word_key(texts[0]), frozenset(_TOKEN.findall(' '.join(texts)))
+
+def remove(index, word_ids):
+    """Bỏ các id khỏi index (từ bị xóa, hoặc bị sửa và sẽ được add() lại)"""
+    word_ids = np.fromiter(word_ids, dtype=np.int64)
+    for word_id in word_ids.tolist():
+        index['delta'].pop(word_id, None)
+
+    sorted_ids = index['sorted_ids']
+    pos = np.minimum(np.searchsorted(sorted_ids, word_ids), max(len(sorted_ids) - 1, 0))
+    found = sorted_ids[pos] == word_ids if len(sorted_ids) else np.zeros(len(word_ids), dtype=bool)
+    index['alive'][index['id_order'][pos[found]]] = False
+
+def add(index, documents):
+    """Thêm các từ vào lớp delta: documents = {id: document(...)}"""
+    index['delta'].update(documents)
+
+def _rows_with(index, token_codes):
+    """Mặt nạ các dòng chứa ít nhất 1 token trong token_codes"""
+    offsets = index['offsets']
+    starts = offsets[token_codes]
+    lengths = offsets[token_codes + 1] - starts
+    # Ghép các đoạn postings[start:start + length] không cần vòng lặp
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    rows = index['postings'][shift + np.arange(lengths.sum())]
+
+    mask = np.zeros(len(index['ids']), dtype=bool)
+    mask[rows] = True
+    return mask
+
+def _tiers(words, key):
+    """Hạng khớp của các từ: 0 cả từ, 1 đầu từ, 2 chứa trong từ, 3 nghĩa/ví dụ"""
+    tiers = np.full(len(words), 3, dtype=np.int64)
+    in_word = words.str.contains(key, regex=False).to_numpy(bool)
+    matched = words[in_word]
+    tiers[in_word] = np.where((matched == key).to_numpy(bool), 0,
+                              np.where(matched.str.startswith(key).to_numpy(bool), 1, 2))
+    return tiers
+
+def search(index, query, limit):
+    """
+    Tìm các từ khớp truy vấn (không phân biệt hoa thường, dấu)
+
+    Returns: (mảng id top `limit` đã xếp hạng, tổng số kết quả)
+    """
+    folded = fold_text(query)
+    terms = _TOKEN.findall(folded)
+    if not terms:
+        return np.array([], dtype=np.int64), 0
+    key = _word_key(folded)
+
+    # Bản chính: AND các token truy vấn, mỗi token khớp chuỗi con trong vocab
+    mask = index['alive'].copy()
+    for term in terms:
+        matched = np.flatnonzero(index['vocab'].str.contains(term, regex=False).to_numpy(bool))
+        mask &= _rows_with(index, matched)
+    rows = np.flatnonzero(mask)
+
+    # Lớp delta: vài từ vừa thêm/sửa, kiểm tra trực tiếp
+    delta = [(word_id, word) for word_id, (word, tokens) in index['delta'].items()
+             if all(any(term in token for token in tokens) for term in terms)]
+    delta_words = [word for _, word in delta]
+
+    ids = np.concatenate([index['ids'][rows], np.array([i for i, _ in delta], dtype=np.int64)])
+    words = pd.concat([index['words'].iloc[rows], pd.Series(delta_words, dtype=index['words'].dtype)],
+                      ignore_index=True)
+    lengths = np.concatenate([index['lengths'][rows], np.array([len(w) for w in delta_words], dtype=np.int64)])
+
+    # Khóa xếp hạng (hạng, độ dài từ, id) gộp trong 1 số int64: cùng hạng thì
+    # từ ngắn hơn (gần với truy vấn hơn) trước, rồi theo id
+    rank = (_tiers(words, key) << 58) | (np.minimum(lengths, 2**26 - 1) << 32) | ids
+    top = np.argpartition(rank, limit)[:limit] if len(rank) > limit else np.arange(len(rank))
+    return ids[top[np.argsort(rank[top])]], len(ids)
@@ -1,85 +1,193 @@
 """
 spaced_repetition.py - Hệ thống lặp lại ngắt quãng (SRS)
+
+Lịch ôn được tính bởi thuật toán trong scheduler.py (VOCATGO_SCHEDULER:
+fixed - mặc định, sm2, fsrs).
 """
-from modules.word_manager import load_words, save_words
-from modules.utils import get_today, add_days, is_due_today
+import numpy as np
+import pandas as pd
+from modules.word_manager import (
+    load_words, get_word, save_words, update_word_fields, update_words_fields,
+    get_words_by_ids, count_due_words, get_due_word_ids, get_due_forecast
+)
+from modules.utils import get_today, add_days, today_day, NO_DAY
+from modules import scheduler
+
+def _days_to_date_strs(days):
+    """Mảng ngày dạng số -> list chuỗi dd-mm-yyyy"""
+    return pd.to_datetime(pd.Series(days), unit='D').dt.strftime("%d-%m-%Y").tolist()
 
-# Khoảng cách ôn tập (ngày) theo số lần ôn
-REVIEW_INTERVALS = [1, 3, 7, 14, 30, 60, 120]
+def _load_window(due_days):
+    """Các ngày cần biết tải khi cân bằng lịch ôn: (ngày đầu, số ngày)"""
+    start = int(due_days.min()) - scheduler.MAX_FUZZ_DAYS
+    return start, int(due_days.max()) + scheduler.MAX_FUZZ_DAYS - start + 1
 
-def get_next_review_date(review_count):
+def update_word_review(word_id, remembered):
     """
-    Tính ngày ôn tiếp theo dựa trên số lần đã ôn
+    Cập nhật tiến độ ôn tập của từ
+    
+    Args:
+        word_id: id của từ
+        remembered: True nếu nhớ, False nếu quên
+    
+    Returns: (success: bool, message: str)
     """
-    today = get_today()
+    word_data = get_word(word_id)
     
-    if review_count >= len(REVIEW_INTERVALS):
-        # Đã thành thục, ôn sau 120 ngày
-        interval = REVIEW_INTERVALS[-1]
-    else:
-        interval = REVIEW_INTERVALS[review_count]
+    if word_data is None:
+        return False, "❌ Không tìm thấy từ!"
     
-    return add_days(today, interval)
+    word = word_data['word']
+    success, message = apply_reviews([(word_id, remembered, pd.Timestamp.now())])
+    if not success:
+        return False, message
+    
+    interval = int(get_word(word_id)['interval_days'])
+    if remembered:
+        return True, f"✅ Tuyệt vời! Từ '{word}' sẽ được ôn lại sau {interval} ngày."
+    if interval <= 1:
+        return True, f"💪 Đừng lo! Từ '{word}' sẽ xuất hiện lại vào ngày mai."
+    return True, f"💪 Đừng lo! Từ '{word}' sẽ xuất hiện lại sau {interval} ngày."
+
+def _state_value(col, value):
+    """Giá trị trạng thái để lưu (kiểu Python, số thực làm tròn cho file gọn)"""
+    if col in scheduler.FLOAT_STATE_COLUMNS:
+        return None if np.isnan(value) else round(float(value), 4)
+    return int(value)
 
-def update_word_review(index, remembered):
+def apply_reviews(reviews):
     """
-    Cập nhật tiến độ ôn tập của từ
+    Áp kết quả ôn tập của nhiều từ trong 1 lần ghi (tính toán vectorized)
+    Lịch ôn do thuật toán xếp lịch đang dùng tính, kể từ ngày trả lời.
     
     Args:
-        index: vị trí từ trong dataframe
-        remembered: True nếu nhớ, False nếu quên
+        reviews: list (word_id, remembered, reviewed_at) theo thứ tự trả lời,
+                 reviewed_at là datetime (1 từ có thể xuất hiện nhiều lần)
     
     Returns: (success: bool, message: str)
     """
-    df = load_words()
+    if not reviews:
+        return True, "Không có kết quả ôn tập nào cần lưu"
     
-    if index < 0 or index >= len(df):
-        return False, "❌ Index không hợp lệ!"
+    answers = pd.DataFrame(reviews, columns=['id', 'remembered', 'reviewed_at'])
+    answers['id'] = answers['id'].astype(np.int64)
     
-    current_count = int(df.at[index, 'review_count'])
+    words = get_words_by_ids(answers['id'].unique())
+    answers = answers[answers['id'].isin(words['id'])].reset_index(drop=True)
+    if answers.empty:
+        return False, "❌ Không tìm thấy từ!"
     
-    if remembered:
-        # Nhớ: tăng review_count
-        new_count = current_count + 1
-        df.at[index, 'review_count'] = new_count
-        df.at[index, 'next_review'] = get_next_review_date(new_count)
-        message = f"✅ Tuyệt vời! Từ '{df.at[index, 'word']}' sẽ được ôn lại sau {REVIEW_INTERVALS[min(new_count, len(REVIEW_INTERVALS)-1)]} ngày."
+    state = scheduler.word_state(words)
+    positions = pd.Index(words['id'].to_numpy(np.int64)).get_indexer(answers['id'])
+    answer_days = (pd.to_datetime(answers['reviewed_at']).dt.normalize() - pd.Timestamp("1970-01-01")).dt.days.to_numpy()
+    remembered = answers['remembered'].to_numpy(bool)
+    changed = {'review_count'}
+    
+    # Lần trả lời thứ k của mỗi từ được xử lý ở vòng k (mỗi vòng vectorized)
+    rounds = answers.groupby('id').cumcount().to_numpy()
+    for k in range(rounds.max() + 1):
+        in_round = rounds == k
+        pos = positions[in_round]
+        fields, interval = scheduler.review(
+            {col: values[pos] for col, values in state.items()},
+            remembered[in_round], answer_days[in_round]
+        )
+        for col, values in fields.items():
+            state[col][pos] = values
+        state['next_review_day'][pos] = answer_days[in_round] + interval
+        changed.update(fields)
+    
+    reviewed = np.unique(positions)
+    
+    # Cân bằng tải: tải lấy từ hàng đợi ôn tập, bỏ ngày đến hạn cũ của chính các từ vừa ôn
+    if scheduler.LOAD_BALANCE:
+        due = state['next_review_day'][reviewed]
+        start, num_days = _load_window(due)
+        load = get_due_forecast(start, num_days)
+        old = words['next_review_day'].to_numpy(np.int64)[reviewed] - start
+        np.subtract.at(load, old[(old >= 0) & (old < num_days)], 1)
+        shifts = scheduler.balance(due, state['interval_days'][reviewed], load, start)
+        state['next_review_day'][reviewed] += shifts
+        state['interval_days'][reviewed] += shifts
+    
+    next_reviews = _days_to_date_strs(state['next_review_day'][reviewed])
+    columns = [col for col in ['review_count'] + scheduler.STATE_COLUMNS if col in changed]
+    updates = {}
+    for i, pos in enumerate(reviewed):
+        fields = {col: _state_value(col, state[col][pos]) for col in columns}
+        fields['next_review'] = next_reviews[i]
+        updates[int(words['id'].iat[pos])] = fields
+    
+    if update_words_fields(updates):
+        return True, f"✅ Đã lưu kết quả ôn tập của {len(updates)} từ"
     else:
-        # Quên: giảm review_count (tối thiểu = 0)
-        new_count = max(current_count - 1, 0)
-        df.at[index, 'review_count'] = new_count
-        # Ôn lại sau 1 ngày
-        df.at[index, 'next_review'] = add_days(get_today(), 1)
-        message = f"💪 Đừng lo! Từ '{df.at[index, 'word']}' sẽ xuất hiện lại vào ngày mai."
+        return False, "❌ Lỗi khi lưu file!"
+
+def reschedule_all():
+    """
+    Tính lại ngày ôn của cả kho theo thuật toán/tham số hiện tại (vd: sau khi
+    đổi VOCATGO_SCHEDULER hoặc VOCATGO_DESIRED_RETENTION), giữ nguyên ngày ôn
+    lần trước của từng từ. 1 lượt tính vectorized + 1 lần ghi.
+    
+    Returns: (success: bool, message: str)
+    """
+    df = load_words(copy=False)
+    if df.empty:
+        return True, "Kho từ vựng trống"
+    
+    state = scheduler.word_state(df)
+    intervals = scheduler.intervals(state)
+    
+    # Chỉ từ đã có lịch; ngày ôn lần trước = ngày đến hạn - khoảng ôn đã xếp
+    due = state['next_review_day']
+    scheduled = due != NO_DAY
+    last_review = due - scheduler.previous_interval(state)
+    new_due = last_review + intervals
+    # Có cân bằng tải: lệch trong cửa sổ dung sai vẫn coi là khớp
+    tolerance = scheduler.fuzz_radius(intervals) if scheduler.LOAD_BALANCE else 0
+    changed = scheduled & ((np.abs(new_due - due) > tolerance) | (np.abs(state['interval_days'] - intervals) > tolerance))
+    if not changed.any():
+        return True, "✅ Lịch ôn đã khớp với thuật toán hiện tại"
+    
+    if scheduler.LOAD_BALANCE:
+        start, num_days = _load_window(new_due[changed])
+        kept = due[scheduled & ~changed] - start
+        load = np.bincount(kept[(kept >= 0) & (kept < num_days)], minlength=num_days)
+        shifts = scheduler.balance(new_due[changed], intervals[changed], load, start)
+        new_due[changed] += shifts
+        intervals[changed] += shifts
+    
+    df = df.copy()
+    df['next_review'] = df['next_review'].astype(object)
+    df.loc[changed, 'next_review'] = _days_to_date_strs(new_due[changed])
+    df.loc[changed, 'interval_days'] = intervals[changed]
     
     if save_words(df):
-        return True, message
+        return True, f"✅ Đã tính lại lịch ôn của {int(changed.sum())} từ"
     else:
         return False, "❌ Lỗi khi lưu file!"
 
 def get_due_words():
     """
-    Lấy danh sách các từ cần ôn hôm nay
+    Lấy danh sách các từ cần ôn hôm nay (quá hạn lâu nhất trước)
     Returns: DataFrame
     """
-    df = load_words()
-    
-    if df.empty:
-        return df
-    
-    # Lọc các từ có next_review <= hôm nay
-    due_mask = df['next_review'].apply(is_due_today)
-    return df[due_mask].reset_index(drop=True)
+    # Lấy id từ hàng đợi ôn tập (tìm nhị phân) thay vì lọc toàn bộ kho
+    return get_words_by_ids(get_due_word_ids(today_day()))
+
+def count_due_today():
+    """Số từ cần ôn hôm nay (không tạo DataFrame)"""
+    return count_due_words(today_day())
 
 def get_mastered_words():
     """
     Lấy danh sách các từ đã thành thục (review_count >= 6)
     Returns: DataFrame
     """
-    df = load_words()
+    df = load_words(copy=False)
     
     if df.empty:
-        return df
+        return df.copy()
     
     return df[df['review_count'] >= 6].reset_index(drop=True)
 
@@ -88,36 +196,39 @@ def get_learning_words():
     Lấy danh sách các từ đang học (review_count < 6)
     Returns: DataFrame
     """
-    df = load_words()
+    df = load_words(copy=False)
     
     if df.empty:
-        return df
+        return df.copy()
     
     return df[df['review_count'] < 6].reset_index(drop=True)
 
-def reset_word_progress(index):
+def reset_word_progress(word_id):
     """
     Reset tiến độ học của một từ về ban đầu
     
     Args:
-        index: vị trí từ trong dataframe
+        word_id: id của từ
     
     Returns: (success: bool, message: str)
     """
-    df = load_words()
+    word_data = get_word(word_id)
     
-    if index < 0 or index >= len(df):
-        return False, "❌ Index không hợp lệ!"
+    if word_data is None:
+        return False, "❌ Không tìm thấy từ!"
     
-    word = df.at[index, 'word']
+    word = word_data['word']
     today = get_today()
     
     # Reset về trạng thái ban đầu
-    df.at[index, 'start_date'] = today
-    df.at[index, 'review_count'] = 0
-    df.at[index, 'next_review'] = add_days(today, 1)
+    fields = {
+        'start_date': today,
+        'review_count': 0,
+        'next_review': add_days(today, 1),
+        **{col: None if col in scheduler.FLOAT_STATE_COLUMNS else 0 for col in scheduler.STATE_COLUMNS}
+    }
     
-    if save_words(df):
+    if update_word_fields(word_id, fields):
         return True, f"🔄 Đã reset tiến độ của từ '{word}'. Bắt đầu học lại từ đầu!"
     else:
         return False, "❌ Lỗi khi lưu file!"
@@ -127,7 +238,7 @@ def get_review_stats():
     Lấy thống kê về tiến độ ôn tập
     Returns: dict với các thông tin thống kê
     """
-    df = load_words()
+    df = load_words(copy=False)
     
     if df.empty:
         return {
@@ -139,7 +250,7 @@ def get_review_stats():
         }
     
     total = len(df)
-    due_today = len(get_due_words())
+    due_today = count_due_today()
     mastered = len(df[df['review_count'] >= 6])
     learning = total - mastered
     mastered_percentage = (mastered / total * 100) if total > 0 else 0
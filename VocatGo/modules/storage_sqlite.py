@@ -0,0 +1,490 @@
+"""
+storage_sqlite.py - Backend lưu trữ SQLite (tùy chọn) cho từ vựng và lịch sử quiz
+
+Bật bằng biến môi trường: VOCATGO_STORAGE=sqlite
+Lần đầu chạy sẽ tự động migrate dữ liệu từ các file CSV cũ.
+Có thể migrate thủ công: python -m modules.storage_sqlite
+"""
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+from modules import history_partitions, review_journal
+from modules.utils import file_lock, normalize_word, fold_text
+
+STORAGE_BACKEND = os.environ.get("VOCATGO_STORAGE", "csv").strip().lower()
+
+DB_FILE = "data/vocatgo.db"
+
+# File CSV cũ dùng cho migration (lịch sử quiz CSV đọc qua history_partitions)
+LEGACY_WORDS_CSV = "data/vocab/words.csv"
+
+# Trạng thái thuật toán xếp lịch (xem scheduler.py), thêm ở schema version 2
+STATE_FIELDS = {
+    'ease': 'REAL',
+    'stability': 'REAL',
+    'difficulty': 'REAL',
+    'lapses': 'INTEGER DEFAULT 0',
+    'interval_days': 'INTEGER DEFAULT 0'
+}
+INT_FIELDS = ['review_count', 'lapses', 'interval_days']
+
+WORD_FIELDS = ['word', 'pos', 'phonetic', 'meaning', 'example', 'start_date', 'review_count', 'next_review'] + list(STATE_FIELDS)
+
+# Khóa tìm từ trùng lưu cùng từ (thêm ở schema version 6), có index
+# idx_words_word_key: bỏ khoảng trắng thừa, không phân biệt hoa thường, bỏ dấu.
+# Thô hơn (hoặc bằng) normalize_word nên tra theo khóa này rồi lọc lại bằng
+# normalize_word cho đúng kết quả, kể cả khi đổi VOCATGO_FOLD_DIACRITICS.
+KEY_FIELD = 'word_key'
+# session_id: id duy nhất của mỗi bài quiz (thêm ở schema version 3), dùng để
+# nối quiz_log với quiz_wrong_words thay cho time (2 bài cùng phút bị gộp)
+QUIZ_LOG_FIELDS = ['time', 'quiz_type', 'score', 'total', 'accuracy', 'wrong_count', 'session_id']
+WRONG_WORD_FIELDS = ['time', 'word', 'meaning', 'example', 'quiz_type', 'session_id']
+
+# Cột thêm vào các bảng có sẵn khi nâng schema: {bảng: {cột: kiểu SQL}}
+ADDED_COLUMNS = {
+    'words': {**STATE_FIELDS, KEY_FIELD: 'TEXT'},
+    'quiz_log': {'session_id': 'TEXT'},
+    'quiz_wrong_words': {'session_id': 'TEXT'}
+}
+
+# Ngày lưu trong DB dạng yyyy-mm-dd để index next_review sắp xếp đúng thứ tự
+DATE_FIELDS = ['start_date', 'next_review']
+
+# Ngày đúng định dạng yyyy-mm-dd (ô trống, ngày sai định dạng không bao giờ đến hạn)
+DB_DATE_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+
+# Số tham số tối đa mỗi câu IN (...) (giới hạn biến của SQLite cũ là 999)
+MAX_PARAMS = 500
+
+# Tăng khi schema thay đổi
+SCHEMA_VERSION = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    word TEXT NOT NULL,
+    pos TEXT DEFAULT '',
+    phonetic TEXT DEFAULT '',
+    meaning TEXT DEFAULT '',
+    example TEXT DEFAULT '',
+    start_date TEXT DEFAULT '',
+    review_count INTEGER DEFAULT 0,
+    next_review TEXT DEFAULT '',
+    ease REAL,
+    stability REAL,
+    difficulty REAL,
+    lapses INTEGER DEFAULT 0,
+    interval_days INTEGER DEFAULT 0,
+    word_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_words_next_review ON words(next_review);
+
+CREATE TABLE IF NOT EXISTS quiz_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT,
+    quiz_type TEXT,
+    score INTEGER,
+    total INTEGER,
+    accuracy REAL,
+    wrong_count INTEGER,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_quiz_log_time ON quiz_log(time);
+
+CREATE TABLE IF NOT EXISTS quiz_wrong_words (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT,
+    word TEXT,
+    meaning TEXT,
+    example TEXT,
+    quiz_type TEXT,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_quiz_wrong_words_time ON quiz_wrong_words(time);
+"""
+
+def is_enabled():
+    """Kiểm tra backend SQLite có đang được bật không"""
+    return STORAGE_BACKEND == "sqlite"
+
+def to_db_date(date_str):
+    """Chuyển dd-mm-yyyy thành yyyy-mm-dd (giữ nguyên nếu sai định dạng)"""
+    parts = str(date_str).split('-')
+    if len(parts) == 3 and len(parts[0]) == 2 and len(parts[2]) == 4:
+        return f"{parts[2]}-{parts[1]}-{parts[0]}"
+    return date_str
+
+def _from_db_date_sql(col):
+    """Biểu thức SQL chuyển yyyy-mm-dd về dd-mm-yyyy"""
+    return (f"CASE WHEN length({col}) = 10 AND substr({col}, 5, 1) = '-' "
+            f"THEN substr({col}, 9, 2) || '-' || substr({col}, 6, 2) || '-' || substr({col}, 1, 4) "
+            f"ELSE {col} END AS {col}")
+
+def _select_words_sql():
+    """Câu SELECT trả về cột giống hệt file CSV (ngày dạng dd-mm-yyyy)"""
+    cols = ['id'] + [_from_db_date_sql(c) if c in DATE_FIELDS else c for c in WORD_FIELDS]
+    return f"SELECT {', '.join(cols)} FROM words"
+
+def _connect():
+    """Mở kết nối tới DB (tự tạo schema và migrate khi cần)"""
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    _ensure_schema(conn)
+    return conn
+
+def _ensure_schema(conn):
+    """
+    Tạo schema và migrate dữ liệu CSV cũ đúng 1 lần
+    (PRAGMA user_version đánh dấu DB đã được khởi tạo)
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    # Khóa ghi để 2 tiến trình không migrate trùng lặp
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            _add_missing_columns(conn)
+            _fill_word_keys(conn)
+            if version == 0:
+                _migrate(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _add_missing_columns(conn):
+    """DB tạo từ schema cũ (CREATE TABLE IF NOT EXISTS không thêm cột): ALTER TABLE thêm cột mới"""
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for field, declaration in columns.items():
+            if field not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {field} {declaration}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_wrong_words_session ON quiz_wrong_words(session_id)")
+    # Index lower(word) cũ (schema < 6) không khớp normalize_word: thay bằng index khóa
+    conn.execute("DROP INDEX IF EXISTS idx_words_word_lower")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_words_word_key ON words({KEY_FIELD})")
+
+def _fill_word_keys(conn):
+    """Tính khóa tìm từ trùng cho các từ ghi từ schema cũ (chưa có word_key)"""
+    rows = conn.execute(f"SELECT id, word FROM words WHERE {KEY_FIELD} IS NULL").fetchall()
+    conn.executemany(f"UPDATE words SET {KEY_FIELD} = ? WHERE id = ?",
+                     [(word_key(word), word_id) for word_id, word in rows])
+
+def word_key(word):
+    """Khóa tìm từ trùng lưu trong DB (xem KEY_FIELD)"""
+    return fold_text(' '.join(str(word).split()).casefold())
+
+def _word_row(record):
+    """Chuẩn hóa 1 bản ghi từ vựng thành tuple theo WORD_FIELDS + [KEY_FIELD]"""
+    row = []
+    for field in WORD_FIELDS:
+        value = record.get(field, 0 if field in INT_FIELDS else None)
+        if field in STATE_FIELDS and field not in INT_FIELDS:
+            # ease/stability/difficulty: NULL khi chưa có
+            row.append(None if value is None or pd.isna(value) else float(value))
+            continue
+        if pd.isna(value):
+            value = 0 if field in INT_FIELDS else ''
+        if field in INT_FIELDS:
+            value = int(value)
+        elif field in DATE_FIELDS:
+            value = to_db_date(value)
+        else:
+            value = str(value)
+        row.append(value)
+    row.append(word_key(row[0]))
+    return tuple(row)
+
+def _placeholders(fields):
+    """Chuỗi "?, ?, ..." cho câu INSERT"""
+    return ', '.join('?' for _ in fields)
+
+def _none_if_na(value):
+    """Ô trống (NaN) -> NULL"""
+    return None if value is None or pd.isna(value) else value
+
+def _insert_words(conn, records):
+    """Insert nhiều từ trong 1 transaction"""
+    fields = WORD_FIELDS + [KEY_FIELD]
+    conn.executemany(
+        f"INSERT INTO words ({', '.join(fields)}) VALUES ({_placeholders(fields)})",
+        [_word_row(r) for r in records]
+    )
+
+def _insert_words_with_ids(conn, records):
+    """
+    Insert nhiều từ giữ nguyên id (id đã có ở nơi khác: review buffer, danh sách
+    flashcard/quiz). AUTOINCREMENT tự nâng sqlite_sequence lên max(id) nên từ
+    thêm sau nhận id mới lớn hơn, không dùng lại id đã có.
+    """
+    fields = ['id'] + WORD_FIELDS + [KEY_FIELD]
+    conn.executemany(
+        f"INSERT INTO words ({', '.join(fields)}) VALUES ({_placeholders(fields)})",
+        [(int(r['id']),) + _word_row(r) for r in records]
+    )
+
+def _legacy_ids(df):
+    """
+    Id ổn định của file CSV cũ (như word_manager: dòng thiếu id/trùng id nhận
+    id tiếp theo sau max(id), các dòng khác giữ nguyên id)
+    """
+    ids = pd.to_numeric(df['id'], errors='coerce') if 'id' in df.columns else pd.Series(float('nan'), index=df.index)
+    invalid = ids.isna() | ids.duplicated()
+    if invalid.any():
+        start = int(ids[~invalid].max()) + 1 if (~invalid).any() else 1
+        ids.loc[invalid] = list(range(start, start + int(invalid.sum())))
+    df['id'] = ids.astype('int64')
+
+def _read_legacy_csv(path):
+    """
+    Đọc file CSV cũ, trả về list dict (rỗng nếu không có file)
+    Các lần ôn tập còn nằm trong journal (chưa gộp vào CSV) được áp lên trước
+    khi migrate; đọc trong file_lock để không lệch với 1 lần ghi journal/CSV.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with file_lock(path):
+            df = pd.read_csv(path, encoding='utf-8-sig')
+            _legacy_ids(df)
+            review_journal.replay(df, path)
+    except pd.errors.EmptyDataError:
+        return []
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return []
+    return df.to_dict('records')
+
+def _read_csv_history(name, fields):
+    """Đọc lịch sử quiz CSV (mọi tháng), trả về list dict"""
+    try:
+        return history_partitions.read(name, fields).to_dict('records')
+    except Exception as e:
+        print(f"Error reading quiz history {name}: {e}")
+        return []
+
+def _migrate(conn, words_csv=LEGACY_WORDS_CSV):
+    """Chép dữ liệu từ các file CSV cũ vào DB (chỉ chạy 1 lần khi khởi tạo DB)"""
+    _insert_words_with_ids(conn, _read_legacy_csv(words_csv))
+
+    log_rows = _read_csv_history(history_partitions.QUIZ_LOG, QUIZ_LOG_FIELDS)
+    conn.executemany(
+        f"INSERT INTO quiz_log ({', '.join(QUIZ_LOG_FIELDS)}) VALUES ({_placeholders(QUIZ_LOG_FIELDS)})",
+        [tuple(_none_if_na(r.get(f)) for f in QUIZ_LOG_FIELDS) for r in log_rows]
+    )
+
+    wrong_rows = _read_csv_history(history_partitions.WRONG_WORDS, WRONG_WORD_FIELDS)
+    conn.executemany(
+        f"INSERT INTO quiz_wrong_words ({', '.join(WRONG_WORD_FIELDS)}) VALUES ({_placeholders(WRONG_WORD_FIELDS)})",
+        [tuple(_none_if_na(r.get(f)) if f == 'session_id' else ('' if pd.isna(r.get(f, '')) else r.get(f, ''))
+               for f in WRONG_WORD_FIELDS) for r in wrong_rows]
+    )
+
+def migrate_from_csv():
+    """
+    Migrate thủ công từ CSV sang SQLite (bỏ qua nếu DB đã được khởi tạo)
+    Returns: (success: bool, message: str)
+    """
+    if os.path.exists(DB_FILE):
+        with closing(sqlite3.connect(DB_FILE)) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] > 0:
+                return False, f"⚠️ Database '{DB_FILE}' đã tồn tại, bỏ qua migration!"
+
+    with closing(_connect()) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+
+    return True, f"✅ Đã migrate {count} từ sang '{DB_FILE}'!"
+
+# ==================== TỪ VỰNG ====================
+
+def read_words():
+    """Đọc toàn bộ từ vựng (sắp xếp theo id), trả về None nếu lỗi"""
+    try:
+        with closing(_connect()) as conn:
+            return pd.read_sql_query(_select_words_sql() + " ORDER BY id", conn)
+    except Exception as e:
+        print(f"Error loading database: {e}")
+        return None
+
+def _due_condition():
+    """Điều kiện WHERE lấy từ có next_review <= ? (quét khoảng trên index idx_words_next_review)"""
+    return f"next_review <= ? AND next_review GLOB '{DB_DATE_GLOB}'"
+
+def count_due_words(until_date):
+    """Số từ có next_review <= until_date (dd-mm-yyyy), đếm trên index, không đọc cả bảng"""
+    with closing(_connect()) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM words WHERE {_due_condition()}",
+                            (to_db_date(until_date),)).fetchone()[0]
+
+def read_due_ids(until_date):
+    """id các từ có next_review <= until_date (dd-mm-yyyy), quá hạn lâu nhất trước"""
+    with closing(_connect()) as conn:
+        rows = conn.execute(f"SELECT id FROM words WHERE {_due_condition()} ORDER BY next_review, id",
+                            (to_db_date(until_date),)).fetchall()
+    return [row[0] for row in rows]
+
+def find_word_ids(words):
+    """
+    Tìm id các từ theo khóa chuẩn hóa (normalize_word) qua index idx_words_word_key
+    Returns: list id (None nếu chưa có; nhiều từ trùng khóa -> id nhỏ nhất)
+    """
+    keys = sorted({word_key(word) for word in words})
+    found = {}
+    with closing(_connect()) as conn:
+        for start in range(0, len(keys), MAX_PARAMS):
+            chunk = keys[start:start + MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT id, word FROM words WHERE {KEY_FIELD} IN ({_placeholders(chunk)}) ORDER BY id", chunk
+            )
+            for word_id, word in rows:
+                found.setdefault(normalize_word(word), word_id)
+    return [found.get(normalize_word(word)) for word in words]
+
+def _update_word(conn, word_id, fields):
+    """UPDATE 1 dòng theo id, trả về True nếu có dòng được cập nhật"""
+    if 'word' in fields:
+        fields = {**fields, KEY_FIELD: word_key(fields['word'])}
+    values = [to_db_date(v) if k in DATE_FIELDS else v for k, v in fields.items()]
+    assignments = ', '.join(f"{k} = ?" for k in fields)
+    cursor = conn.execute(f"UPDATE words SET {assignments} WHERE id = ?", values + [int(word_id)])
+    return cursor.rowcount > 0
+
+def update_word(word_id, fields):
+    """
+    Cập nhật 1 dòng (UPDATE ... WHERE id = ?), chi phí không phụ thuộc số từ
+
+    Args:
+        word_id: id của từ
+        fields: dict {tên cột: giá trị mới}
+    """
+    with closing(_connect()) as conn, conn:
+        return _update_word(conn, word_id, fields)
+
+def upsert_words(records, updates):
+    """
+    Thêm từ mới và cập nhật từ đã có trong cùng 1 transaction
+
+    Args:
+        records: list dict các từ mới
+        updates: dict {id: {tên cột: giá trị mới}}
+
+    Returns: list id của các từ vừa thêm
+    """
+    with closing(_connect()) as conn, conn:
+        for word_id, fields in updates.items():
+            _update_word(conn, word_id, fields)
+        start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM words").fetchone()[0]
+        _insert_words(conn, records)
+        return [row[0] for row in conn.execute("SELECT id FROM words WHERE id > ? ORDER BY id", (start,))]
+
+def delete_word(word_id):
+    """Xóa 1 từ theo id"""
+    with closing(_connect()) as conn, conn:
+        cursor = conn.execute("DELETE FROM words WHERE id = ?", (int(word_id),))
+        return cursor.rowcount > 0
+
+def replace_all_words(df):
+    """Ghi đè toàn bộ bảng words bằng DataFrame (dùng cho save_words)"""
+    records = df.to_dict('records')
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM words")
+        if 'id' in df.columns and df['id'].notna().all() and df['id'].is_unique:
+            _insert_words_with_ids(conn, records)
+        else:
+            _insert_words(conn, records)
+
+# ==================== LỊCH SỬ QUIZ ====================
+
+def append_quiz_result(log_data, wrong_rows):
+    """Thêm 1 kết quả quiz và các từ sai (INSERT, không ghi lại toàn bộ)"""
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            f"INSERT INTO quiz_log ({', '.join(QUIZ_LOG_FIELDS)}) VALUES ({_placeholders(QUIZ_LOG_FIELDS)})",
+            tuple(log_data[f] for f in QUIZ_LOG_FIELDS)
+        )
+        conn.executemany(
+            f"INSERT INTO quiz_wrong_words ({', '.join(WRONG_WORD_FIELDS)}) VALUES ({_placeholders(WRONG_WORD_FIELDS)})",
+            [tuple(r[f] for f in WRONG_WORD_FIELDS) for r in wrong_rows]
+        )
+
+def _history_columns(fields):
+    """Cột SELECT của bảng lịch sử; dòng cũ chưa có session_id dùng time làm id"""
+    return ', '.join("COALESCE(session_id, time) AS session_id" if f == 'session_id' else f for f in fields)
+
+def _time_range(start, end):
+    """
+    Điều kiện WHERE cho khoảng thời gian [start, end) (dùng index theo time)
+    time NULL coi như trước mọi mốc (giống lịch sử CSV)
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("time >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("(time < ? OR time IS NULL)")
+        params.append(end)
+    return conditions, params
+
+def read_quiz_log(start=None, end=None):
+    """Đọc lịch sử quiz, lọc theo khoảng thời gian [start, end) nếu có (index idx_quiz_log_time)"""
+    conditions, params = _time_range(start, end)
+    query = f"SELECT {_history_columns(QUIZ_LOG_FIELDS)} FROM quiz_log"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    with closing(_connect()) as conn:
+        return pd.read_sql_query(query + " ORDER BY id", conn, params=params)
+
+def read_wrong_words(time_str=None, session_id=None, start=None, end=None, session_ids=None):
+    """
+    Đọc danh sách từ sai, lọc theo thời gian (index idx_quiz_wrong_words_time)
+    hoặc theo 1/nhiều bài quiz (index idx_quiz_wrong_words_session) nếu có
+    """
+    conditions, params = _time_range(start, end)
+    if session_id is not None:
+        session_ids = [session_id]
+    if time_str is not None:
+        conditions.append("time = ?")
+        params.append(time_str)
+    elif session_ids is not None:
+        ids = list(session_ids)
+        conditions.append(f"(session_id IN ({_placeholders(ids)}) OR (session_id IS NULL AND time IN ({_placeholders(ids)})))")
+        params.extend(ids + ids)
+    query = f"SELECT {_history_columns(WRONG_WORD_FIELDS)} FROM quiz_wrong_words"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    with closing(_connect()) as conn:
+        return pd.read_sql_query(query + " ORDER BY id", conn, params=params)
+
+def history_marker():
+    """
+    Dấu của lịch sử quiz: id nhỏ nhất/lớn nhất của 2 bảng (AUTOINCREMENT nên
+    không dùng lại id cũ). Đổi khi có dòng mới hoặc khi xóa lịch sử cũ; đọc
+    O(log n) qua khóa chính.
+    """
+    with closing(_connect()) as conn:
+        return list(conn.execute(
+            "SELECT (SELECT MIN(id) FROM quiz_log), (SELECT MAX(id) FROM quiz_log), "
+            "(SELECT MIN(id) FROM quiz_wrong_words), (SELECT MAX(id) FROM quiz_wrong_words)"
+        ).fetchone())
+
+def delete_quiz_history_before(cutoff):
+    """Xóa lịch sử quiz có time < cutoff (đã được gộp vào số liệu tổng hợp)"""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM quiz_log WHERE time < ? OR time IS NULL", (cutoff,))
+        conn.execute("DELETE FROM quiz_wrong_words WHERE time < ? OR time IS NULL", (cutoff,))
+
+def clear_quiz_history():
+    """Xóa toàn bộ lịch sử quiz"""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM quiz_log")
+        conn.execute("DELETE FROM quiz_wrong_words")
+
+if __name__ == "__main__":
+    print(migrate_from_csv()[1])
@@ -2,7 +2,33 @@
 utils.py - Các hàm phụ trợ cho ứng dụng học từ vựng
 """
 from datetime import datetime, timedelta
+from contextlib import contextmanager
+import os
 import random
+import re
+import threading
+import unicodedata
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Mốc tính ngày dạng số (số ngày kể từ 01-01-1970)
+EPOCH = datetime(1970, 1, 1)
+
+# Ngày trống/không hợp lệ: lớn hơn mọi ngày thật nên không bao giờ "đến hạn"
+NO_DAY = 2**31 - 1
+
+# So khớp từ trùng bỏ qua cả dấu (café = cafe), bật bằng VOCATGO_FOLD_DIACRITICS=1
+FOLD_DIACRITICS = os.environ.get("VOCATGO_FOLD_DIACRITICS", "").lower() in ("1", "true", "yes")
+
+# Dấu kết hợp (combining marks) sau khi tách NFD
+COMBINING_MARKS = '[\u0300-\u036f]'
+
+# Các khóa file mà thread hiện tại đang giữ (cho phép lồng file_lock)
+_held_locks = threading.local()
 
 def get_today():
     """Lấy ngày hôm nay dạng string dd-mm-yyyy"""
@@ -25,6 +51,47 @@ def add_days(date_str, days):
     new_date = date_obj + timedelta(days=days)
     return date_to_str(new_date)
 
+def today_day():
+    """Ngày hôm nay dạng số (số ngày kể từ 01-01-1970)"""
+    return (datetime.now() - EPOCH).days
+
+def date_str_to_day(date_str):
+    """Chuyển string dd-mm-yyyy thành ngày dạng số (NO_DAY nếu sai định dạng)"""
+    try:
+        return (datetime.strptime(str(date_str), "%d-%m-%Y") - EPOCH).days
+    except ValueError:
+        return NO_DAY
+
+def day_to_date_str(day):
+    """Chuyển ngày dạng số thành string dd-mm-yyyy"""
+    return date_to_str(EPOCH + timedelta(days=int(day)))
+
+def normalize_word(word):
+    """
+    Khóa so khớp từ trùng: bỏ khoảng trắng thừa, không phân biệt hoa thường
+    (và bỏ dấu nếu FOLD_DIACRITICS). "  Take  OFF " -> "take off"
+    """
+    key = ' '.join(str(word).split()).casefold()
+    return fold_text(key) if FOLD_DIACRITICS else key
+
+def normalize_words(words):
+    """normalize_word() cho cả Series (vectorized), trả về Series khóa"""
+    keys = words.astype(str).str.split().str.join(' ').str.casefold()
+    return fold_texts(keys) if FOLD_DIACRITICS else keys
+
+def fold_text(text):
+    """
+    Chuẩn hóa để tìm kiếm: chữ thường, bỏ dấu (tách NFD rồi bỏ dấu kết hợp)
+    "Thỏa Thuận" -> "thoa thuan"
+    """
+    folded = unicodedata.normalize('NFD', str(text).lower())
+    return re.sub(COMBINING_MARKS, '', folded).replace('đ', 'd')
+
+def fold_texts(texts):
+    """fold_text() cho cả Series (vectorized)"""
+    folded = texts.astype(str).str.lower().str.normalize('NFD')
+    return folded.str.replace(COMBINING_MARKS, '', regex=True).str.replace('đ', 'd', regex=False)
+
 def is_due_today(next_review_str):
     """Kiểm tra xem từ có cần ôn hôm nay không"""
     try:
@@ -45,4 +112,44 @@ def format_progress(current, total):
     if total == 0:
         return "0/0 (0%)"
     percentage = (current / total) * 100
-    return f"{current}/{total} ({percentage:.0f}%)"
\ No newline at end of file
+    return f"{current}/{total} ({percentage:.0f}%)"
+
+@contextmanager
+def file_lock(path):
+    """
+    Khóa độc quyền giữa các tiến trình/thread (dùng file <path>.lock)
+    Gọi lồng nhau trong cùng 1 thread không bị deadlock.
+    
+    Ví dụ:
+        with file_lock(CSV_FILE):
+            ...ghi file...
+    """
+    held = _held_locks.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    
+    held.add(path)
+    try:
+        with _acquire(path):
+            yield
+    finally:
+        held.discard(path)
+
+@contextmanager
+def _acquire(path):
+    """Khóa file thực sự (fcntl/msvcrt)"""
+    with open(f"{path}.lock", 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,230 @@
+"""
+vocab_snapshot.py - Bản chụp nhị phân (snapshot) của kho từ vựng cho backend CSV
+
+Đọc words.csv (utf-8-sig, parse ngày, ép kiểu) chậm với kho lớn. Mỗi lần lưu,
+word_manager ghi thêm 1 snapshot dạng cột bên cạnh words.csv:
+- words.feather (Arrow/Feather) nếu có pyarrow: giữ nguyên kiểu category,
+  uint16, int32, Arrow string; đọc bằng memory-map
+- words.npz (NumPy) nếu không có pyarrow
+
+Snapshot lưu chữ ký (mtime_ns, size) của words.csv lúc ghi. Khi load, snapshot
+chỉ được dùng nếu chữ ký còn khớp (words.csv không bị sửa sau đó), ngược lại
+đọc lại CSV. words.csv vẫn là định dạng gốc để import/export.
+
+Chế độ chia sẻ (VOCATGO_SHARED_SNAPSHOT=1, cần pyarrow) cho nhiều tiến trình
+Streamlit chạy sau proxy: snapshot được publish thành các thế hệ (generation)
+chỉ đọc trong words.shared/gen-NNNNNN/, file CURRENT trỏ tới thế hệ mới nhất
+(đổi nguyên tử bằng os.replace). Mọi tiến trình memory-map cùng 1 file, các
+cột chuỗi dùng trực tiếp bộ nhớ map (zero-copy, dùng chung page cache của hệ
+điều hành), chỉ các cột bị sửa khi ôn tập mới được copy ra bộ nhớ riêng.
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+METADATA_KEY = b'vocatgo_source'
+
+# Chế độ snapshot chia sẻ giữa các tiến trình
+SHARED = os.environ.get("VOCATGO_SHARED_SNAPSHOT", "").lower() in ("1", "true", "yes")
+if SHARED and pa is None:
+    print("Warning: VOCATGO_SHARED_SNAPSHOT cần pyarrow, dùng snapshot thường")
+    SHARED = False
+
+SHARED_FILE = "words.arrow"
+POINTER_FILE = "CURRENT"
+KEEP_GENERATIONS = 2    # giữ thêm thế hệ trước cho tiến trình đang đọc dở
+
+# Thế hệ đang được map trong tiến trình này (dùng lại giữa các lần load)
+_mapped = {'path': None, 'table': None}
+
+def snapshot_path(base_path):
+    """Đường dẫn file snapshot đi kèm file gốc (tùy theo có pyarrow hay không)"""
+    ext = ".feather" if pa is not None else ".npz"
+    return os.path.splitext(base_path)[0] + ext
+
+def shared_dir(base_path):
+    """Thư mục chứa các thế hệ snapshot chia sẻ"""
+    return os.path.splitext(base_path)[0] + ".shared"
+
+def _source_signature(base_path):
+    """Chữ ký [mtime_ns, size] của file gốc, None nếu không tồn tại"""
+    try:
+        stat = os.stat(base_path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return None
+
+def write(base_path, df):
+    """
+    Ghi snapshot của DataFrame (gọi ngay sau khi ghi file gốc, trong file_lock)
+    Ghi ra file tạm rồi os.replace để không bao giờ đọc phải snapshot ghi dở.
+    Returns: True nếu thành công (lỗi chỉ in cảnh báo, file gốc vẫn đúng)
+    """
+    path = snapshot_path(base_path)
+    tmp_path = path + ".tmp"
+    signature = json.dumps(_source_signature(base_path))
+
+    try:
+        if SHARED:
+            _publish(base_path, _to_table(df, signature))
+            return True
+        if pa is not None:
+            _write_table(_to_table(df, signature), tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **_to_arrays(df), __source__=np.array(signature))
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"Warning: không ghi được snapshot: {e}")
+        return False
+
+def read(base_path, writable_columns=()):
+    """
+    Đọc snapshot nếu còn khớp với file gốc
+
+    Args:
+        writable_columns: các cột sẽ bị sửa tại chỗ (ở chế độ chia sẻ được copy
+                          ra bộ nhớ riêng, các cột khác vẫn nằm trên file map)
+
+    Returns: DataFrame hoặc None (chưa có, đã cũ hoặc bị hỏng -> đọc file gốc)
+    """
+    if SHARED:
+        return _read_shared(base_path, writable_columns)
+
+    path = snapshot_path(base_path)
+    if not os.path.exists(path):
+        return None
+
+    signature = _source_signature(base_path)
+
+    try:
+        if pa is not None:
+            table = feather.read_table(path, memory_map=True)
+            source = (table.schema.metadata or {}).get(METADATA_KEY)
+            if source is None or json.loads(source) != signature:
+                return None
+            return table.to_pandas()
+
+        with np.load(path, allow_pickle=False) as data:
+            if json.loads(str(data['__source__'])) != signature:
+                return None
+            return _from_arrays(data)
+    except Exception as e:
+        print(f"Warning: snapshot bị hỏng, đọc lại file gốc: {e}")
+        return None
+
+def _to_table(df, signature):
+    """Chuyển DataFrame thành bảng Arrow kèm chữ ký file gốc trong metadata"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = signature.encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+def _write_table(table, path):
+    """
+    Ghi bảng Arrow không nén, 1 chunk duy nhất: khi đọc bằng memory-map các cột
+    số dùng thẳng bộ nhớ map, không phải nối nhiều chunk (copy) như mặc định
+    """
+    feather.write_feather(table, path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+
+def _list_generations(root):
+    """Tên các thế hệ đã publish, cũ trước mới sau"""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    return sorted(n for n in names if n.startswith("gen-") and n[4:].isdigit())
+
+def _publish(base_path, table):
+    """
+    Publish 1 thế hệ snapshot mới (gọi trong file_lock của file gốc)
+    Ghi xong file mới đổi CURRENT, tiến trình khác thấy ở lần load tiếp theo.
+    """
+    root = shared_dir(base_path)
+    os.makedirs(root, exist_ok=True)
+
+    generations = _list_generations(root)
+    number = int(generations[-1][4:]) + 1 if generations else 1
+    name = f"gen-{number:06d}"
+    os.makedirs(os.path.join(root, name), exist_ok=True)
+    _write_table(table, os.path.join(root, name, SHARED_FILE))
+
+    pointer = os.path.join(root, POINTER_FILE)
+    with open(pointer + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Dọn thế hệ cũ; tiến trình còn map file cũ vẫn đọc được (POSIX),
+    # trên Windows file đang map không xóa được thì để lần sau dọn tiếp
+    for old in (generations + [name])[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+def _read_shared(base_path, writable_columns):
+    """Map thế hệ snapshot hiện tại (zero-copy) nếu còn khớp với file gốc"""
+    root = shared_dir(base_path)
+    try:
+        with open(os.path.join(root, POINTER_FILE), 'r', encoding='utf-8') as f:
+            path = os.path.join(root, f.read().strip(), SHARED_FILE)
+    except OSError:
+        return None
+
+    try:
+        if _mapped['path'] != path:
+            table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+            _mapped.update(path=path, table=table)
+        table = _mapped['table']
+
+        source = (table.schema.metadata or {}).get(METADATA_KEY)
+        if source is None or json.loads(source) != _source_signature(base_path):
+            return None
+
+        # split_blocks: mỗi cột 1 block, không gộp (gộp sẽ copy cả bảng)
+        df = table.to_pandas(split_blocks=True, self_destruct=False)
+        return df.assign(**{col: df[col].copy() for col in writable_columns if col in df.columns})
+    except Exception as e:
+        print(f"Warning: snapshot chia sẻ bị hỏng, đọc lại file gốc: {e}")
+        return None
+
+def _to_arrays(df):
+    """
+    Tách DataFrame thành các mảng NumPy không cần pickle
+    - category: mã (codes) + danh sách giá trị
+    - chuỗi: mảng unicode + mặt nạ ô trống
+    - số: giữ nguyên kiểu
+    """
+    arrays = {'__columns__': np.array(df.columns.tolist(), dtype=str)}
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        key = f"c{i}"
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[key + "_codes"] = series.cat.codes.to_numpy()
+            arrays[key + "_categories"] = np.array(series.cat.categories.astype(str).tolist(), dtype=str)
+        elif series.dtype.kind in 'iufb':
+            arrays[key] = series.to_numpy()
+        else:
+            arrays[key + "_na"] = series.isna().to_numpy()
+            arrays[key + "_text"] = np.array(series.fillna('').astype(str).tolist(), dtype=str)
+    return arrays
+
+def _from_arrays(data):
+    """Dựng lại DataFrame từ các mảng của _to_arrays()"""
+    columns = {}
+    for i, col in enumerate(data['__columns__'].tolist()):
+        key = f"c{i}"
+        if key + "_codes" in data:
+            columns[col] = pd.Categorical.from_codes(data[key + "_codes"], data[key + "_categories"].tolist())
+        elif key in data:
+            columns[col] = data[key]
+        else:
+            text = pd.Series(data[key + "_text"].tolist(), dtype=object)
+            columns[col] = text.mask(data[key + "_na"], np.nan)
+    return pd.DataFrame(columns)
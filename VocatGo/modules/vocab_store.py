@@ -0,0 +1,533 @@
+"""
+vocab_store.py - Bộ nhớ đệm (cache) kho từ vựng dùng chung cho cả tiến trình
+
+Mỗi lần Streamlit rerun, load_words() được gọi nhiều lần (sidebar, trang chủ,
+dashboard...). Module này giữ DataFrame đã parse trong bộ nhớ và chỉ đọc lại
+file khi file thay đổi (mtime/size) hoặc khi có lần ghi mới (write version).
+
+DataFrame đã trả cho người đọc không bao giờ bị sửa: mỗi lần ghi sửa trên bản
+sao nông rồi thay DataFrame trong cache. Nhờ Copy-on-Write của pandas, chỉ các
+cột bị sửa mà vẫn còn người đọc giữ DataFrame cũ mới bị chép.
+
+Ngoài DataFrame, store giữ các index dẫn xuất (tạo khi cần):
+- index băm id -> vị trí dòng: thao tác trên 1 từ không phải quét toàn bộ kho
+- hàng đợi ôn tập: mảng đã sắp xếp theo next_review_day, đếm/lấy từ đến hạn
+  và dự báo N ngày tới bằng tìm kiếm nhị phân (O(log n))
+- index từ: khóa chuẩn hóa (normalize_word) -> id, kiểm tra trùng O(1)
+- index tìm kiếm (search_index): token đã bỏ dấu -> các dòng, xếp hạng kết quả
+- index gợi ý: khóa chuẩn hóa đã sắp xếp, tìm từ theo tiền tố bằng bisect
+- index đáp án sai (distractor_index): bucket theo từ loại/độ dài nghĩa/n-gram,
+  chọn đáp án sai cho quiz trắc nghiệm
+"""
+import bisect
+import os
+import threading
+import numpy as np
+import pandas as pd
+from modules import search_index, distractor_index
+from modules.utils import normalize_word, normalize_words
+
+# pandas < 3.0: bật Copy-on-Write (mặc định từ pandas 3.0)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Khóa dùng chung cho mọi session Streamlit (mỗi session chạy trên 1 thread)
+_lock = threading.RLock()
+
+_cache = {
+    'df': None,          # DataFrame đã parse (không sửa tại chỗ: ghi -> DataFrame mới)
+    'signature': None,   # chữ ký file lúc load
+    'version': -1,       # write version lúc load
+    'id_index': None,    # dict {id: vị trí dòng}, tạo khi cần
+    'due_index': None,   # mảng int64 đã sắp xếp (next_review_day << 32 | id)
+    'word_index': None,  # dict {khóa chuẩn hóa: id}, tạo khi cần
+    'word_dups': None,   # các khóa có nhiều hơn 1 từ trong kho
+    'search_index': None,# index tìm kiếm (search_index.build), tạo khi cần
+    'prefix_index': None,# (list khóa chuẩn hóa đã sắp xếp, list id tương ứng)
+    'distractor_index': None # index đáp án sai (distractor_index.build), tạo khi cần
+}
+
+# Tăng mỗi lần ghi dữ liệu để vô hiệu hóa cache
+_write_version = 0
+
+# Tăng mỗi lần thay DataFrame bằng dữ liệu khác dòng (load lại file, thêm/xóa
+# từ); lần ghi chỉ sửa giá trị tại chỗ giữ nguyên (xem changes_since)
+_frame_version = 0
+
+# Các lần ghi sửa tại chỗ (không thêm/xóa dòng) kể từ lần thay DataFrame gần
+# nhất: [(write version, list id)], để cache dẫn xuất bên ngoài store
+# (weighted_sampler) chỉ tính lại các từ bị sửa (changes_since)
+_changes = []
+MAX_CHANGES = 256
+
+# Lần ghi chạm nhiều từ hơn ngưỡng này (import): bỏ index tìm kiếm, index gợi ý
+# và index đáp án sai, tạo lại ở lần dùng sau thay vì cập nhật từng từ
+BULK_WRITE = 1000
+
+# Lấy nhiều dòng hơn ngưỡng này (vd: cả hàng đợi ôn tập sau nhiều ngày nghỉ):
+# tra vị trí bằng pandas Index (vectorized) thay cho dict từng id
+BULK_READ = 10000
+
+def file_signature(*paths):
+    """
+    Lấy chữ ký (mtime_ns, size) của các file
+    File không tồn tại có chữ ký None
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def _is_valid(paths):
+    """Cache còn khớp với file và write version hiện tại không"""
+    return (_cache['df'] is not None
+            and _cache['signature'] == file_signature(*paths)
+            and _cache['version'] == _write_version)
+
+def _set_frame(paths, df, keep_indexes=False):
+    """
+    Thay DataFrame trong cache (các index dẫn xuất sẽ được tạo lại khi cần)
+    keep_indexes: giữ hàng đợi ôn tập, index từ, index tìm kiếm, index gợi ý và
+                  index đáp án sai (người gọi tự cập nhật tăng dần)
+    """
+    global _frame_version
+    _cache['df'] = df
+    _cache['signature'] = file_signature(*paths)
+    _cache['version'] = _write_version
+    _cache['id_index'] = None
+    _frame_version += 1
+    _changes.clear()
+    if not keep_indexes:
+        _cache['due_index'] = None
+        _cache['word_index'] = None
+        _cache['search_index'] = None
+        _cache['prefix_index'] = None
+        _cache['distractor_index'] = None
+
+def _id_index():
+    """Index băm {id: vị trí dòng} của DataFrame trong cache"""
+    if _cache['id_index'] is None:
+        ids = _cache['df']['id'].tolist() if 'id' in _cache['df'].columns else []
+        _cache['id_index'] = {int(word_id): pos for pos, word_id in enumerate(ids)}
+    return _cache['id_index']
+
+def _due_keys(days, ids):
+    """Ghép (ngày ôn, id) thành 1 khóa int64 để sắp xếp theo ngày rồi theo id"""
+    return (np.asarray(days, dtype=np.int64) << 32) | np.asarray(ids, dtype=np.int64)
+
+def _due_index():
+    """Mảng khóa (next_review_day, id) đã sắp xếp của DataFrame trong cache"""
+    if _cache['due_index'] is None:
+        df = _cache['df']
+        _cache['due_index'] = np.sort(_due_keys(df['next_review_day'], df['id']))
+    return _cache['due_index']
+
+def _keys_of(word_ids):
+    """Khóa hàng đợi hiện tại của các id (bỏ qua id không còn trong kho)"""
+    id_index = _id_index()
+    positions = [id_index[i] for i in word_ids if i in id_index]
+    df = _cache['df']
+    return _due_keys(df['next_review_day'].to_numpy()[positions], df['id'].to_numpy()[positions])
+
+def _update_due_index(old_keys, new_keys):
+    """Cập nhật hàng đợi tăng dần: bỏ khóa cũ, chèn khóa mới (không sắp xếp lại)"""
+    keys = _cache['due_index']
+    if len(old_keys):
+        keys = np.delete(keys, np.searchsorted(keys, np.sort(old_keys)))
+    if len(new_keys):
+        new_keys = np.sort(new_keys)
+        keys = np.insert(keys, np.searchsorted(keys, new_keys), new_keys)
+    _cache['due_index'] = keys
+
+def _word_index():
+    """Index {khóa chuẩn hóa: id} của DataFrame trong cache"""
+    if _cache['word_index'] is None:
+        df = _cache['df']
+        keys = normalize_words(df['word']).tolist()
+        index = {}
+        dups = set()
+        for key, word_id in zip(keys, df['id'].tolist()):
+            if key in index:
+                dups.add(key)
+            else:
+                index[key] = int(word_id)
+        _cache['word_index'] = index
+        _cache['word_dups'] = dups
+    return _cache['word_index']
+
+def _words_of(word_ids):
+    """Khóa chuẩn hóa hiện tại của các id: list (id, khóa)"""
+    id_index = _id_index()
+    words = _cache['df']['word']
+    return [(i, normalize_word(words.iat[id_index[i]])) for i in word_ids if i in id_index]
+
+def _update_word_index(old_words, new_words):
+    """Cập nhật index từ tăng dần theo các từ bị thêm/sửa/xóa"""
+    index = _cache['word_index']
+    for word_id, key in old_words:
+        if index.get(key) == word_id:
+            del index[key]
+            if key in _cache['word_dups']:
+                # Khóa còn từ khác trùng: tạo lại index ở lần dùng sau
+                _cache['word_index'] = None
+                return
+    for word_id, key in new_words:
+        if key in index and index[key] != word_id:
+            _cache['word_dups'].add(key)
+        else:
+            index[key] = word_id
+
+def _search_index():
+    """Index tìm kiếm của DataFrame trong cache"""
+    if _cache['search_index'] is None:
+        _cache['search_index'] = search_index.build(_cache['df'])
+    return _cache['search_index']
+
+def _documents_of(word_ids):
+    """Dữ liệu tìm kiếm hiện tại của các id: {id: search_index.document(...)}"""
+    id_index = _id_index()
+    df = _cache['df']
+    fields = [col for col in search_index.SEARCH_FIELDS if col in df.columns]
+    return {i: search_index.document({col: df[col].iat[id_index[i]] for col in fields})
+            for i in word_ids if i in id_index}
+
+def _update_search_index(old_docs, new_docs):
+    """Cập nhật index tìm kiếm tăng dần (bỏ qua từ chỉ đổi lịch ôn, không đổi chữ)"""
+    changed = [i for i in old_docs.keys() | new_docs.keys() if old_docs.get(i) != new_docs.get(i)]
+    if not changed:
+        return
+
+    index = _cache['search_index']
+    search_index.remove(index, changed)
+    search_index.add(index, {i: new_docs[i] for i in changed if i in new_docs})
+    if search_index.needs_rebuild(index):
+        _cache['search_index'] = None
+
+def _prefix_index():
+    """Khóa chuẩn hóa đã sắp xếp + id tương ứng của DataFrame trong cache"""
+    if _cache['prefix_index'] is None:
+        df = _cache['df']
+        keys = normalize_words(df['word']).to_numpy(object)
+        order = np.argsort(keys, kind='stable')
+        _cache['prefix_index'] = (keys[order].tolist(), df['id'].to_numpy(np.int64)[order].tolist())
+    return _cache['prefix_index']
+
+def _update_prefix_index(old_words, new_words):
+    """Cập nhật index gợi ý tăng dần: bỏ (khóa, id) cũ, chèn (khóa, id) mới"""
+    keys, ids = _cache['prefix_index']
+    for word_id, key in old_words:
+        pos = bisect.bisect_left(keys, key)
+        while pos < len(keys) and keys[pos] == key:
+            if ids[pos] == word_id:
+                del keys[pos]
+                del ids[pos]
+                break
+            pos += 1
+    for word_id, key in new_words:
+        pos = bisect.bisect_right(keys, key)
+        keys.insert(pos, key)
+        ids.insert(pos, word_id)
+
+def _distractor_index():
+    """Index đáp án sai của DataFrame trong cache"""
+    if _cache['distractor_index'] is None:
+        _cache['distractor_index'] = distractor_index.build(_cache['df'])
+    return _cache['distractor_index']
+
+def _distractor_docs_of(word_ids):
+    """Dữ liệu index đáp án sai hiện tại của các id: {id: distractor_index.document(...)}"""
+    id_index = _id_index()
+    df = _cache['df']
+    return {i: distractor_index.document(df['word'].iat[id_index[i]], df['pos'].iat[id_index[i]],
+                                         df['meaning'].iat[id_index[i]])
+            for i in word_ids if i in id_index}
+
+def _update_distractor_index(old_docs, new_docs):
+    """Cập nhật index đáp án sai tăng dần (bỏ qua từ không đổi từ/từ loại/nghĩa)"""
+    changed = [i for i in old_docs.keys() | new_docs.keys() if old_docs.get(i) != new_docs.get(i)]
+    index = _cache['distractor_index']
+    distractor_index.remove(index, changed)
+    distractor_index.add(index, {i: new_docs[i] for i in changed if i in new_docs})
+
+def _day_bounds(start_day, end_day):
+    """Vị trí [lo, hi) của các từ có start_day <= next_review_day < end_day"""
+    keys = _due_index()
+    lo = 0 if start_day is None else np.searchsorted(keys, np.int64(start_day) << 32)
+    hi = len(keys) if end_day is None else np.searchsorted(keys, np.int64(end_day) << 32)
+    return keys, lo, hi
+
+def get_frame(paths, loader):
+    """
+    Lấy DataFrame từ cache, chỉ gọi loader() khi file thay đổi hoặc version tăng
+
+    Args:
+        paths: list các file nguồn dùng để kiểm tra thay đổi
+        loader: hàm đọc dữ liệu, trả về DataFrame hoặc None nếu lỗi
+
+    Returns: DataFrame trong cache (không đổi sau khi trả về, người gọi không
+             được sửa) hoặc None nếu loader lỗi
+    """
+    with _lock:
+        if _is_valid(paths):
+            return _cache['df']
+
+        df = loader()
+
+        # Không cache kết quả lỗi để lần sau thử đọc lại
+        if df is None:
+            return None
+
+        _set_frame(paths, df)
+        return df
+
+def get_record(paths, loader, word_id):
+    """
+    Lấy 1 từ theo id qua index băm (O(1), không copy cả kho)
+    Returns: dict hoặc None nếu không tìm thấy
+    """
+    with _lock:
+        df = get_frame(paths, loader)
+        if df is None:
+            return None
+
+        pos = _id_index().get(int(word_id))
+        if pos is None:
+            return None
+        return df.iloc[pos].to_dict()
+
+def get_rows(paths, loader, word_ids, columns=None):
+    """
+    Lấy các dòng theo danh sách id (giữ đúng thứ tự), tra qua index băm
+    columns: chỉ lấy các cột này (None = mọi cột)
+    Returns: DataFrame (bản sao) hoặc None nếu loader lỗi
+    """
+    with _lock:
+        df = get_frame(paths, loader)
+        if df is None:
+            return None
+
+        word_ids = np.asarray(word_ids, dtype=np.int64)
+        if len(word_ids) > BULK_READ:
+            positions = pd.Index(df['id'].to_numpy(np.int64)).get_indexer(word_ids)
+            positions = positions[positions >= 0]
+        else:
+            id_index = _id_index()
+            # tolist(): đổi sang int Python 1 lần (nhanh hơn int() từng phần tử numpy)
+            positions = [id_index.get(i) for i in word_ids.tolist()]
+            positions = [pos for pos in positions if pos is not None]
+        if columns is not None:
+            return df.iloc[positions, df.columns.get_indexer(columns)].copy()
+        return df.iloc[positions].copy()
+
+def find_word_id(paths, loader, word):
+    """
+    Tìm id của từ theo khóa chuẩn hóa (hoa thường, khoảng trắng, dấu) - O(1)
+    Returns: id hoặc None nếu chưa có
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return None
+        return _word_index().get(normalize_word(word))
+
+def find_word_ids(paths, loader, words):
+    """find_word_id() cho cả Series từ, trả về list id (None nếu chưa có)"""
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return [None] * len(words)
+        index = _word_index()
+        return [index.get(key) for key in normalize_words(words)]
+
+def search(paths, loader, query, limit):
+    """
+    Tìm từ theo từ/nghĩa/ví dụ qua index tìm kiếm (không phân biệt hoa thường, dấu)
+    Returns: (mảng id top `limit` đã xếp hạng, tổng số kết quả)
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return np.array([], dtype=np.int64), 0
+        return search_index.search(_search_index(), query, limit)
+
+def complete(paths, loader, prefix, limit):
+    """
+    Gợi ý từ theo tiền tố (so theo khóa chuẩn hóa), tìm nhị phân O(log n)
+    Returns: list id của tối đa `limit` từ, theo thứ tự chữ cái
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return []
+        keys, ids = _prefix_index()
+        key = normalize_word(prefix)
+        start = bisect.bisect_left(keys, key)
+        end = start
+        while end < len(keys) and end - start < limit and keys[end].startswith(key):
+            end += 1
+        return ids[start:end]
+
+def sample_distractors(paths, loader, word_ids, k, rng):
+    """
+    Chọn k đáp án sai cho mỗi id (O(1) mỗi câu hỏi, xem distractor_index.sample)
+    Returns: list các list id (id không còn trong kho -> list rỗng)
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return [[] for _ in word_ids]
+        index = _distractor_index()
+        return [distractor_index.sample(index, i, k, rng) if i in index['docs'] else []
+                for i in np.asarray(word_ids, dtype=np.int64).tolist()]
+
+def count_due(paths, loader, start_day=None, end_day=None):
+    """Số từ có start_day <= next_review_day < end_day (None = không giới hạn)"""
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return 0
+        _, lo, hi = _day_bounds(start_day, end_day)
+        return int(hi - lo)
+
+def due_ids(paths, loader, start_day=None, end_day=None):
+    """
+    id các từ có start_day <= next_review_day < end_day
+    Sắp xếp theo ngày ôn (quá hạn lâu nhất trước)
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return np.array([], dtype=np.int64)
+        keys, lo, hi = _day_bounds(start_day, end_day)
+        return keys[lo:hi] & 0xFFFFFFFF
+
+def due_forecast(paths, loader, start_day, num_days, include_overdue=False):
+    """
+    Số từ đến hạn ôn theo từng ngày: start_day, start_day + 1, ...
+    (num_days + 1 lần tìm nhị phân trên hàng đợi ôn tập, không quét kho)
+    
+    Args:
+        include_overdue: cộng các từ quá hạn (trước start_day) vào ngày đầu
+    
+    Returns: mảng numpy độ dài num_days
+    """
+    with _lock:
+        if get_frame(paths, loader) is None:
+            return np.zeros(num_days, dtype=np.int64)
+        bounds = (np.int64(start_day) + np.arange(num_days + 1, dtype=np.int64)) << 32
+        if include_overdue:
+            bounds[0] = np.iinfo(np.int64).min
+        return np.diff(np.searchsorted(_due_index(), bounds))
+
+def store_frame(paths, df):
+    """
+    Ghi DataFrame vừa lưu vào cache (write-through) và tăng write version
+
+    Lưu bản sao để người gọi sửa df sau đó cũng không làm hỏng cache
+    """
+    global _write_version
+    with _lock:
+        _write_version += 1
+        _set_frame(paths, df.copy())
+
+def apply_write(paths, write, patch, touched_ids=()):
+    """
+    Ghi 1 thay đổi nhỏ và sửa cache tại chỗ thay vì load lại toàn bộ
+
+    Args:
+        paths: list các file nguồn
+        write: hàm thực hiện ghi, trả về True/False
+        patch: hàm patch(df, id_index) sửa bản sao (nông) của DataFrame trong
+               cache cho khớp dữ liệu vừa ghi (sửa tại chỗ, hoặc trả về
+               DataFrame mới để thay thế)
+        touched_ids: id các từ bị thêm/sửa/xóa (có thể được write() điền vào),
+                     dùng để cập nhật các index dẫn xuất tăng dần
+
+    Returns: kết quả của write()
+    """
+    global _write_version
+    with _lock:
+        # Chỉ patch được khi cache đang khớp với file trước lúc ghi
+        cache_valid = _is_valid(paths)
+        frame_version = _frame_version
+
+        success = write()
+        _write_version += 1
+
+        # write() có thể load lại kho (vd: cấp id trong khóa file sau khi tiến
+        # trình khác vừa ghi): index dẫn xuất đã bị bỏ, không patch được nữa
+        if success and cache_valid and _frame_version == frame_version:
+            touched_ids = [int(i) for i in touched_ids]
+            track_due = _cache['due_index'] is not None
+            track_words = _cache['word_index'] is not None
+            if len(touched_ids) > BULK_WRITE:
+                _cache['search_index'] = None
+                _cache['prefix_index'] = None
+                _cache['distractor_index'] = None
+            track_search = _cache['search_index'] is not None
+            track_prefix = _cache['prefix_index'] is not None
+            track_distractors = _cache['distractor_index'] is not None
+            old_keys = _keys_of(touched_ids) if track_due else None
+            old_words = _words_of(touched_ids) if track_words or track_prefix else None
+            old_docs = _documents_of(touched_ids) if track_search else None
+            old_distractors = _distractor_docs_of(touched_ids) if track_distractors else None
+
+            # Sửa trên bản sao: DataFrame cũ người đọc đang giữ không đổi
+            frame = _cache['df'].copy(deep=False)
+            patched = patch(frame, _id_index())
+            if patched is not None:
+                _set_frame(paths, patched, keep_indexes=True)
+            else:
+                _cache['df'] = frame
+                _cache['signature'] = file_signature(*paths)
+                _cache['version'] = _write_version
+                _changes.append((_write_version, touched_ids))
+                del _changes[:-MAX_CHANGES]
+
+            if track_due:
+                _update_due_index(old_keys, _keys_of(touched_ids))
+            if track_words or track_prefix:
+                new_words = _words_of(touched_ids)
+            if track_words:
+                _update_word_index(old_words, new_words)
+            if track_prefix:
+                _update_prefix_index(old_words, new_words)
+            if track_search:
+                _update_search_index(old_docs, _documents_of(touched_ids))
+            if track_distractors:
+                _update_distractor_index(old_distractors, _distractor_docs_of(touched_ids))
+        else:
+            _cache['df'] = None
+
+        return success
+
+def data_version():
+    """
+    Khóa phiên bản dữ liệu trong cache: đổi mỗi lần ghi hoặc load lại file
+    (dùng cho các cache dẫn xuất nằm ngoài store)
+    """
+    with _lock:
+        return _write_version, _frame_version
+
+def changes_since(version):
+    """
+    id các từ bị sửa tại chỗ từ lúc data_version() trả về version
+
+    Returns: list id (rỗng nếu chưa ghi gì), None nếu không biết được (DataFrame
+             đã bị thay: load lại file, thêm/xóa từ; hoặc quá MAX_CHANGES lần ghi)
+    """
+    with _lock:
+        if version is None or _cache['df'] is None:
+            return None
+        write_version, frame_version = version
+        if frame_version != _frame_version:
+            return None
+        pending = [entry for entry in _changes if entry[0] > write_version]
+        # Mỗi lần ghi tăng write version 1 đơn vị: thiếu bản ghi nào là không biết
+        if len(pending) != _write_version - write_version:
+            return None
+        return [word_id for _, word_ids in pending for word_id in word_ids]
+
+def invalidate():
+    """Tăng write version, buộc lần đọc tiếp theo phải load lại từ file"""
+    global _write_version
+    with _lock:
+        _write_version += 1
+        _cache['df'] = None
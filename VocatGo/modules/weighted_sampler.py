@@ -0,0 +1,230 @@
+"""
+weighted_sampler.py - Chọn từ ngẫu nhiên có trọng số (từ hay sai, quá hạn lâu)
+
+Trọng số của mỗi từ = 1
+    + ERROR_WEIGHT x số lần sai trong quiz (giảm một nửa sau mỗi ERROR_HALF_LIFE ngày)
+    + OVERDUE_WEIGHT x số lần khoảng ôn đã quá hạn (tối đa MAX_OVERDUE)
+
+Chọn theo bảng alias (Walker/Vose): tạo bảng O(n) (vectorized) rồi mỗi lần
+rút là O(1), kể cả khi kho có hàng trăm nghìn từ. Trọng số được giữ trong bộ
+nhớ: ôn/sửa vài từ chỉ tính lại trọng số của các từ đó (vocab_store.changes_since),
+bảng alias tạo lại ở lần rút sau. Chỉ tính lại toàn bộ khi lịch sử quiz hoặc
+ngày thay đổi, hoặc kho bị thêm/xóa từ, load lại từ file.
+
+Số lần sai không nhóm lại cả file lịch sử mỗi lần: điểm lỗi của từng từ được
+đọc 1 lần rồi cộng dồn khi có kết quả quiz mới (record_errors). Điểm lưu theo
+mốc thời gian cố định nên cộng thêm lỗi mới không phải tính lại điểm cũ.
+"""
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from modules import scheduler, vocab_store
+from modules.word_manager import load_words, get_word_ids
+from modules.quiz_history import load_wrong_words, history_marker
+from modules.utils import today_day, normalize_words, NO_DAY
+
+ERROR_WEIGHT = 2.0
+ERROR_HALF_LIFE = 7  # ngày
+OVERDUE_WEIGHT = 1.0
+MAX_OVERDUE = 5.0
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+_lock = threading.RLock()
+
+_rng = np.random.default_rng()
+
+# Điểm lỗi: {từ: tổng 2^((lúc sai - mốc) / ERROR_HALF_LIFE)}
+_errors = {'scores': None, 'origin': None, 'signature': None, 'version': 0}
+
+# Trọng số + bảng alias của lần tạo gần nhất
+# key: (phiên bản điểm lỗi, ngày) lúc tính toàn bộ; data_version: phiên bản kho
+# đã áp vào weights; error_by_key: điểm lỗi theo khóa chuẩn hóa (dùng khi tính
+# lại vài từ); prob/alias = None: weights đã đổi, chưa tạo lại bảng alias
+_table = {'key': None, 'data_version': None, 'ids': None, 'positions': None,
+          'weights': None, 'error_by_key': None, 'prob': None, 'alias': None}
+
+def build_alias(weights):
+    """
+    Tạo bảng alias cho phân phối tỉ lệ với weights (vectorized)
+
+    Mỗi ô i giữ xác suất prob[i] chọn chính i, còn lại chọn alias[i]. Mỗi vòng:
+    các ô "thiếu" (p < 1) được chia liên tiếp cho các ô "thừa" (p >= 1) theo
+    tổng dồn phần thiếu/phần thừa (searchsorted); ô thừa bị lấy quá 1 thì thành
+    ô thiếu ở vòng sau.
+
+    Returns: (prob, alias)
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n)
+    alias = np.arange(n)
+
+    small = np.flatnonzero(scaled < 1.0)
+    large = np.flatnonzero(scaled >= 1.0)
+    while len(small) and len(large):
+        deficit = 1.0 - scaled[small]
+        surplus = np.cumsum(scaled[large] - 1.0)
+        # Ô thiếu thứ i lấy từ ô thừa chứa điểm bắt đầu phần thiếu của nó
+        starts = np.cumsum(deficit) - deficit
+        owner = np.minimum(np.searchsorted(surplus, starts, side='right'), len(large) - 1)
+        prob[small] = scaled[small]
+        alias[small] = large[owner]
+        scaled[large] -= np.bincount(owner, weights=deficit, minlength=len(large))
+
+        small = large[scaled[large] < 1.0]
+        large = large[scaled[large] >= 1.0]
+    # Hết ô thừa (chỉ do sai số làm tròn): các ô thiếu còn lại coi như đầy
+    prob[small] = 1.0
+    return prob, alias
+
+def draw(prob, alias, size, rng):
+    """Rút size vị trí (có lặp) theo bảng alias - O(1) mỗi lần rút"""
+    slots = rng.integers(0, len(prob), size)
+    return np.where(rng.random(size) < prob[slots], slots, alias[slots])
+
+def _decayed(times, origin):
+    """2^((thời điểm - mốc) / ERROR_HALF_LIFE) cho mỗi thời điểm"""
+    days = (pd.to_datetime(pd.Series(times), format=_TIME_FORMAT, errors='coerce') - origin) / pd.Timedelta(days=1)
+    return np.exp2(days.fillna(-np.inf).to_numpy(np.float64) / ERROR_HALF_LIFE)
+
+def _error_scores():
+    """Điểm lỗi theo từ, đọc lại lịch sử chỉ khi lịch sử bị sửa từ nơi khác"""
+    signature = history_marker()
+    if _errors['scores'] is None or _errors['signature'] != signature:
+        wrong = load_wrong_words()
+        origin = pd.Timestamp(datetime.now().replace(second=0, microsecond=0))
+        scores = pd.Series(_decayed(wrong['time'].astype(str), origin)).groupby(wrong['word'].astype(str).to_numpy()).sum()
+        _errors.update(scores=scores.to_dict(), origin=origin, signature=signature)
+        _errors['version'] += 1
+    return _errors
+
+def record_errors(wrong_words, timestamp=None):
+    """
+    Cộng các lần sai của 1 bài quiz vừa lưu vào điểm lỗi (không đọc lại lịch sử)
+
+    Args:
+        wrong_words: list các từ sai [{word, ...}, ...] như save_quiz_result()
+        timestamp: thời điểm làm quiz (mặc định: bây giờ)
+    """
+    with _lock:
+        if _errors['scores'] is None:
+            # Chưa đọc lịch sử: bỏ qua là đúng vì kết quả này đã được ghi vào
+            # lịch sử (save_quiz_result gọi trước), lần dùng đầu _error_scores()
+            # đọc toàn bộ lịch sử nên sẽ tính cả nó
+            return
+        when = timestamp or datetime.now().strftime(_TIME_FORMAT)
+        scores = _errors['scores']
+        for word_info, value in zip(wrong_words, _decayed([when] * len(wrong_words), _errors['origin'])):
+            word = str(word_info['word'])
+            scores[word] = scores.get(word, 0.0) + value
+        _errors['signature'] = history_marker()
+        _errors['version'] += 1
+
+def _error_by_key(errors):
+    """Điểm lỗi (giảm theo thời gian đến bây giờ) theo khóa chuẩn hóa của từ"""
+    if not errors['scores']:
+        return {}
+    decay = np.exp2((errors['origin'] - pd.Timestamp(datetime.now())) / pd.Timedelta(days=1) / ERROR_HALF_LIFE)
+    keys = normalize_words(pd.Series(list(errors['scores']), dtype=object))
+    values = np.fromiter(errors['scores'].values(), np.float64, len(keys)) * decay
+    return pd.Series(values).groupby(keys.to_numpy()).sum().to_dict()
+
+def _overdue_weights(df, today):
+    """Phần trọng số theo số lần khoảng ôn đã quá hạn"""
+    state = scheduler.word_state(df)
+    due = state['next_review_day']
+    overdue = np.where(due != NO_DAY, (today - due) / scheduler.previous_interval(state), 0.0)
+    return OVERDUE_WEIGHT * np.clip(overdue, 0.0, MAX_OVERDUE)
+
+def _word_weights(df, error_by_key, today):
+    """Trọng số của từng từ trong kho (theo thứ tự dòng)"""
+    weights = 1.0 + _overdue_weights(df, today)
+
+    if error_by_key:
+        # Chỉ tra id của các từ có lỗi (ít), không chuẩn hóa cả kho
+        keys = list(error_by_key)
+        ids = pd.Series(get_word_ids(keys), dtype=object)
+        found = ids.notna().to_numpy()
+        per_id = pd.Series(np.fromiter(error_by_key.values(), np.float64, len(keys))[found],
+                           index=ids[found].astype(np.int64).to_numpy())
+        per_id = per_id.groupby(level=0).sum()
+        weights += ERROR_WEIGHT * per_id.reindex(df['id'].to_numpy(np.int64)).fillna(0).to_numpy()
+    return weights
+
+def _update_weights(df, word_ids, today):
+    """Tính lại trọng số của các từ vừa bị sửa tại chỗ (vị trí dòng không đổi)"""
+    positions = _table['positions'].get_indexer(np.unique(np.asarray(word_ids, dtype=np.int64)))
+    positions = positions[positions >= 0]
+    if len(positions) == 0:
+        return
+    rows = df.iloc[positions]
+    weights = 1.0 + _overdue_weights(rows, today)
+
+    error_by_key = _table['error_by_key']
+    if error_by_key:
+        keys = normalize_words(rows['word'])
+        # Như _word_weights: khóa trùng nhiều từ thì chỉ tính cho từ index từ trỏ tới
+        owners = get_word_ids(keys)
+        weights += ERROR_WEIGHT * np.array([
+            error_by_key.get(key, 0.0) if owner == word_id else 0.0
+            for key, owner, word_id in zip(keys, owners, rows['id'].tolist())
+        ])
+    _table['weights'][positions] = weights
+    _table.update(prob=None, alias=None)
+
+def _alias_table():
+    """
+    Bảng alias của kho hiện tại
+    Tính lại toàn bộ trọng số khi lịch sử quiz/ngày đổi hoặc DataFrame của kho
+    bị thay; chỉ tính lại các từ bị sửa tại chỗ; tạo lại bảng alias khi cần rút.
+    """
+    df = load_words(copy=False)
+    errors = _error_scores()
+    today = today_day()
+    key = (errors['version'], today)
+    version = vocab_store.data_version()
+
+    changed = vocab_store.changes_since(_table['data_version']) if _table['key'] == key else None
+    if changed is None:
+        error_by_key = _error_by_key(errors)
+        ids = df['id'].to_numpy(np.int64) if not df.empty else np.array([], dtype=np.int64)
+        weights = _word_weights(df, error_by_key, today) if not df.empty else None
+        _table.update(key=key, ids=ids, positions=pd.Index(ids), weights=weights,
+                      error_by_key=error_by_key, prob=None, alias=None)
+    elif changed:
+        _update_weights(df, changed, today)
+    _table['data_version'] = version
+
+    if _table['prob'] is None and _table['weights'] is not None:
+        _table['prob'], _table['alias'] = build_alias(_table['weights'])
+    return _table
+
+def sample_word_ids(k, rng=None):
+    """
+    Chọn k từ khác nhau, ưu tiên từ hay sai gần đây và quá hạn lâu
+    Rút O(1) mỗi lần qua bảng alias, bỏ các lần trùng rồi rút tiếp.
+
+    Returns: mảng id (ít hơn k nếu kho không đủ từ)
+    """
+    rng = _rng if rng is None else rng
+    with _lock:
+        table = _alias_table()
+        ids = table['ids']
+        k = min(k, len(ids))
+        if k == 0:
+            return np.array([], dtype=np.int64)
+        # Lấy gần hết kho: rút không lặp trực tiếp theo trọng số
+        if k * 2 > len(ids):
+            weights = table['weights']
+            return ids[rng.choice(len(ids), k, replace=False, p=weights / weights.sum())]
+
+        chosen = np.array([], dtype=np.int64)
+        while len(chosen) < k:
+            drawn = draw(table['prob'], table['alias'], 2 * (k - len(chosen)), rng)
+            merged = np.concatenate([chosen, drawn])
+            _, first = np.unique(merged, return_index=True)
+            chosen = merged[np.sort(first)]
+        return ids[chosen[:k]]
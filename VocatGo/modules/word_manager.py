@@ -1,61 +1,667 @@
 """
 word_manager.py - Quản lý từ vựng: thêm, sửa, xóa, load/save CSV
+(hoặc SQLite khi đặt VOCATGO_STORAGE=sqlite, xem storage_sqlite.py)
 """
 import pandas as pd
+import numpy as np
+import csv
 import os
-from modules.utils import get_today, add_days
+import threading
+from modules.utils import get_today, add_days, file_lock, date_str_to_day, day_to_date_str, normalize_word, normalize_words, NO_DAY
+from modules import vocab_store, vocab_snapshot, storage_sqlite, review_journal
+from modules.scheduler import STATE_COLUMNS, FLOAT_STATE_COLUMNS
 
 CSV_FILE = "data/vocab/words.csv"
 
+WORD_COLUMNS = ['id', 'word', 'pos', 'phonetic', 'meaning', 'example', 'start_date', 'review_count', 'next_review'] + STATE_COLUMNS
+
+# Cột ngày dạng số (parse 1 lần khi load, không lưu vào file)
+DAY_COLUMNS = {'start_date': 'start_day', 'next_review': 'next_review_day'}
+DERIVED_COLUMNS = list(DAY_COLUMNS.values())
+
+# Kiểu dữ liệu gọn trong bộ nhớ (chỉ áp dụng khi load, định dạng file không đổi)
+# - pos, ngày dạng chuỗi: ít giá trị khác nhau -> category (mỗi giá trị lưu 1 lần)
+# - review_count, lapses, interval_days: số nguyên nhỏ -> uint16
+# - trạng thái thuật toán xếp lịch (ease, stability, difficulty) -> float32
+# - chuỗi tự do: Arrow string nếu có pyarrow, ngược lại giữ object
+CATEGORY_COLUMNS = ['pos', 'start_date', 'next_review']
+TEXT_COLUMNS = ['word', 'phonetic', 'meaning', 'example']
+
+# Các cột của từ đã có được cập nhật khi import/upsert
+UPSERT_FIELDS = ['phonetic', 'meaning', 'example']
+
+# Số dòng mỗi chunk khi import (bộ nhớ không phụ thuộc kích thước file)
+IMPORT_CHUNK_SIZE = 50_000
+
+# Số kết quả tìm kiếm tối đa được hiển thị (đã xếp hạng)
+SEARCH_LIMIT = 200
+
+# Số từ gợi ý tối đa khi gõ tiền tố (ô chọn từ, gợi ý từ đã có)
+SUGGEST_LIMIT = 20
+
+# Các cột được sửa tại chỗ trong cache (ôn tập, sửa từ loại)
+MUTABLE_COLUMNS = CATEGORY_COLUMNS + ['review_count'] + STATE_COLUMNS + DERIVED_COLUMNS
+
+def _text_dtype():
+    """Kiểu cho cột chuỗi tự do (giữ NaN cho ô trống như object)"""
+    try:
+        import pyarrow  # noqa: F401
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except (ImportError, TypeError):
+        return object
+
+TEXT_DTYPE = _text_dtype()
+
 def init_csv():
     """Khởi tạo file CSV nếu chưa tồn tại"""
     # Tạo thư mục nếu chưa có
     os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
     
     if not os.path.exists(CSV_FILE):
-        df = pd.DataFrame(columns=['word', 'pos', 'phonetic', 'meaning', 'example', 'start_date', 'review_count', 'next_review'])
+        df = pd.DataFrame(columns=WORD_COLUMNS)
         df.to_csv(CSV_FILE, index=False, encoding='utf-8-sig')
 
-def load_words():
-    """Load danh sách từ vựng từ CSV"""
-    init_csv()
+def _ensure_ids(df):
+    """
+    Gán id cho các dòng chưa có id hoặc bị trùng id (file cũ, file sửa tay)
+    Returns: True nếu có dòng được gán id mới
+    """
+    ids = pd.to_numeric(df['id'], errors='coerce')
+    invalid = ids.isna() | ids.duplicated()
+    
+    if invalid.any():
+        start = int(ids[~invalid].max()) + 1 if (~invalid).any() else 1
+        ids.loc[invalid] = list(range(start, start + int(invalid.sum())))
+    
+    df['id'] = ids.astype('int64')
+    return bool(invalid.any())
+
+def _read_words_csv():
+    """
+    Đọc và chuẩn hóa kho từ backend CSV (chỉ gọi khi cache không còn hợp lệ)
+    Ưu tiên snapshot nhị phân nếu còn khớp với words.csv, không thì đọc CSV
+    rồi ghi lại snapshot cho lần khởi động sau.
+    """
     try:
-        df = pd.read_csv(CSV_FILE, encoding='utf-8-sig')
-        # Đảm bảo các cột cần thiết tồn tại
-        required_cols = ['word', 'pos', 'phonetic', 'meaning', 'example', 'start_date', 'review_count', 'next_review']
-        for col in required_cols:
-            if col not in df.columns:
-                if col in ['pos', 'phonetic']:
-                    df[col] = ''
-                elif col in ['word', 'meaning', 'example', 'start_date', 'next_review']:
-                    df[col] = ''
-                else:
-                    df[col] = 0
-        return df
+        with file_lock(CSV_FILE):
+            init_csv()
+            
+            df = vocab_snapshot.read(CSV_FILE, writable_columns=MUTABLE_COLUMNS)
+            # Snapshot cũ thiếu cột (phiên bản trước): đọc lại CSV
+            if df is not None and set(WORD_COLUMNS) <= set(df.columns):
+                # Áp các lần ôn tập ghi trong journal lên snapshot
+                review_journal.replay(df, CSV_FILE, set_value=_set_field)
+                return df
+            
+            df = pd.read_csv(CSV_FILE, encoding='utf-8-sig')
+            # Đảm bảo các cột cần thiết tồn tại
+            for col in WORD_COLUMNS:
+                if col not in df.columns:
+                    if col == 'id':
+                        df[col] = None
+                    elif col in ['pos', 'phonetic']:
+                        df[col] = ''
+                    elif col in ['word', 'meaning', 'example', 'start_date', 'next_review']:
+                        df[col] = ''
+                    elif col in FLOAT_STATE_COLUMNS:
+                        df[col] = np.nan
+                    else:
+                        df[col] = 0
+            
+            ids_assigned = _ensure_ids(df)
+            df = df[WORD_COLUMNS + [c for c in df.columns if c not in WORD_COLUMNS]]
+            
+            # Áp các lần ôn tập ghi trong journal lên dữ liệu gốc
+            review_journal.replay(df, CSV_FILE)
+            df = _prepare_frame(df)
+            
+            # File cũ chưa có id: ghi lại ngay để id ổn định giữa các lần load
+            if ids_assigned:
+                _write_csv(df)
+            else:
+                vocab_snapshot.write(CSV_FILE, df)
+            
+            return df
     except Exception as e:
         print(f"Error loading CSV: {e}")
-        return pd.DataFrame(columns=['word', 'pos', 'phonetic', 'meaning', 'example', 'start_date', 'review_count', 'next_review'])
+        return None
+
+def parse_day_column(values):
+    """
+    Parse cột ngày dd-mm-yyyy thành số ngày (int32), NO_DAY nếu trống/sai định dạng
+    Chỉ parse các giá trị khác nhau (kho lớn thường chỉ có vài trăm ngày khác nhau)
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Cột category đã có sẵn mã và danh sách giá trị khác nhau
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values.astype(object))
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object).astype(str), format="%d-%m-%Y", errors='coerce')
+    unique_days = ((parsed - pd.Timestamp("1970-01-01")) // pd.Timedelta(days=1)).fillna(NO_DAY).to_numpy(dtype=np.int64)
+    
+    days = np.full(len(codes), NO_DAY, dtype=np.int32)
+    valid = codes >= 0
+    days[valid] = unique_days[codes[valid]]
+    return days
+
+def _small_int_column(values):
+    """Cột số nguyên nhỏ không âm (ô trống/sai -> 0) dạng uint16"""
+    values = pd.to_numeric(values, errors='coerce').fillna(0)
+    return values.clip(0, np.iinfo(np.uint16).max).astype(np.uint16)
+
+def _state_columns(df):
+    """Các cột trạng thái xếp lịch đã ép kiểu (thiếu cột -> giá trị mặc định)"""
+    columns = {}
+    for col in STATE_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+        if col in FLOAT_STATE_COLUMNS:
+            columns[col] = pd.to_numeric(values, errors='coerce').astype(np.float32)
+        else:
+            columns[col] = _small_int_column(values)
+    return columns
+
+def _apply_schema(df):
+    """Ép các cột về kiểu gọn trong bộ nhớ (xem CATEGORY_COLUMNS, TEXT_COLUMNS)"""
+    return df.assign(
+        id=df['id'].astype('int64'),
+        review_count=_small_int_column(df['review_count']),
+        **_state_columns(df),
+        **{col: df[col].astype('category') for col in CATEGORY_COLUMNS},
+        **{col: df[col].astype(TEXT_DTYPE) for col in TEXT_COLUMNS}
+    )
+
+def _prepare_frame(df):
+    """Chuẩn bị DataFrame để lưu vào cache: ép kiểu gọn và thêm cột ngày dạng số"""
+    return _add_day_columns(_apply_schema(df))
+
+def _set_value(df, pos, col, value):
+    """Gán 1 ô (sửa tại chỗ), thêm category mới nếu cột là category"""
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype) and pd.notna(value) and value not in series.cat.categories:
+        df[col] = series.cat.add_categories([value])
+    df.iat[pos, df.columns.get_loc(col)] = value
+
+def _set_field(df, pos, col, value):
+    """Gán 1 ô và giữ cột ngày dạng số khớp với cột ngày dạng chuỗi"""
+    _set_value(df, pos, col, value)
+    if col in DAY_COLUMNS:
+        _set_value(df, pos, DAY_COLUMNS[col], date_str_to_day(value))
+
+def _set_values(df, positions, col, values):
+    """_set_field() cho nhiều dòng 1 lúc (vectorized, sửa tại chỗ)"""
+    values = pd.Series(values, dtype=object)
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        new = pd.Index(values.dropna().unique()).difference(series.cat.categories)
+        if len(new):
+            df[col] = series.cat.add_categories(new)
+    else:
+        values = values.astype(series.dtype)
+    df.iloc[positions, df.columns.get_loc(col)] = values.to_numpy()
+    if col in DAY_COLUMNS:
+        df.iloc[positions, df.columns.get_loc(DAY_COLUMNS[col])] = parse_day_column(values)
+
+def _add_day_columns(df):
+    """Trả về DataFrame có thêm các cột ngày dạng số (start_day, next_review_day)"""
+    df = df.assign(**{day_col: parse_day_column(df[date_col]) for date_col, day_col in DAY_COLUMNS.items()})
+    
+    invalid_count = len(_invalid_dates(df))
+    if invalid_count:
+        print(f"Warning: {invalid_count} ngày không đúng định dạng dd-mm-yyyy (xem get_invalid_dates())")
+    
+    return df
+
+def _invalid_dates(df):
+    """Các ô ngày có giá trị nhưng không parse được"""
+    parts = []
+    for date_col, day_col in DAY_COLUMNS.items():
+        filled = df[date_col].astype(object).fillna('').astype(str).str.strip() != ''
+        bad = df[(df[day_col] == NO_DAY) & filled]
+        parts.append(pd.DataFrame({
+            'id': bad['id'],
+            'word': bad['word'],
+            'column': date_col,
+            'value': bad[date_col]
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+def get_invalid_dates():
+    """
+    Liệt kê các ngày không đọc được (thay vì âm thầm coi là hôm nay)
+    Returns: DataFrame với columns: id, word, column, value
+    """
+    df = load_words(copy=False)
+    
+    if df.empty:
+        return pd.DataFrame(columns=['id', 'word', 'column', 'value'])
+    
+    return _invalid_dates(df)
+
+def _source_files():
+    """Các file nguồn của backend hiện tại (dùng để kiểm tra cache)"""
+    if storage_sqlite.is_enabled():
+        return [storage_sqlite.DB_FILE]
+    return [CSV_FILE, review_journal.journal_path(CSV_FILE)]
+
+def _read_words():
+    """Đọc từ vựng từ backend hiện tại, ép kiểu gọn và parse các cột ngày"""
+    if not storage_sqlite.is_enabled():
+        return _read_words_csv()
+    
+    df = storage_sqlite.read_words()
+    if df is None:
+        return None
+    return _prepare_frame(df)
+
+def load_words(copy=True):
+    """
+    Load danh sách từ vựng (đọc từ cache, chỉ parse lại khi dữ liệu thay đổi)
+    
+    Args:
+        copy: True (mặc định) trả về bản sao có thể sửa tự do.
+              False trả về bản sao nông (không chép dữ liệu) của DataFrame trong
+              cache: không đổi khi có lần ghi sau đó (kể cả từ session khác),
+              sửa nó cũng không ảnh hưởng cache (Copy-on-Write).
+    """
+    df = vocab_store.get_frame(_source_files(), _read_words)
+    
+    if df is None:
+        return pd.DataFrame(columns=WORD_COLUMNS + DERIVED_COLUMNS)
+    
+    return df.copy() if copy else df.copy(deep=False)
+
+def get_memory_report():
+    """
+    So sánh bộ nhớ kho từ vựng: dạng toàn object (trước) và schema gọn (sau)
+    Returns: DataFrame với columns: column, before_bytes, after_bytes, before_per_word, after_per_word
+             (dòng cuối 'TOTAL' là tổng cộng)
+    """
+    df = load_words(copy=False)
+    
+    before = df[WORD_COLUMNS].astype(object).memory_usage(deep=True, index=False)
+    after = df.memory_usage(deep=True, index=False)
+    
+    report = pd.DataFrame({'before_bytes': before, 'after_bytes': after}).reindex(df.columns).fillna(0).astype('int64')
+    report.loc['TOTAL'] = report.sum()
+    
+    words = max(len(df), 1)
+    report['before_per_word'] = (report['before_bytes'] / words).round(1)
+    report['after_per_word'] = (report['after_bytes'] / words).round(1)
+    return report.rename_axis('column').reset_index()
+
+def get_word(word_id):
+    """
+    Lấy thông tin 1 từ theo id (tra index băm, không copy cả kho)
+    Returns: dict hoặc None nếu không tìm thấy
+    """
+    return vocab_store.get_record(_source_files(), _read_words, word_id)
+
+def get_words_by_ids(word_ids, columns=None):
+    """
+    Lấy các từ theo danh sách id (giữ đúng thứ tự, tra index băm)
+    columns: chỉ lấy các cột này (None = mọi cột)
+    Returns: DataFrame (bản sao)
+    """
+    df = vocab_store.get_rows(_source_files(), _read_words, word_ids, columns)
+    
+    if df is None:
+        return pd.DataFrame(columns=columns or WORD_COLUMNS + DERIVED_COLUMNS)
+    
+    return df.reset_index(drop=True)
+
+def get_word_ids(words):
+    """
+    id của các từ theo khóa chuẩn hóa (list, None nếu chưa có)
+    SQLite: tra index khóa trong DB; CSV: tra index từ trong bộ nhớ
+    """
+    words = pd.Series(words, dtype=object)
+    if storage_sqlite.is_enabled():
+        try:
+            return storage_sqlite.find_word_ids(words.tolist())
+        except Exception as e:
+            print(f"Error reading database: {e}")
+    return vocab_store.find_word_ids(_source_files(), _read_words, words)
+
+def count_due_words(until_day):
+    """
+    Số từ có next_review_day <= until_day
+    SQLite: đếm trên index next_review; CSV: tìm nhị phân trên hàng đợi ôn tập
+    """
+    if storage_sqlite.is_enabled():
+        try:
+            return storage_sqlite.count_due_words(day_to_date_str(until_day))
+        except Exception as e:
+            print(f"Error reading database: {e}")
+    return vocab_store.count_due(_source_files(), _read_words, end_day=until_day + 1)
+
+def get_due_word_ids(until_day):
+    """id các từ có next_review_day <= until_day, quá hạn lâu nhất trước"""
+    if storage_sqlite.is_enabled():
+        try:
+            return np.array(storage_sqlite.read_due_ids(day_to_date_str(until_day)), dtype=np.int64)
+        except Exception as e:
+            print(f"Error reading database: {e}")
+    return vocab_store.due_ids(_source_files(), _read_words, end_day=until_day + 1)
+
+def get_due_forecast(start_day, num_days, include_overdue=False):
+    """
+    Số từ đến hạn ôn trong từng ngày từ start_day (mảng độ dài num_days)
+    include_overdue: cộng các từ quá hạn vào ngày đầu
+    """
+    return vocab_store.due_forecast(_source_files(), _read_words, start_day, num_days, include_overdue)
+
+def get_distractor_ids(word_ids, k, rng):
+    """
+    k đáp án sai cho mỗi từ (cùng từ loại, độ dài nghĩa, chính tả gần giống
+    nếu có), tra index đáp án sai - O(1) mỗi từ
+    Returns: list các list id
+    """
+    return vocab_store.sample_distractors(_source_files(), _read_words, word_ids, k, rng)
 
 def save_words(df):
-    """Lưu danh sách từ vựng vào CSV"""
+    """Lưu (ghi đè) toàn bộ danh sách từ vựng"""
+    if storage_sqlite.is_enabled():
+        try:
+            storage_sqlite.replace_all_words(df)
+            # Load lại để lấy id do DB cấp
+            vocab_store.invalidate()
+            return True
+        except Exception as e:
+            print(f"Error saving database: {e}")
+            return False
+    
     try:
-        # Đảm bảo thư mục tồn tại trước khi lưu
-        os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
-        df.to_csv(CSV_FILE, index=False, encoding='utf-8-sig')
+        df = _prepare_frame(df)
+        with file_lock(CSV_FILE):
+            _write_csv(df)
+            vocab_store.store_frame(_source_files(), df)
         return True
     except Exception as e:
         print(f"Error saving CSV: {e}")
         return False
 
+def _write_csv(df):
+    """
+    Ghi file CSV nguyên tử (file tạm + os.replace), ghi snapshot nhị phân đi kèm
+    rồi xóa journal đã được gộp
+    
+    df phải đã qua _prepare_frame(); phải gọi bên trong file_lock(CSV_FILE)
+    """
+    # Đảm bảo thư mục tồn tại trước khi lưu
+    os.makedirs(os.path.dirname(CSV_FILE), exist_ok=True)
+    tmp_file = CSV_FILE + ".tmp"
+    df.drop(columns=DERIVED_COLUMNS, errors='ignore').to_csv(tmp_file, index=False, encoding='utf-8-sig')
+    os.replace(tmp_file, CSV_FILE)
+    vocab_snapshot.write(CSV_FILE, df)
+    review_journal.clear(CSV_FILE)
+
+def _csv_writer(df):
+    """Tạo hàm write ghi lại toàn bộ words.csv + snapshot (dùng với vocab_store.apply_write)"""
+    def write():
+        try:
+            with file_lock(CSV_FILE):
+                _write_csv(df)
+            return True
+        except Exception as e:
+            print(f"Error saving CSV: {e}")
+            return False
+    return write
+
+def _csv_header():
+    """Tên các cột trong dòng đầu của words.csv"""
+    with open(CSV_FILE, 'r', encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f), [])
+
+def _append_csv(new_df, header):
+    """
+    Ghi thêm các từ mới vào cuối words.csv (không ghi lại cả file)
+    Snapshot sẽ cũ đi, cần _refresh_snapshot() sau khi ghi xong;
+    phải gọi bên trong file_lock(CSV_FILE)
+    """
+    with open(CSV_FILE, 'ab+') as f:
+        # Dòng cuối thiếu xuống dòng (file sửa tay): thêm vào trước
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    with open(CSV_FILE, 'a', encoding='utf-8', newline='') as f:
+        new_df.reindex(columns=header).to_csv(f, header=False, index=False)
+
+def _refresh_snapshot():
+    """Ghi lại snapshot từ cache sau khi words.csv được ghi thêm (append)"""
+    try:
+        with file_lock(CSV_FILE):
+            df = vocab_store.get_frame(_source_files(), _read_words)
+            if df is not None:
+                vocab_snapshot.write(CSV_FILE, df)
+    except Exception as e:
+        print(f"Warning: không ghi được snapshot: {e}")
+
+def compact_journal():
+    """
+    Gộp journal ôn tập vào words.csv
+    Returns: True nếu thành công
+    """
+    try:
+        with file_lock(CSV_FILE):
+            # Tiến trình khác có thể đã compact trước
+            if not review_journal.needs_compaction(CSV_FILE):
+                return True
+            df = _read_words()
+            if df is None:
+                return False
+            _write_csv(df)
+            vocab_store.store_frame(_source_files(), df)
+        return True
+    except Exception as e:
+        print(f"Error compacting journal: {e}")
+        return False
+
+def _word_exists(word, exclude_id=None):
+    """Kiểm tra từ đã tồn tại chưa (so khớp khóa chuẩn hóa qua index, O(1))"""
+    word_id = get_word_ids([word])[0]
+    return word_id is not None and word_id != exclude_id
+
+def _patch_fields(word_id, fields):
+    """Tạo hàm patch sửa các cột của 1 từ trong cache (tìm dòng qua index id)"""
+    def patch(cached, id_index):
+        pos = id_index.get(int(word_id))
+        if pos is not None:
+            for col, value in fields.items():
+                _set_field(cached, pos, col, value)
+    return patch
+
+def _insert_words(new_df, updates=None):
+    """
+    Thêm nhiều từ và cập nhật các từ đã có trong 1 lần ghi
+    (SQLite: 1 transaction, CSV: chỉ thêm từ mới thì ghi thêm vào cuối file,
+    có cập nhật thì ghi lại file 1 lần)
+    
+    Args:
+        new_df: DataFrame các từ mới (chưa có id)
+        updates: dict {id: {cột: giá trị mới}} cho các từ đã có
+    """
+    updates = updates or {}
+    # id các từ bị thay đổi (id từ mới được điền vào khi ghi)
+    touched_ids = list(updates)
+    
+    def patch(cached, id_index):
+        for word_id, fields in updates.items():
+            _patch_fields(word_id, fields)(cached, id_index)
+        if new_df.empty:
+            return None
+        added = _prepare_frame(new_df)[cached.columns]
+        return _apply_schema(pd.concat([cached, added], ignore_index=True))
+    
+    if storage_sqlite.is_enabled():
+        records = new_df.to_dict('records')
+        
+        def write():
+            try:
+                new_ids = storage_sqlite.upsert_words(records, updates)
+                new_df.insert(0, 'id', new_ids)
+                touched_ids.extend(new_ids)
+                return True
+            except Exception as e:
+                print(f"Error saving database: {e}")
+                return False
+        
+        return vocab_store.apply_write(_source_files(), write, patch, touched_ids=touched_ids)
+    
+    appended = []
+    
+    def write():
+        try:
+            with file_lock(CSV_FILE):
+                # Cấp id trong khóa, nối tiếp id lớn nhất của words.csv lúc ghi
+                # (load lại nếu tiến trình khác vừa ghi): không cấp trùng id
+                df = load_words(copy=False)
+                start = int(df['id'].max()) + 1 if not df.empty else 1
+                new_ids = list(range(start, start + len(new_df)))
+                new_df.insert(0, 'id', new_ids)
+                touched_ids.extend(new_ids)
+                
+                # Chỉ thêm từ mới: ghi thêm vào cuối file
+                header = _csv_header()
+                if not updates and set(WORD_COLUMNS) <= set(header):
+                    _append_csv(new_df, header)
+                    appended.append(True)
+                    return True
+                
+                # Có cập nhật từ đã có: ghi lại toàn bộ file
+                df = df.copy()
+                id_index = {int(i): pos for pos, i in enumerate(df['id'])}
+                for word_id, fields in updates.items():
+                    _patch_fields(word_id, fields)(df, id_index)
+                _write_csv(_prepare_frame(pd.concat([df.drop(columns=DERIVED_COLUMNS), new_df], ignore_index=True)))
+            return True
+        except Exception as e:
+            print(f"Error saving CSV: {e}")
+            return False
+    
+    success = vocab_store.apply_write(_source_files(), write, patch, touched_ids=touched_ids)
+    if success and appended:
+        _refresh_snapshot()
+    return success
+
+def update_word_fields(word_id, fields):
+    """
+    Cập nhật một số cột của 1 từ
+    SQLite: UPDATE đúng 1 dòng
+    CSV: tiến độ ôn tập ghi thêm vào journal, các cột khác ghi lại toàn bộ file
+    
+    Args:
+        word_id: id của từ
+        fields: dict {tên cột: giá trị mới}
+    
+    Returns: True nếu lưu thành công
+    """
+    word_id = int(word_id)
+    
+    if storage_sqlite.is_enabled():
+        def write():
+            try:
+                return storage_sqlite.update_word(word_id, fields)
+            except Exception as e:
+                print(f"Error saving database: {e}")
+                return False
+        
+        return vocab_store.apply_write(_source_files(), write, _patch_fields(word_id, fields), [word_id])
+    
+    # CSV: tiến độ ôn tập chỉ ghi thêm vào journal
+    if set(fields) <= review_journal.JOURNAL_FIELDS:
+        def write():
+            try:
+                with file_lock(CSV_FILE):
+                    review_journal.append_entries(CSV_FILE, [{'id': word_id, 'fields': fields}])
+                return True
+            except Exception as e:
+                print(f"Error writing journal: {e}")
+                return False
+        
+        success = vocab_store.apply_write(_source_files(), write, _patch_fields(word_id, fields), [word_id])
+        
+        # Journal quá lớn: gộp vào words.csv ở thread nền
+        if success and review_journal.needs_compaction(CSV_FILE):
+            threading.Thread(target=compact_journal, daemon=True).start()
+        
+        return success
+    
+    df = load_words()
+    patch = _patch_fields(word_id, fields)
+    patch(df, {int(i): pos for pos, i in enumerate(df['id'])})
+    return vocab_store.apply_write(_source_files(), _csv_writer(df), _patch_fields(word_id, fields), [word_id])
+
+def _patch_many(updates):
+    """Tạo hàm patch sửa nhiều từ trong cache, gán theo từng cột (vectorized)"""
+    def patch(cached, id_index):
+        changes = pd.DataFrame.from_dict(updates, orient='index')
+        changes = changes[[word_id in id_index for word_id in changes.index]]
+        positions = np.array([id_index[word_id] for word_id in changes.index], dtype=np.int64)
+        for col in changes.columns:
+            filled = changes[col].notna().to_numpy()
+            _set_values(cached, positions[filled], col, changes[col][filled])
+    return patch
+
+def update_words_fields(updates):
+    """
+    Cập nhật nhiều từ trong 1 lần ghi (vd: kết quả cả phiên ôn tập)
+    SQLite: 1 transaction
+    CSV: tiến độ ôn tập ghi thêm vào journal, các cột khác ghi lại toàn bộ file 1 lần
+    
+    Args:
+        updates: dict {id: {tên cột: giá trị mới}}
+    
+    Returns: True nếu lưu thành công
+    """
+    updates = {int(word_id): fields for word_id, fields in updates.items() if fields}
+    if not updates:
+        return True
+    
+    if storage_sqlite.is_enabled():
+        def write():
+            try:
+                storage_sqlite.upsert_words([], updates)
+                return True
+            except Exception as e:
+                print(f"Error saving database: {e}")
+                return False
+        
+        return vocab_store.apply_write(_source_files(), write, _patch_many(updates), list(updates))
+    
+    if all(set(fields) <= review_journal.JOURNAL_FIELDS for fields in updates.values()):
+        def write():
+            try:
+                with file_lock(CSV_FILE):
+                    review_journal.append_entries(
+                        CSV_FILE, [{'id': word_id, 'fields': fields} for word_id, fields in updates.items()]
+                    )
+                return True
+            except Exception as e:
+                print(f"Error writing journal: {e}")
+                return False
+        
+        success = vocab_store.apply_write(_source_files(), write, _patch_many(updates), list(updates))
+        
+        if success and review_journal.needs_compaction(CSV_FILE):
+            threading.Thread(target=compact_journal, daemon=True).start()
+        
+        return success
+    
+    df = load_words()
+    patch = _patch_many(updates)
+    patch(df, {int(i): pos for pos, i in enumerate(df['id'])})
+    return vocab_store.apply_write(_source_files(), _csv_writer(df), _patch_many(updates), list(updates))
+
 def add_word(word, pos, phonetic, meaning, example=""):
     """
     Thêm từ mới vào kho từ vựng
     Returns: (success: bool, message: str)
     """
-    df = load_words()
-    
     # Kiểm tra từ đã tồn tại chưa
-    if not df.empty and word.lower() in df['word'].str.lower().values:
+    if _word_exists(word):
         return False, f"❌ Từ '{word}' đã tồn tại trong kho!"
     
     # Tạo bản ghi mới
@@ -73,127 +679,295 @@ def add_word(word, pos, phonetic, meaning, example=""):
         'next_review': tomorrow
     }])
     
-    # Thêm vào dataframe
-    df = pd.concat([df, new_word], ignore_index=True)
-    
-    if save_words(df):
+    if _insert_words(new_word):
         return True, f"✅ Đã thêm từ '{word}' thành công!"
     else:
         return False, "❌ Lỗi khi lưu file!"
 
-def update_word(index, word, pos, phonetic, meaning, example):
+def update_word(word_id, word, pos, phonetic, meaning, example):
     """
     Cập nhật thông tin từ vựng
     Returns: (success: bool, message: str)
     """
-    df = load_words()
+    current = get_word(word_id)
     
-    if index < 0 or index >= len(df):
-        return False, "❌ Index không hợp lệ!"
+    if current is None:
+        return False, "❌ Không tìm thấy từ!"
     
     # Kiểm tra trùng lặp (nếu đổi sang từ khác đã tồn tại)
-    if word.lower() != df.iloc[index]['word'].lower():
-        if word.lower() in df['word'].str.lower().values:
+    if normalize_word(word) != normalize_word(current['word']):
+        if _word_exists(word, exclude_id=int(word_id)):
             return False, f"❌ Từ '{word}' đã tồn tại!"
     
     # Cập nhật
-    df.at[index, 'word'] = word
-    df.at[index, 'pos'] = pos
-    df.at[index, 'phonetic'] = phonetic
-    df.at[index, 'meaning'] = meaning
-    df.at[index, 'example'] = example
+    fields = {
+        'word': word,
+        'pos': pos,
+        'phonetic': phonetic,
+        'meaning': meaning,
+        'example': example
+    }
     
-    if save_words(df):
+    if update_word_fields(word_id, fields):
         return True, f"✅ Đã cập nhật từ '{word}' thành công!"
     else:
         return False, "❌ Lỗi khi lưu file!"
 
-def delete_word(index):
+def delete_word(word_id):
     """
     Xóa từ vựng
     Returns: (success: bool, message: str)
     """
-    df = load_words()
+    current = get_word(word_id)
+    
+    if current is None:
+        return False, "❌ Không tìm thấy từ!"
     
-    if index < 0 or index >= len(df):
-        return False, "❌ Index không hợp lệ!"
+    word = current['word']
+    word_id = int(word_id)
+    
+    def patch(cached, id_index):
+        return cached[cached['id'] != word_id].reset_index(drop=True)
+    
+    if storage_sqlite.is_enabled():
+        def write():
+            try:
+                return storage_sqlite.delete_word(word_id)
+            except Exception as e:
+                print(f"Error saving database: {e}")
+                return False
+    else:
+        df = load_words(copy=False)
+        write = _csv_writer(df[df['id'] != word_id])
     
-    word = df.iloc[index]['word']
-    df = df.drop(index).reset_index(drop=True)
+    success = vocab_store.apply_write(_source_files(), write, patch, [word_id])
     
-    if save_words(df):
+    if success:
         return True, f"✅ Đã xóa từ '{word}' thành công!"
     else:
         return False, "❌ Lỗi khi lưu file!"
 
-def search_words(search_term):
+def search_words(search_term, limit=SEARCH_LIMIT):
     """
-    Tìm kiếm từ vựng theo từ hoặc nghĩa
-    Returns: DataFrame chứa kết quả tìm kiếm
+    Tìm kiếm từ vựng theo từ, nghĩa hoặc ví dụ (không phân biệt hoa thường, dấu)
+    Kết quả xếp hạng: khớp cả từ > đầu từ > chứa trong từ > khớp nghĩa/ví dụ
+    
+    Returns: (DataFrame tối đa `limit` kết quả đã xếp hạng, tổng số kết quả)
     """
-    df = load_words()
+    if not search_term:
+        df = load_words()
+        return df, len(df)
     
-    if df.empty or not search_term:
-        return df
+    word_ids, total = vocab_store.search(_source_files(), _read_words, search_term, limit)
+    return get_words_by_ids(word_ids), total
+
+def suggest_words(prefix, limit=SUGGEST_LIMIT):
+    """
+    Gợi ý các từ đã có bắt đầu bằng prefix (không phân biệt hoa thường),
+    theo thứ tự chữ cái; tìm nhị phân trên index gợi ý, không quét kho
+    Returns: DataFrame tối đa `limit` từ
+    """
+    return get_words_by_ids(vocab_store.complete(_source_files(), _read_words, prefix, limit))
+
+def find_word(word):
+    """
+    Tìm từ đã có trong kho theo khóa chuẩn hóa (hoa thường, khoảng trắng, dấu)
+    Returns: dict hoặc None nếu chưa có
+    """
+    word_id = get_word_ids([word])[0]
+    return None if word_id is None else get_word(word_id)
+
+def _fill_import_defaults(new_df):
+    """Thêm các cột còn thiếu cho từ nhập từ ngoài (từ mới bắt đầu học hôm nay)"""
+    today = get_today()
+    tomorrow = add_days(today, 1)
     
-    search_term = search_term.lower()
+    defaults = {
+        'example': '',
+        'phonetic': '',
+        'pos': '',
+        'start_date': today,
+        'review_count': 0,
+        'next_review': tomorrow,
+        **{col: np.nan if col in FLOAT_STATE_COLUMNS else 0 for col in STATE_COLUMNS}
+    }
+    for col, value in defaults.items():
+        if col not in new_df.columns:
+            new_df[col] = value
+    return new_df
+
+def _new_pending():
+    """
+    Các thay đổi gom lại của 1 lần import theo chunk (ghi 1 lần bằng _write_pending)
+    - inserts: list DataFrame từ mới của từng chunk
+    - keys: {khóa chuẩn hóa: (số thứ tự chunk, vị trí dòng)} của các từ mới
+    - updates: {id: {cột: giá trị mới}} cho các từ đã có trong kho
+    - merged: khóa các từ mới được cập nhật lại bởi dòng trùng ở chunk sau
+    """
+    return {'inserts': [], 'keys': {}, 'updates': {}, 'merged': set()}
+
+def _is_filled(value):
+    """Ô có giá trị (không NaN, không rỗng): được ghi đè dữ liệu đang có"""
+    return pd.notna(value) and str(value).strip() != ''
+
+def _merge_pending(inserts, pending):
+    """
+    Từ mới trùng với từ mới của chunk trước: cập nhật dòng đã gom (như từ đã
+    có trong kho) thay vì thêm lần nữa; các từ còn lại được gom vào pending
+
+    Returns: (DataFrame các từ mới thực sự, số từ đã gom được cập nhật)
+    """
+    keys = normalize_words(inserts['word']).tolist()
+    is_pending = np.fromiter((key in pending['keys'] for key in keys), dtype=bool, count=len(keys))
     
-    # Tìm trong cột word và meaning
-    mask = (
-        df['word'].str.lower().str.contains(search_term, na=False) |
-        df['meaning'].str.lower().str.contains(search_term, na=False)
-    )
+    merged = 0
+    for row in np.flatnonzero(is_pending):
+        chunk_no, pos = pending['keys'][keys[row]]
+        target = pending['inserts'][chunk_no]
+        fields = {col: inserts.at[row, col] for col in UPSERT_FIELDS
+                  if _is_filled(inserts.at[row, col]) and str(inserts.at[row, col]) != str(target.at[pos, col])}
+        for col, value in fields.items():
+            target.at[pos, col] = value
+        if fields:
+            pending['merged'].add(keys[row])
+            merged += 1
     
-    return df[mask]
+    inserts = inserts[~is_pending].reset_index(drop=True)
+    chunk_no = len(pending['inserts'])
+    new_keys = [key for key, dup in zip(keys, is_pending) if not dup]
+    pending['keys'].update((key, (chunk_no, pos)) for pos, key in enumerate(new_keys))
+    pending['inserts'].append(inserts)
+    return inserts, merged
+
+def _write_pending(pending):
+    """Ghi các thay đổi đã gom của 1 lần import: 1 lần ghi, 1 lần nối vào cache"""
+    inserts = (pd.concat(pending['inserts'], ignore_index=True) if pending['inserts']
+               else pd.DataFrame(columns=WORD_COLUMNS[1:]))
+    if inserts.empty and not pending['updates']:
+        return True
+    return _insert_words(inserts, pending['updates'])
 
-def import_csv(file_path):
+def upsert_words(words_df, pending=None):
+    """
+    Thêm từ mới và cập nhật phiên âm/nghĩa/ví dụ của từ đã có, trong 1 lần ghi
+    Từ trùng được so theo khóa chuẩn hóa (normalize_word), trong cùng 1 lô
+    dòng sau ghi đè dòng trước. Ô trống không ghi đè dữ liệu đang có.
+    
+    Args:
+        words_df: DataFrame có cột 'word', 'meaning' (các cột khác tùy chọn)
+        pending: dict (_new_pending()) - nếu truyền vào, từ mới và cập nhật được
+                 gom vào đây thay vì ghi ngay (import theo chunk: _write_pending()
+                 ghi 1 lần sau chunk cuối)
+    
+    Returns: (success: bool, counts: dict {'inserted', 'updated', 'skipped'})
     """
-    Import từ vựng từ file CSV khác
+    total = len(words_df)
+    new_df = words_df.drop(columns=['id'], errors='ignore')
+    new_df = new_df[new_df['word'].notna()].copy()
+    new_df['word'] = new_df['word'].astype(str).str.strip()
+    new_df = new_df[new_df['word'] != '']
+    
+    # Trùng trong cùng lô: giữ dòng cuối
+    new_df = new_df[~normalize_words(new_df['word']).duplicated(keep='last')]
+    new_df = _fill_import_defaults(new_df).reset_index(drop=True)
+    
+    existing_ids = pd.Series(get_word_ids(new_df['word']), dtype=object)
+    is_existing = existing_ids.notna().to_numpy()
+    
+    # Từ đã có: chỉ cập nhật các cột có giá trị mới khác giá trị hiện tại
+    updates = {}
+    incoming = new_df[is_existing].reset_index(drop=True)
+    if not incoming.empty:
+        ids = existing_ids[is_existing].astype('int64').tolist()
+        current = get_words_by_ids(ids)
+        changed = {}
+        for col in UPSERT_FIELDS:
+            values = incoming[col].astype(object)
+            filled = values.notna() & (values.astype(str).str.strip() != '')
+            changed[col] = filled & (values.astype(str) != current[col].astype(object).astype(str))
+        for i, word_id in enumerate(ids):
+            fields = {col: incoming.at[i, col] for col in UPSERT_FIELDS if changed[col].iat[i]}
+            if fields:
+                updates[word_id] = fields
+    
+    inserts = new_df[~is_existing][WORD_COLUMNS[1:]].reset_index(drop=True)
+    merged = 0
+    if pending is not None:
+        inserts, merged = _merge_pending(inserts, pending)
+    counts = {
+        'inserted': len(inserts),
+        'updated': len(updates) + merged,
+        'skipped': total - len(inserts) - len(updates) - merged
+    }
+    
+    if pending is not None:
+        for word_id, fields in updates.items():
+            pending['updates'].setdefault(word_id, {}).update(fields)
+        return True, counts
+    
+    if inserts.empty and not updates:
+        return True, counts
+    
+    return _insert_words(inserts, updates), counts
+
+def _source_size(handle):
+    """Kích thước (bytes) của file/buffer, dùng để tính tiến độ import"""
+    pos = handle.tell()
+    handle.seek(0, os.SEEK_END)
+    size = handle.tell()
+    handle.seek(pos)
+    return max(size, 1)
+
+def import_csv(source, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Import từ vựng từ file CSV khác: thêm từ mới, cập nhật nghĩa/ví dụ/phiên âm
+    của từ đã có. Đọc theo từng chunk, chỉ giữ lại các từ mới (sẽ vào kho) và
+    cập nhật; ghi 1 lần sau chunk cuối nên không chép lại cả kho mỗi chunk.
+    
+    Args:
+        source: đường dẫn file hoặc buffer nhị phân (vd: file upload của Streamlit)
+        chunk_size: số dòng mỗi chunk
+        progress: hàm progress(fraction, counts) gọi sau mỗi chunk
+    
     Returns: (success: bool, message: str)
     """
+    handle = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    
     try:
-        new_df = pd.read_csv(file_path, encoding='utf-8-sig')
+        size = _source_size(handle)
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        # Từ mới và cập nhật từ đã có được gom lại, ghi 1 lần sau chunk cuối
+        pending = _new_pending()
         
-        # Kiểm tra cấu trúc file
-        required_cols = ['word', 'meaning']
-        if not all(col in new_df.columns for col in required_cols):
-            return False, "❌ File CSV không đúng định dạng! Cần có cột 'word' và 'meaning'."
-        
-        # Load dữ liệu hiện tại
-        current_df = load_words()
-        
-        # Thêm các cột còn thiếu cho file import
-        today = get_today()
-        tomorrow = add_days(today, 1)
-        
-        if 'example' not in new_df.columns:
-            new_df['example'] = ''
-        if 'phonetic' not in new_df.columns:
-            new_df['phonetic'] = ''
-        if 'pos' not in new_df.columns:
-            new_df['pos'] = ''
-        if 'start_date' not in new_df.columns:
-            new_df['start_date'] = today
-        if 'review_count' not in new_df.columns:
-            new_df['review_count'] = 0
-        if 'next_review' not in new_df.columns:
-            new_df['next_review'] = tomorrow
+        for chunk in pd.read_csv(handle, encoding='utf-8-sig', chunksize=chunk_size):
+            # Kiểm tra cấu trúc file
+            required_cols = ['word', 'meaning']
+            if not all(col in chunk.columns for col in required_cols):
+                return False, "❌ File CSV không đúng định dạng! Cần có cột 'word' và 'meaning'."
+            
+            _, chunk_counts = upsert_words(chunk, pending)
+            
+            # 1 từ có thể được cập nhật ở nhiều chunk: đếm theo số từ thực sự cập nhật
+            counts['inserted'] += chunk_counts['inserted']
+            counts['skipped'] += chunk_counts['skipped']
+            counts['updated'] = len(pending['updates']) + len(pending['merged'])
+            
+            if progress is not None:
+                progress(min(handle.tell() / size, 1.0), dict(counts))
         
-        # Lọc các từ chưa tồn tại
-        if not current_df.empty:
-            existing_words = current_df['word'].str.lower().values
-            new_df = new_df[~new_df['word'].str.lower().isin(existing_words)]
+        if not _write_pending(pending):
+            return False, "❌ Lỗi khi lưu file!"
         
-        if new_df.empty:
+        if counts['inserted'] == 0 and counts['updated'] == 0:
             return False, "⚠️ Không có từ mới nào để import (tất cả đã tồn tại)!"
         
-        # Gộp và lưu
-        combined_df = pd.concat([current_df, new_df], ignore_index=True)
-        
-        if save_words(combined_df):
-            return True, f"✅ Đã import thành công {len(new_df)} từ mới!"
-        else:
-            return False, "❌ Lỗi khi lưu file!"
-            
+        return True, (f"✅ Đã import thành công {counts['inserted']} từ mới, "
+                      f"cập nhật {counts['updated']} từ, bỏ qua {counts['skipped']} dòng!")
+    
+    except pd.errors.EmptyDataError:
+        return False, "❌ File CSV không đúng định dạng! Cần có cột 'word' và 'meaning'."
     except Exception as e:
         return False, f"❌ Lỗi khi đọc file: {str(e)}"
+    finally:
+        if handle is not source:
+            handle.close()
@@ -0,0 +1,34 @@
+"""
+conftest.py - Cấu hình chung cho test
+
+Các module dùng đường dẫn tương đối (data/vocab/words.csv, data/history_quiz/...)
+nên mỗi test chạy trong 1 thư mục tạm riêng (có sẵn các thư mục data/ như
+trong repo), với backend CSV và cache trong bộ nhớ rỗng.
+
+Chạy test (trong thư mục VocatGo): python -m pytest
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import vocab_store, storage_sqlite, quiz_aggregates  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Thư mục làm việc tạm + backend CSV + cache rỗng"""
+    for folder in ('data/vocab', 'data/history_quiz'):
+        os.makedirs(tmp_path / folder)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage_sqlite, 'STORAGE_BACKEND', 'csv')
+    vocab_store.invalidate()
+    quiz_aggregates._cache.clear()
+    yield tmp_path
+    vocab_store.invalidate()
+
+@pytest.fixture
+def sqlite_backend(monkeypatch):
+    """Bật backend SQLite (data/vocatgo.db trong thư mục tạm)"""
+    monkeypatch.setattr(storage_sqlite, 'STORAGE_BACKEND', 'sqlite')
+    vocab_store.invalidate()
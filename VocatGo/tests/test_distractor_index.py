@@ -0,0 +1,38 @@
+"""
+Test index đáp án sai (distractor_index): ưu tiên bucket giống nhất, bỏ nghĩa
+trùng, và lấy ngẫu nhiên cả kho khi các mức đều thiếu
+"""
+import numpy as np
+import pandas as pd
+from modules import distractor_index
+
+def _df(words, pos, meanings):
+    return pd.DataFrame({'id': np.arange(1, len(words) + 1), 'word': words, 'pos': pos, 'meaning': meanings})
+
+def test_prefers_same_pos_and_distinct_meanings():
+    index = distractor_index.build(_df(
+        ['run', 'walk', 'jump', 'swim', 'apple', 'pear'],
+        ['v', 'v', 'v', 'v', 'n', 'n'], ['chạy', 'đi bộ', 'nhảy', 'bơi', 'táo', 'lê']))
+
+    chosen = distractor_index.sample(index, 1, 3, np.random.default_rng(0))
+
+    assert sorted(chosen) == [2, 3, 4]
+
+def test_duplicate_meanings_fall_back_to_random_words():
+    n = 1000
+    index = distractor_index.build(_df([f"w{i}" for i in range(n)], 'n', 'giống nhau'))
+
+    picks = [distractor_index.sample(index, 1, 3, np.random.default_rng(seed)) for seed in range(5)]
+
+    for chosen in picks:
+        assert len(set(chosen)) == 3 and 1 not in chosen
+    # Rút ngẫu nhiên trên cả kho, không phải luôn là các id đầu bucket
+    assert len({tuple(chosen) for chosen in picks}) > 1
+    assert max(max(chosen) for chosen in picks) > 10
+
+def test_small_deck_returns_every_other_word():
+    index = distractor_index.build(_df(['a', 'b', 'c'], 'n', 'x'))
+
+    chosen = distractor_index.sample(index, 2, 3, np.random.default_rng(0))
+
+    assert sorted(chosen) == [1, 3]
@@ -0,0 +1,93 @@
+"""
+Test lịch sử quiz chia theo tháng (history_partitions): ghi, đọc theo khoảng
+thời gian, nén các tháng đã qua và chia file cũ chưa chia tháng
+"""
+import os
+import pandas as pd
+from modules import history_partitions as partitions
+from modules.storage_sqlite import QUIZ_LOG_FIELDS, WRONG_WORD_FIELDS
+
+def _log_row(time, session_id, score=1):
+    return {'time': time, 'quiz_type': 'typing', 'score': score, 'total': 2,
+            'accuracy': score * 50.0, 'wrong_count': 2 - score, 'session_id': session_id}
+
+def _append_log(*rows):
+    partitions.append(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, list(rows))
+
+def test_append_writes_one_csv_per_month():
+    _append_log(_log_row('2026-08-31 23:59', 'a'), _log_row('2026-09-01 00:00', 'b'),
+                _log_row('2026-09-15 10:00', 'c'))
+
+    assert partitions.months() == ['2026-08', '2026-09']
+    assert len(pd.read_csv(partitions.csv_path('2026-09', partitions.QUIZ_LOG))) == 2
+    assert partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS)['session_id'].tolist() == ['a', 'b', 'c']
+
+def test_read_range_only_opens_months_inside(monkeypatch):
+    _append_log(_log_row('2026-07-10 08:00', 'jul'), _log_row('2026-08-10 08:00', 'aug'),
+                _log_row('2026-09-10 08:00', 'sep'))
+    opened = []
+    read_file = partitions._read_file
+    monkeypatch.setattr(partitions, '_read_file', lambda path: opened.append(path) or read_file(path))
+
+    df = partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, start='2026-08-01', end='2026-09')
+
+    assert df['session_id'].tolist() == ['aug']
+    assert not any('2026-07' in path or '2026-09' in path for path in opened)
+
+def test_read_range_is_half_open_on_time():
+    _append_log(_log_row('2026-09-10 08:00', 'a'), _log_row('2026-09-10 09:00', 'b'),
+                _log_row('2026-09-10 10:00', 'c'))
+
+    df = partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, start='2026-09-10 09:00', end='2026-09-10 10:00')
+
+    assert df['session_id'].tolist() == ['b']
+
+def test_malformed_time_goes_to_unknown_month():
+    _append_log(_log_row('hôm qua', 'bad'), _log_row('2026-09-10 08:00', 'ok'))
+
+    assert partitions.UNKNOWN_MONTH in partitions.months()
+    # time sai định dạng coi như trước mọi mốc: có trong khoảng chỉ có end
+    assert partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, end='2026-01')['session_id'].tolist() == ['bad']
+    assert partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, start='2026-01')['session_id'].tolist() == ['ok']
+
+def test_compact_keeps_rows_and_text_types():
+    rows = [{'time': '2026-08-10 08:00', 'word': '123', 'meaning': 'số', 'example': '',
+             'quiz_type': 'typing', 'session_id': 's1'},
+            {'time': '2026-09-10 08:00', 'word': 'apple', 'meaning': 'táo', 'example': 'An apple',
+             'quiz_type': 'typing', 'session_id': 's2'}]
+    partitions.append(partitions.WRONG_WORDS, WRONG_WORD_FIELDS, rows)
+    before = partitions.read(partitions.WRONG_WORDS, WRONG_WORD_FIELDS)
+
+    assert partitions.compact('2026-09', names=(partitions.WRONG_WORDS,)) == ['2026-08']
+
+    month_dir = os.path.join(partitions.HISTORY_DIR, '2026-08')
+    assert os.listdir(month_dir) == [f"{partitions.WRONG_WORDS}{partitions.COMPACT_EXT}"]
+    after = partitions.read(partitions.WRONG_WORDS, WRONG_WORD_FIELDS)
+    assert after['word'].tolist() == ['123', 'apple']
+    assert after[['time', 'word', 'session_id']].equals(before[['time', 'word', 'session_id']])
+
+def test_compact_merges_late_rows_into_compacted_month():
+    _append_log(_log_row('2026-08-10 08:00', 'a'))
+    partitions.compact('2026-09')
+    # Đồng hồ bị chỉnh lùi: thêm dòng vào tháng đã nén
+    _append_log(_log_row('2026-08-11 08:00', 'b'))
+
+    assert partitions.compact('2026-09') == ['2026-08']
+    assert partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS)['session_id'].tolist() == ['a', 'b']
+    assert not os.path.exists(partitions.csv_path('2026-08', partitions.QUIZ_LOG))
+
+def test_split_legacy_moves_rows_and_keeps_empty_seed_file():
+    log_path = partitions.legacy_path(partitions.QUIZ_LOG)
+    wrong_path = partitions.legacy_path(partitions.WRONG_WORDS)
+    # File cũ chưa có session_id
+    pd.DataFrame([_log_row('2026-08-10 08:00', None)]).drop(columns='session_id').to_csv(log_path, index=False)
+    with open(wrong_path, 'w') as f:
+        f.write('\n')
+
+    partitions.split_legacy({partitions.QUIZ_LOG: QUIZ_LOG_FIELDS, partitions.WRONG_WORDS: WRONG_WORD_FIELDS})
+
+    assert not os.path.exists(log_path)
+    assert os.path.exists(wrong_path)
+    df = partitions.read(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS)
+    assert df['session_id'].tolist() == ['2026-08-10 08:00']
+    assert partitions.months() == ['2026-08']
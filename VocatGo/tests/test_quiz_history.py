@@ -0,0 +1,127 @@
+"""
+Test số liệu tổng hợp của lịch sử quiz (cộng dồn khi lưu = tạo lại từ lịch sử
+gốc) và thời hạn lưu giữ (gộp lịch sử cũ vào số liệu rồi xóa)
+"""
+from datetime import datetime
+import pytest
+from modules import quiz_aggregates, quiz_history, storage_sqlite
+from modules import history_partitions as partitions
+from modules.storage_sqlite import QUIZ_LOG_FIELDS, WRONG_WORD_FIELDS
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(storage_sqlite, 'STORAGE_BACKEND', request.param)
+    return request.param
+
+def _add_old_quiz(backend, time, session_id, score, wrong_words):
+    """Ghi thẳng 1 bài quiz cũ vào lịch sử gốc (không qua số liệu tổng hợp)"""
+    log_data = {'time': time, 'quiz_type': 'multiple_choice', 'score': score, 'total': 4,
+                'accuracy': score * 25.0, 'wrong_count': len(wrong_words), 'session_id': session_id}
+    wrong_rows = [{'time': time, 'word': word, 'meaning': f"nghĩa {word}", 'example': '',
+                   'quiz_type': 'multiple_choice', 'session_id': session_id} for word in wrong_words]
+    if backend == 'sqlite':
+        storage_sqlite.append_quiz_result(log_data, wrong_rows)
+    else:
+        partitions.append(partitions.QUIZ_LOG, QUIZ_LOG_FIELDS, [log_data])
+        partitions.append(partitions.WRONG_WORDS, WRONG_WORD_FIELDS, wrong_rows)
+
+def _snapshot():
+    return (quiz_history.get_quiz_stats(), quiz_history.get_type_stats(),
+            quiz_history.get_most_wrong_words(top_n=10).values.tolist())
+
+def _wrong(*words):
+    return [{'word': word, 'meaning': f"nghĩa {word}", 'example': ''} for word in words]
+
+def test_incremental_aggregates_match_rebuild(backend):
+    quiz_history.save_quiz_result('typing', 1, 3, _wrong('apple', 'banana'))
+    quiz_history.save_quiz_result('multiple_choice', 3, 4, _wrong('apple'))
+    quiz_history.save_quiz_result('typing', 2, 2, [])
+
+    incremental = _snapshot()
+    stats, type_stats, wrong = incremental
+    assert stats == {'total_quizzes': 3, 'avg_accuracy': 69.4, 'best_score': 100.0, 'total_questions': 9}
+    assert wrong[0][:3] == ['apple', 'nghĩa apple', 2]
+
+    quiz_aggregates.remove(quiz_history.QUIZ_AGGREGATES_PATH)
+    assert _snapshot() == incremental
+
+def test_history_changed_elsewhere_triggers_rebuild(backend):
+    quiz_history.save_quiz_result('typing', 1, 2, _wrong('apple'))
+    _add_old_quiz(backend, '2026-01-05 10:00', 'old', 4, [])
+
+    assert quiz_history.get_quiz_stats()['total_quizzes'] == 2
+
+def test_retention_keeps_overview_stats(backend):
+    this_month = datetime.now().strftime("%Y-%m")
+    _add_old_quiz(backend, f"{quiz_history._shift_month(this_month, -14)}-03 09:00", 'old1', 1, ['apple', 'cherry'])
+    _add_old_quiz(backend, f"{quiz_history._shift_month(this_month, -2)}-20 09:00", 'old2', 4, [])
+    quiz_history.save_quiz_result('typing', 1, 2, _wrong('apple'))
+    before = _snapshot()
+
+    success, _ = quiz_history.apply_retention(months=1)
+
+    assert success
+    assert len(quiz_history.load_quiz_log()) == 1
+    assert quiz_history.load_wrong_words()['word'].tolist() == ['apple']
+    assert _snapshot() == before
+    if backend == 'csv':
+        assert partitions.months() == [this_month]
+
+    # Tạo lại từ lịch sử gốc còn lại + số liệu đã gộp cho cùng kết quả
+    quiz_history.rebuild_aggregates()
+    assert _snapshot() == before
+
+def test_retention_is_noop_when_nothing_expired(backend):
+    quiz_history.save_quiz_result('typing', 1, 2, _wrong('apple'))
+    assert quiz_history.apply_retention(months=3)[0]
+    assert quiz_history.apply_retention(months=3) == (True, "✅ Không có lịch sử cũ cần gộp")
+    assert quiz_history.get_quiz_stats()['total_quizzes'] == 1
+
+def test_save_appends_wrong_counts_only(monkeypatch):
+    quiz_history.save_quiz_result('typing', 1, 3, _wrong('apple', 'banana'))
+    counts_path = quiz_aggregates.wrong_counts_path(quiz_history.QUIZ_AGGREGATES_PATH)
+    with open(counts_path, encoding='utf-8') as f:
+        before = f.read()
+    rewritten = []
+    write_atomic = quiz_aggregates._write_atomic
+    monkeypatch.setattr(quiz_aggregates, '_write_atomic', lambda path, text: rewritten.append(path) or write_atomic(path, text))
+
+    quiz_history.save_quiz_result('typing', 0, 2, _wrong('apple', 'cherry'))
+
+    # Chỉ file số liệu tổng được ghi lại; bảng đếm chỉ được ghi thêm
+    assert rewritten == [quiz_history.QUIZ_AGGREGATES_PATH]
+    with open(counts_path, encoding='utf-8') as f:
+        assert f.read().startswith(before)
+    with open(quiz_history.QUIZ_AGGREGATES_PATH, encoding='utf-8') as f:
+        assert 'wrong_counts' not in f.read()
+    quiz_aggregates._cache.clear()
+    assert quiz_history.get_most_wrong_words(top_n=10).values.tolist()[0][:3] == ['apple', 'nghĩa apple', 2]
+
+def test_long_wrong_counts_file_is_compacted(monkeypatch):
+    monkeypatch.setattr(quiz_aggregates, 'COMPACT_MIN_LINES', 2)
+    for _ in range(4):
+        quiz_history.save_quiz_result('typing', 1, 2, _wrong('apple'))
+
+    counts_path = quiz_aggregates.wrong_counts_path(quiz_history.QUIZ_AGGREGATES_PATH)
+    with open(counts_path, encoding='utf-8') as f:
+        assert len(f.readlines()) <= 2
+    quiz_aggregates._cache.clear()
+    assert quiz_history.get_most_wrong_words(top_n=1).values.tolist()[0][:3] == ['apple', 'nghĩa apple', 4]
+
+def test_interrupted_save_triggers_rebuild():
+    quiz_history.save_quiz_result('typing', 1, 2, _wrong('apple'))
+    # Bị gián đoạn sau khi ghi thêm bảng đếm, trước khi ghi số liệu tổng
+    with open(quiz_aggregates.wrong_counts_path(quiz_history.QUIZ_AGGREGATES_PATH), 'a', encoding='utf-8') as f:
+        f.write('["apple", "nghĩa apple", 1]\n')
+    quiz_aggregates._cache.clear()
+
+    assert quiz_history.get_most_wrong_words(top_n=1).values.tolist()[0][:3] == ['apple', 'nghĩa apple', 1]
+
+def test_compaction_rebuilds_missing_aggregates():
+    _add_old_quiz('csv', '2026-01-05 10:00', 'old', 4, ['apple'])
+    quiz_aggregates.remove(quiz_history.QUIZ_AGGREGATES_PATH)
+
+    quiz_history._maintain_history()
+
+    assert quiz_aggregates.load(quiz_history.QUIZ_AGGREGATES_PATH)['total_quizzes'] == 1
+    assert quiz_history.get_quiz_stats()['total_quizzes'] == 1
@@ -0,0 +1,78 @@
+"""
+Test journal ôn tập (review_journal) và việc gộp journal vào words.csv
+"""
+import os
+import pandas as pd
+from modules import review_journal, vocab_store, word_manager
+
+BASE = "words.csv"
+
+def _frame():
+    return pd.DataFrame({
+        'id': [1, 2, 3],
+        'word': ['apple', 'Banana', 'cherry'],
+        'review_count': [0, 0, 0],
+        'next_review': ['01-01-2026'] * 3
+    })
+
+def test_replay_applies_latest_value_per_word():
+    review_journal.append_entries(BASE, [{'id': 1, 'fields': {'review_count': 1, 'next_review': '02-01-2026'}}])
+    review_journal.append_entries(BASE, [{'id': 1, 'fields': {'review_count': 2}},
+                                         {'id': 3, 'fields': {'review_count': 5}}])
+
+    df = review_journal.replay(_frame(), BASE)
+
+    assert df['review_count'].tolist() == [2, 0, 5]
+    assert df.loc[0, 'next_review'] == '02-01-2026'
+
+def test_replay_is_idempotent():
+    review_journal.append_entries(BASE, [{'id': 2, 'fields': {'review_count': 3}}])
+
+    once = review_journal.replay(_frame(), BASE)
+    twice = review_journal.replay(once.copy(), BASE)
+
+    pd.testing.assert_frame_equal(once, twice)
+
+def test_torn_line_is_skipped_and_next_entry_kept():
+    review_journal.append_entries(BASE, [{'id': 1, 'fields': {'review_count': 1}}])
+    # Crash giữa lúc ghi: dòng cuối dở dang, không có xuống dòng
+    with open(review_journal.journal_path(BASE), 'a', encoding='utf-8') as f:
+        f.write('{"id": 2, "fields": {"review_')
+    review_journal.append_entries(BASE, [{'id': 3, 'fields': {'review_count': 4}}])
+
+    assert review_journal.read_entries(BASE) == {1: {'review_count': 1}, 3: {'review_count': 4}}
+
+def test_unknown_fields_and_deleted_words_are_ignored():
+    review_journal.append_entries(BASE, [{'id': 1, 'fields': {'review_count': 1, 'meaning': 'x'}},
+                                         {'id': 99, 'fields': {'review_count': 7}}])
+
+    df = review_journal.replay(_frame(), BASE)
+
+    assert review_journal.read_entries(BASE)[1] == {'review_count': 1}
+    assert df['review_count'].tolist() == [1, 0, 0]
+
+def test_legacy_entries_keyed_by_word():
+    with open(review_journal.journal_path(BASE), 'w', encoding='utf-8') as f:
+        f.write('{"word": "BANANA", "fields": {"review_count": 6}}\n')
+
+    df = review_journal.replay(_frame(), BASE)
+
+    assert df['review_count'].tolist() == [0, 6, 0]
+
+def test_compaction_moves_journal_into_csv(monkeypatch):
+    for word in ['apple', 'banana', 'cherry']:
+        assert word_manager.add_word(word, 'n', '', f"nghĩa {word}")[0]
+    word_manager.update_word_fields(1, {'review_count': 2, 'next_review': '01-01-2030'})
+    word_manager.update_word_fields(3, {'review_count': 4})
+    assert os.path.exists(review_journal.journal_path(word_manager.CSV_FILE))
+
+    monkeypatch.setattr(review_journal, 'COMPACT_THRESHOLD', 0)
+    assert word_manager.compact_journal()
+
+    assert not os.path.exists(review_journal.journal_path(word_manager.CSV_FILE))
+    raw = pd.read_csv(word_manager.CSV_FILE, encoding='utf-8-sig')
+    assert raw['review_count'].tolist() == [2, 0, 4]
+    assert raw.loc[0, 'next_review'] == '01-01-2030'
+
+    vocab_store.invalidate()
+    assert word_manager.load_words()['review_count'].tolist() == [2, 0, 4]
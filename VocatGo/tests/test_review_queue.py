@@ -0,0 +1,50 @@
+"""
+Test hàng đợi ôn tập (review_queue): giới hạn/ngày trừ đi số từ đã ôn hôm nay,
+đếm tăng dần theo các từ vừa được ôn
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules import review_queue, word_manager
+from modules.spaced_repetition import apply_reviews
+from modules.utils import today_day
+
+@pytest.fixture(autouse=True)
+def fresh_queue(monkeypatch):
+    monkeypatch.setattr(review_queue, '_reviewed', {'today': None, 'data_version': None, 'new': set(), 'review': set()})
+
+def _deck(n, review_count=0):
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1), 'word': [f"w{i}" for i in range(n)], 'pos': 'n', 'phonetic': '',
+        'meaning': [f"m{i}" for i in range(n)], 'example': '', 'start_date': '01-01-2026',
+        'review_count': review_count, 'next_review': pd.to_datetime(today_day(), unit='D').strftime('%d-%m-%Y')
+    })
+
+def _full_count():
+    review_queue._reviewed['today'] = None
+    return review_queue._reviewed_today(today_day())
+
+def test_quota_subtracts_words_reviewed_today():
+    word_manager.save_words(_deck(10))
+    assert review_queue.plan_session(new_limit=5, review_limit=5) == {'new': 5, 'review': 0}
+
+    assert apply_reviews([(1, True, pd.Timestamp.now()), (2, False, pd.Timestamp.now())])[0]
+
+    assert review_queue.plan_session(new_limit=5, review_limit=5) == {'new': 3, 'review': 0}
+
+def test_reviewed_count_only_rechecks_changed_words(monkeypatch):
+    word_manager.save_words(_deck(12, review_count=[0] * 6 + [3] * 6))
+    assert review_queue._reviewed_today(today_day()) == (0, 0)
+    scans = []
+    load_words = review_queue.load_words
+    monkeypatch.setattr(review_queue, 'load_words', lambda **kwargs: scans.append(1) or load_words(**kwargs))
+
+    now = pd.Timestamp.now()
+    assert apply_reviews([(1, True, now), (7, True, now), (8, False, now)])[0]
+    counts = review_queue._reviewed_today(today_day())
+    assert apply_reviews([(1, True, now)])[0]
+    again = review_queue._reviewed_today(today_day())
+
+    assert scans == []
+    assert counts == (1, 2)
+    assert again == _full_count() == (0, 3)
@@ -0,0 +1,131 @@
+"""
+Test các thuật toán xếp lịch (fixed, SM-2, FSRS) và cân bằng tải
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules import scheduler
+from modules.utils import NO_DAY
+
+TODAY = 20000
+
+def _state(review_count, next_review_day, **columns):
+    """Trạng thái của các từ như word_state() của kho từ vựng"""
+    df = pd.DataFrame({'review_count': review_count, 'next_review_day': next_review_day, **columns})
+    return scheduler.word_state(df)
+
+def test_fixed_moves_up_and_down_the_ladder():
+    state = _state([0, 2, 0, 3], [TODAY] * 4)
+
+    fields, interval = scheduler.review(state, [True, True, False, False], TODAY, name='fixed')
+
+    assert fields['review_count'].tolist() == [1, 3, 0, 2]
+    assert interval.tolist() == [3, 14, 1, 1]
+    assert fields['lapses'].tolist() == [0, 0, 1, 1]
+    assert fields['interval_days'].tolist() == interval.tolist()
+
+def test_previous_interval_falls_back_to_ladder():
+    state = _state([0, 3, 3], [TODAY] * 3, interval_days=[0, 0, 10])
+
+    assert scheduler.previous_interval(state).tolist() == [1, 14, 10]
+
+def test_sm2_ease_and_intervals():
+    state = _state([0, 1, 2, 2], [TODAY] * 4,
+                   ease=[np.nan, 2.5, 2.5, 2.5], interval_days=[0, 1, 6, 6])
+
+    fields, interval = scheduler.review(state, [True, True, True, False], TODAY, name='sm2')
+
+    # Đã nhớ (q=4) giữ ease, quên (q=2) giảm 0.32
+    assert fields['ease'] == pytest.approx([2.5, 2.5, 2.5, 2.18])
+    assert fields['review_count'].tolist() == [1, 2, 3, 0]
+    # Lần 1: 1 ngày, lần 2: 6 ngày, sau đó khoảng ôn trước x ease; quên học lại từ đầu
+    assert interval.tolist() == [1, 6, 15, 1]
+
+def test_sm2_ease_has_lower_bound():
+    state = _state([0], [TODAY], ease=[scheduler.SM2_MIN_EASE])
+
+    fields, _ = scheduler.review(state, [False], TODAY, name='sm2')
+
+    assert fields['ease'][0] == scheduler.SM2_MIN_EASE
+
+def test_fsrs_first_review_uses_initial_stability():
+    state = _state([0, 0], [NO_DAY] * 2)
+
+    fields, interval = scheduler.review(state, [True, False], TODAY, name='fsrs')
+
+    w = scheduler.FSRS_WEIGHTS
+    assert fields['stability'] == pytest.approx([w[2], w[0]])
+    # Với DESIRED_RETENTION = 0.9, khoảng ôn ~ độ ổn định
+    assert interval.tolist() == [round(w[2]), 1]
+    # D0(G) = w4 - (G - 3) * w5: Good = w4, Again = w4 + 2 * w5
+    assert fields['difficulty'] == pytest.approx([w[4], w[4] + 2 * w[5]])
+
+def test_fsrs_initial_difficulty_per_grade():
+    difficulty = scheduler._initial_difficulty(np.array([1, 2, 3, 4]))
+
+    assert difficulty == pytest.approx([7.6214, 6.3916, 5.1618, 3.932])
+
+def test_fsrs_stability_grows_on_recall_and_shrinks_on_lapse():
+    stability = 10.0
+    state = _state([3, 3], [TODAY] * 2, stability=[stability] * 2,
+                   difficulty=[6.0] * 2, interval_days=[10, 10])
+
+    fields, interval = scheduler.review(state, [True, False], TODAY, name='fsrs')
+
+    assert fields['stability'][0] > stability
+    assert fields['stability'][1] < stability
+    assert interval[0] > 10
+    # Good kéo độ khó về D0(Good) = w4 < 6, Again tăng độ khó
+    assert fields['difficulty'][1] > 6.0 > fields['difficulty'][0]
+
+def test_fsrs_seeds_words_reviewed_with_other_scheduler():
+    # Đã ôn theo bậc thang (review_count 3 -> khoảng ôn 14) nhưng chưa có trạng thái FSRS
+    state = _state([3], [TODAY])
+
+    fields, _ = scheduler.review(state, [True], TODAY, name='fsrs')
+
+    assert fields['stability'][0] > 14
+    # Độ khó khởi đầu D0(Good); trả lời Good giữ nguyên (mean reversion về D0(Good))
+    assert fields['difficulty'][0] == pytest.approx(scheduler.FSRS_WEIGHTS[4])
+
+def test_fsrs_difficulty_reverts_to_good_initial_difficulty():
+    state = _state([3, 3], [TODAY] * 2, stability=[10.0] * 2, difficulty=[1.0, 10.0], interval_days=[10, 10])
+
+    fields, _ = scheduler.review(state, [True, True], TODAY, name='fsrs')
+
+    w = scheduler.FSRS_WEIGHTS
+    assert fields['difficulty'] == pytest.approx([w[7] * w[4] + (1 - w[7]) * 1.0, w[7] * w[4] + (1 - w[7]) * 10.0])
+
+def test_intervals_are_clipped():
+    state = _state([0], [TODAY], stability=[1e9])
+
+    assert scheduler.intervals(state, name='fsrs').tolist() == [scheduler.MAX_INTERVAL]
+
+def test_fuzz_radius():
+    radius = scheduler.fuzz_radius([1, 2, 3, 30, 365])
+
+    assert radius.tolist() == [0, 0, 1, 3, scheduler.MAX_FUZZ_DAYS]
+
+def test_balance_spreads_words_within_window():
+    count = 140
+    due = np.full(count, TODAY + 30)
+    intervals = np.full(count, 30)
+    load_start = TODAY
+    load = np.zeros(61)
+
+    shifts = scheduler.balance(due, intervals, load, load_start)
+
+    assert np.abs(shifts).max() <= 3
+    per_day = np.bincount(shifts + 3, minlength=7)
+    # 140 từ chia cho 7 ngày trong cửa sổ ±3: không ngày nào gánh quá nhiều
+    assert per_day.min() > 0
+    assert per_day.max() <= 2 * count // 7
+
+def test_balance_avoids_busy_days_and_keeps_short_intervals():
+    load = np.zeros(40)
+    load[30] = 100  # ngày đến hạn ban đầu đã kín
+
+    shifts = scheduler.balance([TODAY + 30, TODAY + 2], [30, 2], load, TODAY)
+
+    assert shifts[0] != 0 and abs(shifts[0]) <= 3
+    assert shifts[1] == 0
@@ -0,0 +1,41 @@
+"""
+Test index tìm kiếm (search_index): xếp hạng, không phân biệt dấu và cập nhật
+tăng dần (remove/add) cho cùng kết quả như tạo lại index
+"""
+import pandas as pd
+from modules import search_index
+
+def _df(words, ids=None):
+    return pd.DataFrame({
+        'id': ids or list(range(1, len(words) + 1)), 'word': words,
+        'meaning': [f"nghĩa {word}" for word in words], 'example': ''
+    })
+
+def _search(index, query):
+    return search_index.search(index, query, 10)[0].tolist()
+
+def test_ranking_and_diacritics():
+    index = search_index.build(_df(['apples', 'apple', 'pineapple', 'thỏa thuận']))
+
+    assert _search(index, 'apple') == [2, 1, 3]
+    assert _search(index, 'thoa thuan') == [4]
+
+def test_remove_uses_ids_sorted_at_build():
+    index = search_index.build(_df(['cat', 'car', 'cab', 'dog'], ids=[40, 7, 25, 3]))
+    sorted_ids = index['sorted_ids']
+
+    search_index.remove(index, [25, 99, 40])
+    search_index.add(index, {40: search_index.document({'word': 'cart', 'meaning': '', 'example': ''})})
+
+    assert index['sorted_ids'] is sorted_ids
+    assert index['alive'].tolist() == [False, True, False, True]
+    assert sorted(_search(index, 'ca')) == [7, 40]
+    rebuilt = search_index.build(_df(['cart', 'car', 'dog'], ids=[40, 7, 3]))
+    assert _search(index, 'ca') == _search(rebuilt, 'ca')
+
+def test_remove_from_empty_index():
+    index = search_index.build(_df([]))
+
+    search_index.remove(index, [1])
+
+    assert _search(index, 'a') == []
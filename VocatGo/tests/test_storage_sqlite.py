@@ -0,0 +1,135 @@
+"""
+Test backend SQLite: migrate từ CSV (lịch sử quiz, journal chưa gộp, id ổn
+định), index và upsert_words
+"""
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import pytest
+from modules import storage_sqlite, vocab_store, word_manager
+from modules.quiz_history import save_quiz_result, load_quiz_log, load_wrong_words
+
+def _switch_to_sqlite(monkeypatch):
+    monkeypatch.setattr(storage_sqlite, 'STORAGE_BACKEND', 'sqlite')
+    vocab_store.invalidate()
+
+def test_migration_copies_quiz_history(monkeypatch):
+    save_quiz_result('typing', 1, 2, [{'word': 'apple', 'meaning': 'táo'}], session_id='s1')
+    save_quiz_result('multiple_choice', 2, 2, [], session_id='s2')
+    csv_log = load_quiz_log()
+
+    _switch_to_sqlite(monkeypatch)
+
+    sqlite_log = load_quiz_log()
+    assert sqlite_log['session_id'].tolist() == csv_log['session_id'].tolist() == ['s1', 's2']
+    assert sqlite_log['score'].tolist() == [1, 2]
+    assert load_wrong_words()[['word', 'session_id']].values.tolist() == [['apple', 's1']]
+
+def _query_plan(sql, params):
+    with closing(storage_sqlite._connect()) as conn:
+        return ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+def test_due_and_duplicate_lookups_use_indexes(sqlite_backend, monkeypatch):
+    for word, next_review in [('apple', '01-01-2026'), ('Take  Off', '15-03-2026'), ('cherry', '01-01-2030')]:
+        assert word_manager.add_word(word, 'n', '', 'x')[0]
+        word_manager.update_word_fields(word_manager.get_word_ids([word])[0], {'next_review': next_review})
+    until_day = word_manager.date_str_to_day('31-03-2026')
+    in_memory = (vocab_store.count_due(word_manager._source_files(), word_manager._read_words, end_day=until_day + 1),
+                 vocab_store.due_ids(word_manager._source_files(), word_manager._read_words, end_day=until_day + 1).tolist())
+
+    # Không được load cả bảng vào bộ nhớ
+    vocab_store.invalidate()
+    monkeypatch.setattr(word_manager, '_read_words', lambda: pytest.fail("đọc cả bảng words"))
+
+    assert (word_manager.count_due_words(until_day), word_manager.get_due_word_ids(until_day).tolist()) == in_memory == (2, [1, 2])
+    assert word_manager.get_word_ids(['APPLE', ' take off', 'banana']) == [1, 2, None]
+    assert word_manager._word_exists('Take Off')
+    assert 'idx_words_next_review' in _query_plan(
+        f"SELECT COUNT(*) FROM words WHERE {storage_sqlite._due_condition()}", ('2026-03-31',))
+    assert 'idx_words_word_key' in _query_plan(
+        f"SELECT id, word FROM words WHERE {storage_sqlite.KEY_FIELD} IN (?)", ('apple',))
+
+def test_renamed_word_is_found_by_new_key(sqlite_backend):
+    assert word_manager.add_word('apple', 'n', '', 'táo')[0]
+    assert word_manager.update_word(1, 'Green Apple', 'n', '', 'táo xanh', '')[0]
+
+    assert word_manager.get_word_ids(['apple', 'green apple']) == [None, 1]
+
+def test_schema_upgrade_adds_word_indexes(sqlite_backend):
+    # DB schema version 5: chưa có word_key và index trên bảng words
+    with closing(sqlite3.connect(storage_sqlite.DB_FILE)) as conn, conn:
+        conn.execute("CREATE TABLE words (id INTEGER PRIMARY KEY AUTOINCREMENT, word TEXT NOT NULL, "
+                     "pos TEXT DEFAULT '', phonetic TEXT DEFAULT '', meaning TEXT DEFAULT '', "
+                     "example TEXT DEFAULT '', start_date TEXT DEFAULT '', review_count INTEGER DEFAULT 0, "
+                     "next_review TEXT DEFAULT '', ease REAL, stability REAL, difficulty REAL, "
+                     "lapses INTEGER DEFAULT 0, interval_days INTEGER DEFAULT 0)")
+        conn.execute("INSERT INTO words (word, next_review) VALUES ('Apple', '2026-01-01')")
+        conn.execute("PRAGMA user_version = 5")
+
+    with closing(storage_sqlite._connect()) as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == storage_sqlite.SCHEMA_VERSION
+
+    assert {'idx_words_next_review', 'idx_words_word_key', 'idx_quiz_log_time'} <= indexes
+    assert word_manager.get_word_ids(['apple']) == [1]
+    assert word_manager.count_due_words(word_manager.date_str_to_day('01-01-2026')) == 1
+
+def test_migration_replays_journal(monkeypatch):
+    for word in ['apple', 'banana', 'cherry']:
+        assert word_manager.add_word(word, 'n', '', f"nghĩa {word}")[0]
+    # Các lần ôn chỉ nằm trong words.journal (chưa gộp vào words.csv)
+    word_manager.update_word_fields(1, {'review_count': 2, 'next_review': '01-01-2030'})
+    word_manager.update_word_fields(3, {'review_count': 5, 'next_review': '02-02-2030'})
+
+    _switch_to_sqlite(monkeypatch)
+    df = word_manager.load_words().set_index('word')
+
+    assert df['review_count'].tolist() == [2, 0, 5]
+    assert df.loc['cherry', 'next_review'] == '02-02-2030'
+
+def test_migration_keeps_ids(monkeypatch):
+    for word in ['apple', 'banana', 'cherry', 'date', 'egg']:
+        assert word_manager.add_word(word, 'n', '', f"nghĩa {word}")[0]
+    assert word_manager.delete_word(3)[0]
+
+    _switch_to_sqlite(monkeypatch)
+
+    df = word_manager.load_words()
+    assert df['id'].tolist() == [1, 2, 4, 5]
+    assert df['word'].tolist() == ['apple', 'banana', 'date', 'egg']
+
+    # Từ thêm sau migrate không dùng lại id đã có
+    assert word_manager.add_word('fig', 'n', '', 'nghĩa fig')[0]
+    assert word_manager.load_words()['id'].tolist() == [1, 2, 4, 5, 6]
+
+def test_migration_assigns_ids_like_csv_backend(monkeypatch):
+    # File cũ: dòng thiếu id và id trùng nhận id tiếp theo sau max(id)
+    pd.DataFrame({
+        'id': [7, None, 7, 2],
+        'word': ['a', 'b', 'c', 'd'],
+        'meaning': ['x'] * 4,
+        'start_date': ['01-01-2026'] * 4,
+        'review_count': [0] * 4,
+        'next_review': ['01-01-2026'] * 4
+    }).to_csv(word_manager.CSV_FILE, index=False, encoding='utf-8-sig')
+
+    _switch_to_sqlite(monkeypatch)
+
+    assert word_manager.load_words()[['id', 'word']].values.tolist() == [[2, 'd'], [7, 'a'], [8, 'b'], [9, 'c']]
+
+def test_upsert_words_counts(sqlite_backend):
+    assert word_manager.add_word('apple', 'n', '', 'táo')[0]
+    assert word_manager.add_word('banana', 'n', '', 'chuối')[0]
+
+    success, counts = word_manager.upsert_words(pd.DataFrame({
+        'word': ['Apple ', 'banana', 'cherry', 'cherry', ''],
+        'meaning': ['quả táo', 'chuối', 'anh đào', 'quả anh đào', 'x']
+    }))
+
+    assert success
+    # Apple: đổi nghĩa; banana: không đổi; cherry: 2 dòng trùng giữ dòng sau; dòng rỗng bỏ qua
+    assert counts == {'inserted': 1, 'updated': 1, 'skipped': 3}
+    df = word_manager.load_words().set_index('word')
+    assert df.loc['apple', 'meaning'] == 'quả táo'
+    assert df.loc['cherry', 'meaning'] == 'quả anh đào'
+    assert df.loc['cherry', 'id'] == 3
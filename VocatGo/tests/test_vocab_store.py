@@ -0,0 +1,128 @@
+"""
+Test cache kho từ vựng (vocab_store): load lại khi file bị sửa bên ngoài
+(mtime/size), sửa tại chỗ sau mỗi lần ghi cho kết quả như đọc lại từ đầu
+"""
+import os
+import pandas as pd
+from modules import vocab_store, word_manager
+
+def _fresh_read():
+    """Đọc lại kho từ file (bỏ cache)"""
+    vocab_store.invalidate()
+    return word_manager.load_words()
+
+def _assert_same(cached, fresh):
+    # Category có thể khác thứ tự (thêm dần khi sửa tại chỗ), so theo giá trị
+    pd.testing.assert_frame_equal(cached, fresh, check_categorical=False)
+
+def _add_words(*words):
+    for word in words:
+        assert word_manager.add_word(word, 'n', '', f"nghĩa {word}")[0]
+
+def test_cache_hit_does_not_reload(monkeypatch):
+    _add_words('apple', 'banana')
+    word_manager.load_words()
+    calls = []
+    read_words = word_manager._read_words
+    monkeypatch.setattr(word_manager, '_read_words', lambda: calls.append(1) or read_words())
+
+    word_manager.load_words(copy=False)
+    word_manager.load_words(copy=False)
+
+    assert calls == []
+
+def test_external_edit_with_new_size_reloads():
+    _add_words('apple', 'banana')
+    assert len(word_manager.load_words()) == 2
+
+    # Tiến trình khác / sửa tay: ghi thêm 1 dòng vào words.csv
+    df = pd.read_csv(word_manager.CSV_FILE, encoding='utf-8-sig')
+    row = df.iloc[[0]].assign(id=10, word='cherry')
+    pd.concat([df, row]).to_csv(word_manager.CSV_FILE, index=False, encoding='utf-8-sig')
+
+    assert word_manager.load_words()['word'].tolist() == ['apple', 'banana', 'cherry']
+
+def test_external_edit_with_same_size_reloads_on_mtime():
+    _add_words('apple', 'banana')
+    word_manager.load_words()
+    stat = os.stat(word_manager.CSV_FILE)
+
+    with open(word_manager.CSV_FILE, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+    with open(word_manager.CSV_FILE, 'w', encoding='utf-8-sig') as f:
+        f.write(text.replace('banana', 'bananb'))
+    os.utime(word_manager.CSV_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert os.stat(word_manager.CSV_FILE).st_size == stat.st_size
+    assert word_manager.load_words()['word'].tolist() == ['apple', 'bananb']
+
+def test_cache_after_writes_matches_fresh_read():
+    _add_words('apple', 'banana', 'cherry')
+    word_manager.load_words()
+
+    # Ôn tập (journal), sửa chữ (ghi lại file), xóa, thêm: cache được sửa tại chỗ
+    word_manager.update_word_fields(1, {'review_count': 2, 'next_review': '01-01-2030'})
+    word_manager.update_words_fields({2: {'review_count': 1, 'lapses': 1}, 3: {'next_review': '05-05-2031'}})
+    assert word_manager.update_word(3, 'cherries', 'n', '', 'anh đào', 'Ripe cherries')[0]
+    assert word_manager.delete_word(2)[0]
+    _add_words('date')
+    cached = word_manager.load_words()
+
+    _assert_same(cached, _fresh_read())
+    assert cached['id'].tolist() == [1, 3, 4]
+    assert cached.set_index('id').loc[1, 'next_review_day'] == word_manager.date_str_to_day('01-01-2030')
+
+def test_published_frame_never_changes():
+    _add_words('apple', 'banana')
+    published = word_manager.load_words(copy=False)
+    cached = vocab_store.get_frame(word_manager._source_files(), word_manager._read_words)
+    before = published.copy()
+
+    # Session khác ghi trong lúc trang này vẫn đang đọc DataFrame cũ
+    word_manager.update_word_fields(1, {'review_count': 3, 'next_review': '01-01-2030'})
+    word_manager.update_words_fields({2: {'review_count': 4, 'lapses': 2}})
+
+    pd.testing.assert_frame_equal(published, before)
+    pd.testing.assert_frame_equal(cached, before)
+    assert word_manager.load_words()['review_count'].tolist() == [3, 4]
+
+def test_caller_edits_do_not_reach_cache():
+    _add_words('apple')
+    df = word_manager.load_words(copy=False)
+
+    df.loc[0, 'review_count'] = 9
+    df.loc[0, 'word'] = 'changed'
+
+    cached = word_manager.load_words(copy=False)
+    assert cached.loc[0, 'review_count'] == 0
+    assert cached.loc[0, 'word'] == 'apple'
+
+def test_failed_load_is_not_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(word_manager, '_read_words', lambda: calls.append(1) or None)
+
+    assert word_manager.load_words().empty
+    assert word_manager.load_words().empty
+    assert len(calls) == 2
+
+def test_chunked_import_writes_once(tmp_path, monkeypatch):
+    _add_words('apple')
+    word_manager.load_words()
+    source = tmp_path / 'import.csv'
+    pd.DataFrame({
+        'word': ['banana', 'Apple', 'cherry', 'banana ', 'date', 'cherry'],
+        'meaning': ['chuối', 'táo', 'anh đào', 'quả chuối', 'chà là', 'anh đào']
+    }).to_csv(source, index=False)
+    writes = []
+    insert_words = word_manager._insert_words
+    monkeypatch.setattr(word_manager, '_insert_words', lambda *args: writes.append(1) or insert_words(*args))
+
+    # Chunk 2 dòng: từ trùng nằm ở chunk khác với lần xuất hiện đầu
+    success, _ = word_manager.import_csv(str(source), chunk_size=2)
+
+    assert success and writes == [1]
+    cached = word_manager.load_words()
+    _assert_same(cached, _fresh_read())
+    assert cached['id'].tolist() == [1, 2, 3, 4]
+    assert cached['word'].tolist() == ['apple', 'banana', 'cherry', 'date']
+    assert cached['meaning'].tolist() == ['táo', 'quả chuối', 'anh đào', 'chà là']
@@ -0,0 +1,73 @@
+"""
+Test chọn từ có trọng số (weighted_sampler): bảng alias và cập nhật trọng số
+tăng dần khi kho bị sửa
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules import weighted_sampler, word_manager
+from modules.quiz_history import save_quiz_result
+from modules.utils import today_day
+
+@pytest.fixture(autouse=True)
+def fresh_sampler(monkeypatch):
+    monkeypatch.setattr(weighted_sampler, '_errors', {'scores': None, 'origin': None, 'signature': None, 'version': 0})
+    monkeypatch.setattr(weighted_sampler, '_table', dict.fromkeys(weighted_sampler._table))
+
+def _deck(n):
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1), 'word': [f"w{i}" for i in range(n)], 'pos': 'n', 'phonetic': '',
+        'meaning': [f"m{i}" for i in range(n)], 'example': '', 'start_date': '01-01-2026', 'review_count': 2,
+        'next_review': pd.to_datetime(today_day() - np.arange(n) % 9, unit='D').strftime('%d-%m-%Y')
+    })
+
+@pytest.mark.parametrize('weights', [
+    np.random.default_rng(0).random(50),
+    np.r_[np.ones(999), 5000.0],
+    np.random.default_rng(1).pareto(1.0, 2000) + 0.01,
+    np.ones(7)
+])
+def test_alias_table_is_exact(weights):
+    prob, alias = weighted_sampler.build_alias(weights)
+
+    n = len(weights)
+    implied = prob / n + np.bincount(alias, weights=(1 - prob) / n, minlength=n)
+    assert implied == pytest.approx(weights / weights.sum(), abs=1e-12)
+    assert ((prob >= 0) & (prob <= 1 + 1e-12)).all()
+
+def test_sample_returns_distinct_ids():
+    word_manager.save_words(_deck(30))
+
+    ids = weighted_sampler.sample_word_ids(25, np.random.default_rng(0))
+
+    assert len(set(ids.tolist())) == 25
+    assert set(ids.tolist()) <= set(range(1, 31))
+
+def test_incremental_weights_match_full_rebuild(monkeypatch):
+    word_manager.save_words(_deck(40))
+    save_quiz_result('typing', 0, 2, [{'word': 'w5', 'meaning': 'm5'}, {'word': 'w9', 'meaning': 'm9'}])
+    weighted_sampler.sample_word_ids(5)
+
+    full_builds = []
+    word_weights = weighted_sampler._word_weights
+    monkeypatch.setattr(weighted_sampler, '_word_weights', lambda *args: full_builds.append(1) or word_weights(*args))
+    word_manager.update_word_fields(6, {'review_count': 5, 'next_review': '01-01-2000'})
+    word_manager.update_word_fields(10, {'review_count': 0, 'lapses': 3})
+    word_manager.update_word(11, 'renamed', 'n', '', 'm', '')
+    weighted_sampler.sample_word_ids(5)
+
+    assert full_builds == []
+    incremental = weighted_sampler._table['weights'].copy()
+    weighted_sampler._table['key'] = None
+    weighted_sampler.sample_word_ids(5)
+    assert full_builds == [1]
+    assert incremental == pytest.approx(weighted_sampler._table['weights'], rel=1e-4)
+
+def test_adding_words_rebuilds_table():
+    word_manager.save_words(_deck(10))
+    weighted_sampler.sample_word_ids(3)
+
+    assert word_manager.add_word('new', 'n', '', 'mới')[0]
+    weighted_sampler.sample_word_ids(3)
+
+    assert len(weighted_sampler._table['ids']) == 11